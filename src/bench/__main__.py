@@ -0,0 +1,95 @@
+"""Benchmark suite for the protocol, scheduler and fan-out paths.
+
+Run from src/:
+    python -m bench                             run everything, print results
+    python -m bench --save bench/baseline.json  record a baseline
+    python -m bench --compare bench/baseline.json
+                                                fail (exit 1) on regressions
+
+Baselines are machine-specific; record one on the hardware you compare on.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from bench.registry import BENCHMARKS
+from bench import protocol, framing, fanout, manager, scheduler, display, startup  # noqa: F401 (registers benchmarks)
+
+DEFAULT_THRESHOLD = 0.25  # Allowed regression as a fraction of the baseline value
+
+
+def run(groups):
+    results = {}
+    # Host and manager code log every event; keep it out of the results
+    with open(os.devnull, "w") as devnull:
+        for group in groups:
+            print(f"running {group}...", file=sys.stderr)
+            with contextlib.redirect_stdout(devnull):
+                metrics = BENCHMARKS[group]()
+            for metric in metrics:
+                results[metric.name] = metric.to_dict()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names of regressed metrics"""
+    regressions = []
+    print(f"{'metric':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            print(f"{name:<36} {'-':>12} {current['value']:>12.2f} {'new':>8}")
+            continue
+        change = (current["value"] - base["value"]) / base["value"]
+        worse = -change if current["better"] == "higher" else change
+        limit = current["tolerance"] if current["tolerance"] is not None else threshold
+        flag = ""
+        if worse > limit and abs(current["value"] - base["value"]) > current.get("noise_floor", 0.0):
+            regressions.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:<36} {base['value']:>12.2f} {current['value']:>12.2f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmark groups to run")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="default allowed regression fraction (default %(default)s)")
+    args = parser.parse_args()
+
+    results = run(args.only or list(BENCHMARKS))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "node": platform.node(),
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                },
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+        print(f"saved {len(results)} metrics to {args.save}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nno regressions")
+    else:
+        for name, result in results.items():
+            print(f"{name:<36} {result['value']:>14.2f} {result['unit']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+from datetime import datetime
+from common.comms.protocol import Alarm
+from common.io.time_display import TimeDisplay
+from bench.registry import Metric, benchmark, ops_per_sec
+
+
+@benchmark("display")
+def time_display_format():
+    display = TimeDisplay(current_time=datetime(2024, 1, 1, 7, 5), alarm=Alarm(hours=7, minutes=30))
+
+    def render():
+        display.get_time_line()
+        display.get_alarm_line()
+
+    return [Metric("display.render_lines", ops_per_sec(render), "ops/s")]
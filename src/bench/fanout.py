@@ -0,0 +1,79 @@
+import selectors
+import socket
+import threading
+import time
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import AlarmEvent, EventType
+from bench.registry import Metric, benchmark
+from tools.stats import percentile
+
+NODE_COUNTS = (1, 100, 1000)
+ITERATIONS = 20
+
+
+def connect_nodes(host, count):
+    """Connect count raw loopback clients and wait until the host has registered them all"""
+    socks = []
+    for _ in range(count):
+        sock = socket.create_connection(("127.0.0.1", host.sock.getsockname()[1]))
+        sock.setblocking(False)
+        socks.append(sock)
+    while host.get_connected_nodes_count() < count:
+        time.sleep(0.01)
+    return socks
+
+
+def stop_host(host, timeout=5.0):
+    """Stop host once its receive threads have seen every node go.
+
+    They log each disconnect, so this must finish while the suite still
+    keeps benchmark output out of the results (see bench/__main__.py).
+    """
+    deadline = time.monotonic() + timeout
+    # Clients are removed after the disconnect is logged
+    while host.get_connected_nodes_count() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    host.stop()
+
+
+def drain(socks, stop):
+    """Keep client receive buffers empty so sends never block"""
+    selector = selectors.DefaultSelector()
+    for sock in socks:
+        selector.register(sock, selectors.EVENT_READ)
+    while not stop.is_set():
+        for key, _ in selector.select(timeout=0.1):
+            try:
+                key.fileobj.recv(65536)
+            except OSError:
+                pass
+
+
+@benchmark("fanout")
+def broadcast_fanout():
+    """Duration of one AlarmHost.broadcast call at several node counts"""
+    metrics = []
+    for count in NODE_COUNTS:
+        host = AlarmHost(port=0)  # Any free port
+        host.start(advertise=False)
+        socks = connect_nodes(host, count)
+        stop = threading.Event()
+        drainer = threading.Thread(target=drain, args=(socks, stop), daemon=True)
+        drainer.start()
+
+        durations = []
+        for _ in range(ITERATIONS):
+            event = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": {"hours": 7, "minutes": 0, "is_pm": False}})
+            start = time.perf_counter()
+            host.broadcast(event)
+            durations.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+        stop.set()
+        drainer.join()
+        for sock in socks:
+            sock.close()
+        stop_host(host)
+        metrics.append(Metric(f"fanout.broadcast_{count}_nodes", percentile(durations, 50) * 1e6, "us",
+                              better="lower", tolerance=0.5, noise_floor=100))
+    return metrics
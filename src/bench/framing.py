@@ -0,0 +1,28 @@
+from common.comms.framing import FrameBuffer
+from common.comms.protocol import AlarmEvent, EventType
+from bench.registry import Metric, benchmark, ops_per_sec
+
+
+@benchmark("framing")
+def recv_reassembly():
+    frame = (AlarmEvent(EventType.HEARTBEAT).to_json() + "\n").encode()
+
+    # A burst of frames arriving in one recv() call
+    burst = frame * 50
+
+    # One frame split across three recv() calls
+    third = len(frame) // 3
+    pieces = [frame[:third], frame[third:2 * third], frame[2 * third:]]
+
+    def feed_burst():
+        FrameBuffer().feed(burst)
+
+    def feed_split():
+        frames = FrameBuffer()
+        for piece in pieces:
+            frames.feed(piece)
+
+    return [
+        Metric("framing.burst_50_frames", ops_per_sec(feed_burst) * 50, "frames/s"),
+        Metric("framing.split_frame", ops_per_sec(feed_split), "frames/s"),
+    ]
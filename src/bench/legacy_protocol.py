@@ -0,0 +1,64 @@
+"""Alarm and AlarmEvent as they were before they became frozen slotted
+classes, kept only so bench/protocol can compare the two."""
+from dataclasses import dataclass, asdict
+import json
+import time
+from typing import Any
+from common.comms.protocol import EventType
+
+
+@dataclass
+class Alarm:
+    hours: int
+    minutes: int
+    is_pm: bool = False
+
+    def __post_init__(self):
+        if not (1 <= self.hours <= 12):
+            raise ValueError(f"Hours must be 1-12 for 12-hour format, got {self.hours}")
+        if not (0 <= self.minutes <= 59):
+            raise ValueError(f"Minutes must be 0-59, got {self.minutes}")
+
+    def to_dict(self) -> dict:
+        return {"hours": self.hours, "minutes": self.minutes, "is_pm": self.is_pm}
+
+    @staticmethod
+    def from_dict(data: dict) -> "Alarm":
+        return Alarm(hours=data["hours"], minutes=data["minutes"], is_pm=data.get("is_pm", False))
+
+    def get_24hr_time(self) -> tuple[int, int]:
+        if self.is_pm:
+            hour_24 = 12 if self.hours == 12 else self.hours + 12
+        else:
+            hour_24 = 0 if self.hours == 12 else self.hours
+        return hour_24, self.minutes
+
+
+@dataclass
+class AlarmEvent:
+    type: EventType
+    data: dict[str, Any] = None
+    timestamp: float | None = None
+    seq: int | None = None
+
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = time.time()
+
+    def to_dict(self) -> dict:
+        payload = asdict(self)
+        payload["type"] = self.type.value
+        return payload
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    @staticmethod
+    def from_dict(raw: dict) -> "AlarmEvent":
+        raw = dict(raw)
+        raw["type"] = EventType(raw["type"])
+        return AlarmEvent(**raw)
+
+    @staticmethod
+    def from_json(data: str) -> "AlarmEvent":
+        return AlarmEvent.from_dict(json.loads(data))
@@ -0,0 +1,61 @@
+import threading
+import time
+from common.comms.protocol import Alarm
+from host.alarm_manager import AlarmManager
+from host.event_dispatcher import EventDispatcher
+from bench.registry import Metric, benchmark
+from tools.stats import percentile
+
+READERS = 4
+DURATION = 1.0
+
+
+@benchmark("manager")
+def manager_contention():
+    """Reader throughput and writer latency with readers hammering the manager lock"""
+    dispatcher = EventDispatcher()
+    dispatcher.add_worker("sink", lambda events: None)
+    dispatcher.start()
+    manager = AlarmManager(event_callback=dispatcher.publish)
+    alarm = Alarm(hours=7, minutes=30)
+
+    stop = threading.Event()
+    reads = [0] * READERS
+
+    def reader(index):
+        count = 0
+        while not stop.is_set():
+            manager.is_alarm_active()
+            manager.get_current_alarm()
+            count += 2
+        reads[index] = count
+
+    write_latencies = []
+
+    def writer():
+        while not stop.is_set():
+            for step in (lambda: manager.set_alarm(alarm),
+                         lambda: manager.trigger_alarm(alarm, time.time()),
+                         lambda: manager.handle_snooze(connected_nodes_count=0, source="bench")):
+                start = time.perf_counter()
+                step()
+                write_latencies.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads.append(threading.Thread(target=writer))
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    dispatcher.stop()
+
+    return [
+        Metric("manager.reads_under_contention", sum(reads) / elapsed, "ops/s"),
+        Metric("manager.write_p50", percentile(write_latencies, 50) * 1e6, "us", better="lower"),
+        Metric("manager.write_p99", percentile(write_latencies, 99) * 1e6, "us", better="lower", tolerance=1.0, noise_floor=200),
+    ]
@@ -0,0 +1,46 @@
+import tracemalloc
+from common.comms import protocol
+from common.comms.protocol import EventType, peek_event_type
+from bench import legacy_protocol
+from bench.registry import Metric, benchmark, ops_per_sec
+
+IMPLEMENTATIONS = {"": protocol, "legacy.": legacy_protocol}  # metric prefix -> module
+
+
+def bytes_per_object(make, count=10000) -> float:
+    """Average heap bytes held by each object make() returns"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    # Subtract the list's own pointer slot per object
+    return (after - before) / count - 8
+
+
+@benchmark("protocol")
+def protocol_codec():
+    metrics = []
+    for prefix, module in IMPLEMENTATIONS.items():
+        Alarm, AlarmEvent = module.Alarm, module.AlarmEvent
+        alarm = Alarm(hours=7, minutes=30)
+        heartbeat = AlarmEvent(EventType.HEARTBEAT)
+        triggered = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": alarm.to_dict(), "fire_at": 1700000000.0})
+        heartbeat_json = heartbeat.to_json()
+        triggered_json = triggered.to_json()
+        metrics += [
+            Metric(f"protocol.{prefix}to_json.heartbeat", ops_per_sec(heartbeat.to_json), "ops/s"),
+            Metric(f"protocol.{prefix}to_json.triggered", ops_per_sec(triggered.to_json), "ops/s"),
+            Metric(f"protocol.{prefix}from_json.heartbeat", ops_per_sec(lambda: AlarmEvent.from_json(heartbeat_json)), "ops/s"),
+            Metric(f"protocol.{prefix}from_json.triggered", ops_per_sec(lambda: AlarmEvent.from_json(triggered_json)), "ops/s"),
+            Metric(f"protocol.{prefix}alarm.get_24hr_time", ops_per_sec(alarm.get_24hr_time), "ops/s"),
+            Metric(f"protocol.{prefix}alarm.bytes", bytes_per_object(lambda: Alarm(hours=7, minutes=30)),
+                   "B", better="lower", noise_floor=8),
+            Metric(f"protocol.{prefix}event.bytes", bytes_per_object(lambda: AlarmEvent(EventType.HEARTBEAT)),
+                   "B", better="lower", noise_floor=8),
+        ]
+    # What the host recv loop pays per heartbeat, on the current protocol's frame
+    heartbeat_json = protocol.AlarmEvent(EventType.HEARTBEAT).to_json()
+    metrics.append(Metric("protocol.peek_type.heartbeat", ops_per_sec(lambda: peek_event_type(heartbeat_json)), "ops/s"))
+    return metrics
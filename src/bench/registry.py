@@ -0,0 +1,52 @@
+import time
+from dataclasses import dataclass
+
+BENCHMARKS = {}  # {group name: function returning list[Metric]}
+
+
+@dataclass
+class Metric:
+    """One measured number. better is "higher" or "lower"."""
+    name: str
+    value: float
+    unit: str
+    better: str = "higher"
+    tolerance: float | None = None  # Per-metric regression threshold (fraction); None uses the default
+    noise_floor: float = 0.0        # Changes smaller than this (in unit) never count as regressions
+
+    def to_dict(self) -> dict:
+        return {"value": self.value, "unit": self.unit, "better": self.better,
+                "tolerance": self.tolerance, "noise_floor": self.noise_floor}
+
+
+def benchmark(group):
+    """Register a function as the benchmark group `group`"""
+    def register(fn):
+        BENCHMARKS[group] = fn
+        return fn
+    return register
+
+
+def ops_per_sec(fn, min_time=0.3, repeat=3) -> float:
+    """Best-of-repeat throughput of calling fn() in a tight loop"""
+    # Calibrate a batch size that takes roughly min_time / 10
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        batch *= 2
+
+    best = 0.0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_time:
+            for _ in range(batch):
+                fn()
+            count += batch
+        best = max(best, count / (time.perf_counter() - start))
+    return best
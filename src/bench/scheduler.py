@@ -0,0 +1,67 @@
+import threading
+import time
+from common.clock import SystemClock
+from common.comms.fire_timer import FireTimer
+from common.comms.protocol import Alarm, EventType
+from common.trigger_table import TriggerTable
+from host.alarm_manager import AlarmManager
+from host.scheduler import AlarmScheduler
+from bench.registry import Metric, benchmark
+from tools.stats import percentile
+
+SAMPLES = 30
+LEAD = 0.02  # Seconds between arming and the target time
+
+
+class ShiftedClock(SystemClock):
+    """Wall clock moved by offset seconds, so a real alarm time can be made imminent"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+
+@benchmark("scheduler")
+def wake_accuracy():
+    """How late the node FireTimer and the host AlarmScheduler fire"""
+    timer = FireTimer()
+    timer_lateness = []
+    for _ in range(SAMPLES):
+        fired = threading.Event()
+        target = time.time() + LEAD
+
+        def on_fire(target=target, fired=fired):
+            timer_lateness.append(time.time() - target)
+            fired.set()
+
+        timer.arm(target, on_fire)
+        fired.wait(1)
+
+    # The host path: one scheduler step that sleeps out the last LEAD seconds
+    # and triggers through the AlarmManager, timed at the trigger event
+    clock = ShiftedClock()
+    trigger_lateness = []
+
+    def on_event(event):
+        if event.type == EventType.ALARM_TRIGGERED:
+            trigger_lateness.append(clock.time() - event.data["fire_at"])
+
+    manager = AlarmManager(event_callback=on_event)
+    scheduler = AlarmScheduler(manager, clock=clock)
+    for _ in range(SAMPLES):
+        alarm = Alarm(hours=7, minutes=30)  # A new instance makes the scheduler rebuild its table
+        fire_at, _ = TriggerTable(alarm).next_after(time.time())
+        clock.offset = fire_at - LEAD - time.time()
+        manager.set_alarm(alarm)
+        scheduler.step()
+        manager.remove_alarm()
+
+    return [
+        # Sub-millisecond jitter is noise against the 50 ms ring-skew budget
+        Metric("scheduler.fire_timer_late_p50", percentile(timer_lateness, 50) * 1000, "ms", better="lower", noise_floor=1.0),
+        Metric("scheduler.fire_timer_late_p99", percentile(timer_lateness, 99) * 1000, "ms", better="lower", noise_floor=5.0),
+        Metric("scheduler.trigger_late_p50", percentile(trigger_lateness, 50) * 1000, "ms", better="lower", noise_floor=1.0),
+        Metric("scheduler.trigger_late_p99", percentile(trigger_lateness, 99) * 1000, "ms", better="lower", noise_floor=5.0),
+    ]
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import time
+from common.comms.host_server import AlarmHost
+from bench.fanout import stop_host
+from bench.registry import Metric, benchmark
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+# A fresh interpreter that loads the node runtime (everything client/app.py
+# imports except the GPIO drivers, which only exist on a Pi), connects to
+# the host and reports. With "discovery" it also starts zeroconf, like a
+# node run without --host.
+NODE_CHILD = """
+import sys, time
+started = time.perf_counter()
+from common.comms.node_client import AlarmNode
+from common.comms.local_schedule import LocalSchedule
+from common.comms.multicast import MulticastReceiver
+from common.comms.framing import FrameBuffer
+if sys.argv[2] == "discovery":
+    import zeroconf  # Loaded by start_discovery(); counted as import time here
+imported = time.perf_counter()
+node = AlarmNode()
+if sys.argv[2] == "discovery":
+    node.start_discovery()
+node.connect("127.0.0.1", int(sys.argv[1]))
+# ru_maxrss would include the forking parent's peak; read the current RSS
+rss = next(line.split()[1] for line in open("/proc/self/status") if line.startswith("VmRSS:"))
+print("RESULT", (imported - started) * 1000, rss, flush=True)
+node.stop()
+"""
+
+
+def start_node(port, mode):
+    """(import ms, start-to-connected ms including interpreter startup, RSS kB once connected)"""
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", NODE_CHILD, str(port), mode],
+                             cwd=SRC_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    output = []  # The node's own log lines, and a traceback if it crashed
+    result = None
+    for line in child.stdout:
+        if line.startswith("RESULT"):
+            result = line
+            break
+        output.append(line)
+    connected_ms = (time.perf_counter() - started) * 1000
+    rest, _ = child.communicate()
+    if result is None:
+        raise RuntimeError(f"{mode} node exited with {child.returncode} before connecting:\n"
+                           + "".join(output) + rest)
+    _, import_ms, rss = result.split()
+    return float(import_ms), connected_ms, int(rss)
+
+
+@benchmark("startup")
+def node_startup():
+    """Cold start of the node runtime, direct connect (--host) vs zeroconf discovery"""
+    host = AlarmHost(port=0)
+    host.start(advertise=False)
+    port = host.sock.getsockname()[1]
+    metrics = []
+    for mode in ("direct", "discovery"):
+        runs = [start_node(port, mode) for _ in range(RUNS)]
+        import_ms = min(run[0] for run in runs)
+        connected_ms = min(run[1] for run in runs)
+        rss = min(run[2] for run in runs)
+        metrics += [
+            Metric(f"startup.{mode}.import", import_ms, "ms", better="lower", noise_floor=5),
+            Metric(f"startup.{mode}.to_connected", connected_ms, "ms", better="lower", noise_floor=10),
+            Metric(f"startup.{mode}.rss", rss, "kB", better="lower", noise_floor=512),
+        ]
+    stop_host(host)
+    return metrics
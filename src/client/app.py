@@ -1,62 +1,207 @@
 from common.comms.node_client import AlarmNode
-from common.comms.protocol import AlarmEvent, EventType, Alarm
+from common.comms.protocol import AlarmEvent, EventType, Alarm, MalformedFrame
 from common.io.button import SnoozeButton
 from common.io.led import LedController
+from common.comms.local_schedule import LocalSchedule
+from common.comms.multicast import MulticastReceiver
+from common.comms.framing import FrameBuffer
+from common.comms.capture import CaptureWriter
+import argparse
 import time
 import threading
+from collections import deque
+
+# Number of TIME_SYNC round trips to take right after connecting
+INITIAL_SYNC_SAMPLES = 4
+# Heartbeats are only sent when nothing else has been sent for the current
+# interval (the host counts any frame), and the interval adapts: relaxed
+# while no alarm is near, tight in the ALERT_WINDOW before the next one and
+# while ringing, when the host must notice a lost node quickly. Each change
+# is announced to the host, which times us out after a few missed intervals.
+RELAXED_HEARTBEAT = 60
+ALERT_HEARTBEAT = 5
+ALERT_WINDOW = 300       # Seconds before the next fire time that count as near
+CLOCK_SYNC_INTERVAL = 60 # Seconds between TIME_SYNC round trips (also heartbeats)
+RECONNECT_INTERVAL = 5   # Seconds between reconnect attempts while the host is unreachable
+HOST_PORT = 5001         # Default host TCP port for --host
 
 node = None
 button = None
 led = None
+schedule = None          # Local copy of the alarm schedule, rings without the host
+ringing_fire_at = None   # Host-clock fire time of the occurrence we are ringing for
+pending_snoozes = []     # Snoozes pressed while the host was unreachable
+pending_lock = threading.Lock()
+multicast = None         # Fast-path receiver, if the host advertises one
+SEQ_WINDOW = 256         # Recent host broadcast seqs remembered for dropping duplicates
+applied_seqs = set()     # Seqs applied this session, the latest SEQ_WINDOW of them
+applied_order = deque()  # The same seqs, oldest first, for evicting from applied_seqs
+seq_floor = 0            # Highest seq evicted; anything at or below it counts as applied
+event_lock = threading.Lock()  # Serializes events from the TCP and multicast paths
+
+
+def start_ringing(fire_at=None):
+    """Start the local alarm indication (shared by the local schedule and ALARM_TRIGGERED)"""
+    global ringing_fire_at
+    if node.alarm_triggered:
+        return
+    node.alarm_triggered = True
+    ringing_fire_at = fire_at
+    print("[NODE] ALARM TRIGGERED!")
+    # Start blinking LED
+    try:
+        if led:
+            led.blink()
+    except Exception as e:
+        print(f"[NODE] Failed to blink LED: {e}")
+
+
+def stop_ringing():
+    """Stop the local alarm indication"""
+    node.alarm_triggered = False
+    # Turn off LED
+    try:
+        if led:
+            led.off()
+    except Exception:
+        pass
+
+
+def handle_event(event: AlarmEvent):
+    """Apply one event from the host, arriving over TCP or the multicast fast path"""
+    if event.type == EventType.BATCH:
+        for inner in event.unpack(on_malformed=lambda e: print(f"[NODE] Skipped malformed event in batch: {e}")):
+            # One event we can't apply shouldn't cost us the rest of the batch
+            try:
+                handle_event(inner)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[NODE] Skipped {inner.type.name} we could not apply: {e}")
+        return
+
+    with event_lock:
+        # Fast-path events arrive twice (datagram, then the TCP repair copy).
+        # Only drop seqs we actually applied: a TCP-only event may arrive
+        # after a later fast-path one, and a copy that failed to apply
+        # leaves the other copy to try again
+        if event.seq is not None and (event.seq <= seq_floor or event.seq in applied_seqs):
+            return
+        print(f"[NODE] Received: {event.type.name}")
+        apply_event(event)
+        if event.seq is not None:
+            mark_applied(event.seq)
+
+
+def mark_applied(seq):
+    """Remember an applied seq, forgetting the oldest beyond SEQ_WINDOW. Call with event_lock held"""
+    global applied_order, seq_floor
+    # An older event only arrives after newer ones over TCP, which means the
+    # newer ones came first as datagrams. Their TCP copies are still on the
+    # way; let them apply again so the final state follows host order
+    newer = {applied for applied in applied_seqs if applied > seq}
+    if newer:
+        applied_seqs.difference_update(newer)
+        applied_order = deque(applied for applied in applied_order if applied < seq)
+    applied_seqs.add(seq)
+    applied_order.append(seq)
+    if len(applied_order) > SEQ_WINDOW:
+        oldest = applied_order.popleft()
+        applied_seqs.discard(oldest)
+        seq_floor = max(seq_floor, oldest)
+
+
+def apply_event(event: AlarmEvent):
+    """Act on one host event. Call with event_lock held"""
+    if event.type == EventType.TIME_SYNC:
+        node.clock_sync.handle_reply(event.data)
+        # A better offset estimate may move the local fire time
+        schedule.resync()
+    elif event.type == EventType.ALARM_ARMED:
+        # Host's exact fire time overrides our own calculation
+        alarm = Alarm.from_dict(event.data["alarm"])
+        if alarm.is_for(node.groups):
+            schedule.set_alarm(alarm, fire_at=event.data["fire_at"])
+    elif event.type == EventType.ALARM_SET:
+        alarm = Alarm.from_dict(event.data["alarm"])
+        if not alarm.is_for(node.groups):
+            # Replaces an alarm we were ringing for (or the state sync
+            # on connect): it's not ours, so drop any local copy
+            schedule.clear()
+            stop_ringing()
+            try:
+                if led:
+                    led.off()
+            except Exception:
+                pass
+            print(f"[NODE] Alarm set for other groups: {', '.join(alarm.groups)}")
+            return
+        # Alarm scheduled: steady LED on
+        print("[NODE] Alarm set received")
+        schedule.set_alarm(alarm)
+        try:
+            if led:
+                led.on()
+            else:
+                print("[NODE] LED not initialized")
+        except Exception as e:
+            print(f"[NODE] Failed to turn on LED: {e}")
+    elif event.type == EventType.ALARM_TRIGGERED:
+        # Usually a no-op: the local schedule already started ringing.
+        # Don't ring again for an occurrence we snoozed while offline.
+        # The multicast fast path reaches every node, targeted or not
+        if not Alarm.from_dict(event.data["alarm"]).is_for(node.groups):
+            return
+        fire_at = event.data.get("fire_at")
+        if not schedule.has_fired(fire_at):
+            start_ringing(fire_at)
+        schedule.mark_fired(fire_at)
+    elif event.type == EventType.ALARM_CLEARED:
+        schedule.clear()
+        stop_ringing()
+        print("[NODE] Alarm cleared")
+
+
+def heartbeat_interval() -> float:
+    """Heartbeat interval for the current alarm state"""
+    if node.is_alarm_triggered():
+        return ALERT_HEARTBEAT
+    fire_at = schedule.get_fire_at()
+    if fire_at is not None and fire_at - node.clock_sync.to_host(time.time()) <= ALERT_WINDOW:
+        return ALERT_HEARTBEAT
+    return RELAXED_HEARTBEAT
+
 
 def handle_events():
     """Handle incoming events from the host"""
-    buffer = ""
-    while node and node.connected:
+    sock = node.socket
+    frames = FrameBuffer()
+    while node and node.connected and node.socket is sock:
         try:
-            data = node.socket.recv(4096).decode()
+            data = sock.recv(4096)
             if not data:
                 break
-            buffer += data
             
             # Messages separated by newline
-            while "\n" in buffer:
-                packet, buffer = buffer.split("\n", 1)
-                event = AlarmEvent.from_json(packet)
-                print(f"[NODE] Received: {event.type.name}")
-                
-                if event.type == EventType.ALARM_SET:
-                    # Alarm scheduled: steady LED on
-                    print("[NODE] Alarm set received")
-                    try:
-                        if led:
-                            led.on()
-                        else:
-                            print("[NODE] LED not initialized")
-                    except Exception as e:
-                        print(f"[NODE] Failed to turn on LED: {e}")
-                elif event.type == EventType.ALARM_TRIGGERED:
-                    node.alarm_triggered = True
-                    print("[NODE] ALARM TRIGGERED!")
-                    # Start blinking LED
-                    try:
-                        if led:
-                            led.blink()
-                    except Exception as e:
-                        print(f"[NODE] Failed to blink LED: {e}")
-                elif event.type == EventType.ALARM_CLEARED:
-                    node.alarm_triggered = False
-                    print("[NODE] Alarm cleared")
-                    # Turn off LED
-                    try:
-                        if led:
-                            led.off()
-                    except Exception:
-                        pass
+            for packet in frames.feed(data):
+                node.record_received(packet)
+                try:
+                    event = AlarmEvent.from_json(packet)
+                    handle_event(event)
+                except MalformedFrame as e:
+                    print(f"[NODE] Skipped malformed frame: {e}")
+                except (KeyError, TypeError, ValueError) as e:
+                    # Decoded, but its data isn't what this event type needs
+                    print(f"[NODE] Skipped frame we could not apply: {e}: {packet[:80]!r}")
         except Exception as e:
             print(f"[NODE] Error receiving events: {e}")
             break
 
+    # Host went away; the local schedule keeps running until we reconnect
+    if node and node.socket is sock:
+        node.connected = False
+    if node.recorder:
+        node.recorder.record("d", (node.host_ip, node.host_port))
+    print("[NODE] Lost connection to host")
+
 
 def button_monitor():
     """Monitor button presses while alarm is triggered"""
@@ -66,8 +211,14 @@ def button_monitor():
                 if button.is_pressed():
                     print("[NODE] Snooze button pressed!")
                     # Send snooze event to host
-                    snooze_event = AlarmEvent(EventType.SNOOZE_PRESSED, {"node": "client"})
+                    snooze_event = AlarmEvent(EventType.SNOOZE_PRESSED, {"node": "client", "fire_at": ringing_fire_at})
                     node.send(snooze_event)
+                    if not node.connected:
+                        # Host unreachable: silence locally and tell the host later
+                        print("[NODE] Host unreachable, snooze queued")
+                        with pending_lock:
+                            pending_snoozes.append(snooze_event)
+                        stop_ringing()
                     # Debounce: wait for release
                     time.sleep(0.5)
             time.sleep(0.05)  # Poll every 50ms
@@ -76,22 +227,90 @@ def button_monitor():
             time.sleep(0.05)
 
 
+def start_multicast():
+    """Join the host's multicast fast path if it advertises one"""
+    global multicast
+    if multicast or not node.multicast:
+        return
+    group, port = node.multicast
+    try:
+        multicast = MulticastReceiver(handle_event, group=group, port=port, allowed_sender=node.host_ip)
+        multicast.start()
+        print(f"[NODE APP] Listening for fast-path events on {group}:{port}")
+    except Exception as e:
+        print(f"[NODE APP] Failed to join multicast fast path: {e}")
+        multicast = None
+
+
+def start_session():
+    """Start receiving from a fresh host connection and reconcile state"""
+    global seq_floor
+    # A restarted host numbers its broadcasts from scratch
+    with event_lock:
+        applied_seqs.clear()
+        applied_order.clear()
+        seq_floor = 0
+    start_multicast()
+    event_thread = threading.Thread(target=handle_events, daemon=True)
+    event_thread.start()
+
+    # Estimate our clock offset to the host before any alarm gets armed
+    for _ in range(INITIAL_SYNC_SAMPLES):
+        node.sync_clock()
+        time.sleep(0.1)
+
+    # Report snoozes pressed during the outage; the host ignores any for an
+    # occurrence it has already cleared
+    with pending_lock:
+        snoozes = list(pending_snoozes)
+        pending_snoozes.clear()
+    for snooze_event in snoozes:
+        node.send(snooze_event)
+    return event_thread
+
+
+def parse_address(value, default_port=None):
+    """Parse "ip[:port]" into (ip, port)"""
+    ip, sep, port = value.rpartition(":")
+    if not sep:
+        if default_port is None:
+            raise argparse.ArgumentTypeError(f"expected ip:port, got {value!r}")
+        return value, default_port
+    return ip, int(port)
+
+
 def main():
-    global node, button, led
-    node = AlarmNode()
-    node.start_discovery()  # Zeroconf discovery
+    global node, button, led, schedule
+    parser = argparse.ArgumentParser(description="Alarm mesh node")
+    parser.add_argument("--host", type=lambda v: parse_address(v, HOST_PORT),
+                        help="host address as ip[:port]; skips zeroconf discovery (faster boot, less memory)")
+    parser.add_argument("--multicast", type=parse_address,
+                        help="fast-path group as ip:port, used with --host (normally advertised over zeroconf)")
+    parser.add_argument("--groups", type=lambda v: [g for g in v.split(",") if g], default=[],
+                        help="comma-separated groups (room, floor, role) this node rings for; "
+                             "alarms without groups ring everywhere")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="append every frame to and from the host to this capture file (see tools.replay)")
+    args = parser.parse_args()
 
-    print("[NODE APP] Waiting for host...")
+    recorder = CaptureWriter(args.capture, role="node") if args.capture else None
+    node = AlarmNode(groups=args.groups, recorder=recorder)
+    node.set_heartbeat_interval(RELAXED_HEARTBEAT)  # Announced in the HELLO on connect
+    schedule = LocalSchedule(node.clock_sync, on_fire=start_ringing)
+    if args.host:
+        print(f"[NODE APP] Connecting to {args.host[0]}:{args.host[1]}...")
+        while not node.connect(*args.host, multicast=args.multicast):
+            time.sleep(RECONNECT_INTERVAL)
+    else:
+        node.start_discovery()  # Zeroconf discovery
 
-    # Wait until the node connects
-    while not node.connected:
-        time.sleep(0.2)
+        print("[NODE APP] Waiting for host...")
 
-    print("[NODE APP] Connected to host!")
+        # Wait until the node connects
+        while not node.connected:
+            time.sleep(0.2)
 
-    # Send a heartbeat to host
-    hb = AlarmEvent(EventType.HEARTBEAT, {"node_id": "demo"})
-    node.send(hb)
+    print("[NODE APP] Connected to host!")
 
     # Initialize button
     try:
@@ -109,20 +328,40 @@ def main():
         led = None
 
     # Start event handler thread
-    event_thread = threading.Thread(target=handle_events, daemon=True)
-    event_thread.start()
+    event_thread = start_session()
 
     # Start button monitor thread
     button_thread = threading.Thread(target=button_monitor, daemon=True)
     button_thread.start()
 
+    last_clock_sync = time.time()
+    last_reconnect = 0
     try:
         while True:
-            time.sleep(10)
+            time.sleep(1)
+
+            if not node.connected or not event_thread.is_alive():
+                # Zeroconf may already have reconnected us; otherwise retry
+                # the last known host address ourselves
+                if not node.connected and time.time() - last_reconnect >= RECONNECT_INTERVAL:
+                    last_reconnect = time.time()
+                    node.reconnect()
+                if node.connected:
+                    print("[NODE APP] Reconnected to host!")
+                    event_thread = start_session()
+                continue
+
+            interval = heartbeat_interval()
+            tightened = interval < node.heartbeat_interval
+            node.set_heartbeat_interval(interval)
 
-            # Send a heartbeat
-            hb = AlarmEvent(EventType.HEARTBEAT)
-            node.send(hb)
+            # Keep the clock offset fresh as the clocks drift, and fresh
+            # before an alarm fires. The request doubles as a heartbeat.
+            if tightened or time.time() - last_clock_sync >= CLOCK_SYNC_INTERVAL:
+                last_clock_sync = time.time()
+                node.sync_clock()
+            elif node.idle_for() >= interval:
+                node.send(AlarmEvent(EventType.HEARTBEAT))
 
     except KeyboardInterrupt:
         print("[NODE APP] Shutting down")
@@ -130,6 +369,9 @@ def main():
             button.close()
         if led:
             led.close()
+        schedule.clear()
+        if multicast:
+            multicast.stop()
         node.stop()
 
 if __name__ == "__main__":
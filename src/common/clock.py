@@ -0,0 +1,106 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+
+class SystemClock:
+    """Real wall clock. Components take a clock so tests can swap in SimulatedClock"""
+
+    def time(self) -> float:
+        """Current unix timestamp"""
+        return time.time()
+
+    def now(self) -> datetime:
+        """Current naive local time"""
+        return datetime.now()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float, wake: threading.Event | None = None) -> bool:
+        """
+        Sleep for seconds, or until wake is set.
+
+        Returns:
+            True if woken early by wake, False if the full time elapsed
+        """
+        if wake is not None:
+            return wake.wait(max(0.0, seconds))
+        time.sleep(max(0.0, seconds))
+        return False
+
+
+SYSTEM_CLOCK = SystemClock()
+
+
+class SimulationFinished(Exception):
+    """Raised from SimulatedClock.sleep once the simulation end time is reached"""
+
+
+class SimulatedClock(SystemClock):
+    """A clock that only moves when something sleeps on it, and then instantly.
+
+    Meant for a single driver thread: sleep() jumps straight to the wake-up
+    time, running any callbacks scheduled with call_at() on the way. A week
+    of scheduler behavior then takes milliseconds. Local time follows the
+    process timezone (the TZ environment variable), DST included.
+    """
+
+    def __init__(self, start: float | datetime | None = None, stop_at: float | datetime | None = None):
+        """
+        Initialize the simulated clock.
+
+        Args:
+            start: Initial time (timestamp or naive local datetime), default now
+            stop_at: If set, sleeping past this time raises SimulationFinished
+        """
+        self._now = self._to_timestamp(start) if start is not None else time.time()
+        self._start_monotonic = self._now
+        self.stop_at = self._to_timestamp(stop_at) if stop_at is not None else None
+        self._callbacks = []  # heap of (time, order, fn)
+        self._order = 0
+
+    @staticmethod
+    def _to_timestamp(value):
+        return value.timestamp() if isinstance(value, datetime) else float(value)
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._now)
+
+    def monotonic(self) -> float:
+        return self._now - self._start_monotonic
+
+    def call_at(self, when: float | datetime, fn):
+        """Run fn() when simulated time reaches when (timestamp or naive local datetime)"""
+        heapq.heappush(self._callbacks, (self._to_timestamp(when), self._order, fn))
+        self._order += 1
+
+    def call_later(self, delay: float, fn):
+        self.call_at(self._now + delay, fn)
+
+    def advance(self, seconds: float):
+        """Move time forward without a sleeper (runs due callbacks)"""
+        self.sleep(seconds)
+
+    def sleep(self, seconds: float, wake: threading.Event | None = None) -> bool:
+        if wake is not None and wake.is_set():
+            return True
+        target = self._now + max(0.0, seconds)
+        if self.stop_at is not None and target > self.stop_at:
+            target = self.stop_at
+
+        while self._callbacks and self._callbacks[0][0] <= target:
+            when, _, fn = heapq.heappop(self._callbacks)
+            self._now = max(self._now, when)
+            fn()
+            if wake is not None and wake.is_set():
+                return True
+
+        self._now = target
+        if self.stop_at is not None and self._now >= self.stop_at:
+            raise SimulationFinished()
+        return False
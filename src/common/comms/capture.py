@@ -0,0 +1,100 @@
+import threading
+from collections import namedtuple
+from common.clock import SYSTEM_CLOCK
+
+# A capture is a text file: one header line, then one line per frame
+#
+#   # alarm-mesh capture v1 role=host start=1761894000.123456
+#   0.000213\tc\t10.0.0.7:40122\t
+#   0.004518\ti\t10.0.0.7:40122\t{"type": 10, "data": {"groups": ["bedroom"]}, "timestamp": 1761894000.1, "seq": null}
+#   1.250001\to\t*\t{"type": 1, "data": {"alarm": {"hours": 7, "minutes": 0, "is_pm": false}}, "timestamp": ..., "seq": 1}
+#
+# Fields: seconds since start, direction, peer, frame. Directions are
+# i (received), o (sent), c (peer connected) and d (peer disconnected). The
+# peer of a host broadcast is "*" (or "groups:a,b" when targeted), so each
+# broadcast is one line however many nodes it went to. Frames are the
+# protocol's own newline-free JSON lines, written as they were on the wire:
+# "type" is the numeric EventType value (10 = HELLO, 1 = ALARM_SET above).
+MAGIC = "# alarm-mesh capture v1"
+
+Record = namedtuple("Record", "time direction peer frame")
+
+
+def peer_name(addr) -> str:
+    """Capture peer field for a (host, port) address"""
+    return f"{addr[0]}:{addr[1]}" if isinstance(addr, tuple) else str(addr)
+
+
+class CaptureWriter:
+    """Appends timestamped frames to a capture file.
+
+    Cheap enough for the host's receive path: a record is one formatted
+    line into a large write buffer, flushed at most every FLUSH_INTERVAL
+    seconds (so a crash loses at most that much). Recording stops, with one
+    log line, once the file reaches max_bytes.
+    """
+
+    FLUSH_INTERVAL = 1.0
+    BUFFER_SIZE = 256 * 1024
+
+    def __init__(self, path, role="host", clock=SYSTEM_CLOCK, max_bytes=512 * 1024 * 1024):
+        """
+        Initialize the writer and write the header.
+
+        Args:
+            path: Capture file; appended to, so one file can hold several runs
+            role: "host" or "node", recorded in the header
+            clock: Clock for timestamps (see common.clock)
+            max_bytes: Stop recording once the file is this large
+        """
+        self.path = path
+        self.clock = clock
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8", buffering=self.BUFFER_SIZE)
+        self.start = clock.time()
+        self.last_flush = self.start
+        self.full = False
+        self.file.write(f"{MAGIC} role={role} start={self.start:.6f}\n")
+        print(f"[CAPTURE] Recording to {path}")
+
+    def record(self, direction: str, peer, frame: str = ""):
+        """Append one record. peer is an address tuple or a name"""
+        now = self.clock.time()
+        line = f"{now - self.start:.6f}\t{direction}\t{peer_name(peer)}\t{frame}\n"
+        with self.lock:
+            if self.full or self.file.closed:
+                return
+            self.file.write(line)
+            if now - self.last_flush >= self.FLUSH_INTERVAL:
+                self.last_flush = now
+                self.file.flush()
+                if self.file.tell() >= self.max_bytes:
+                    self.full = True
+                    print(f"[CAPTURE] {self.path} reached {self.max_bytes} bytes, recording stopped")
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+def read_capture(path):
+    """Yield (header, Record) for each record; header is the dict of the run's header line.
+
+    A file appended to by several runs has several headers; times restart
+    from zero at each.
+    """
+    header = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith(MAGIC):
+                header = dict(field.split("=", 1) for field in line[len(MAGIC):].split() if "=" in field)
+                continue
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split("\t", 3)
+            if len(parts) != 4:
+                continue  # Torn last line of a crashed run
+            yield header, Record(float(parts[0]), parts[1], parts[2], parts[3])
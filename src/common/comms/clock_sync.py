@@ -0,0 +1,67 @@
+import threading
+from common.clock import SYSTEM_CLOCK
+
+
+class ClockSync:
+    """Estimates the offset between this node's clock and the host clock.
+
+    Uses an NTP-style exchange: the node stamps a TIME_SYNC request with its
+    send time (t0), the host replies with its own time (t1), and the node
+    stamps the reply on arrival (t2). The sample with the smallest round trip
+    is trusted most, since it has the least room for asymmetric delay.
+    """
+
+    MAX_SAMPLES = 8
+
+    def __init__(self, clock=SYSTEM_CLOCK):
+        """
+        Initialize the clock sync estimator.
+
+        Args:
+            clock: This node's clock (see common.clock)
+        """
+        self.clock = clock
+        self.samples = []  # [(round_trip, offset)]
+        self.lock = threading.Lock()
+
+    def make_request(self) -> dict:
+        """Build the data payload for an outgoing TIME_SYNC request"""
+        return {"t0": self.clock.time()}
+
+    def handle_reply(self, data: dict):
+        """Record a TIME_SYNC reply from the host"""
+        t2 = self.clock.time()
+        t0 = data["t0"]
+        t1 = data["t1"]
+        round_trip = t2 - t0
+        offset = t1 - (t0 + t2) / 2
+        with self.lock:
+            self.samples.append((round_trip, offset))
+            self.samples = self.samples[-self.MAX_SAMPLES:]
+
+    def is_synced(self) -> bool:
+        """Check if at least one sample has been recorded"""
+        with self.lock:
+            return bool(self.samples)
+
+    def get_offset(self) -> float:
+        """Host clock minus node clock, in seconds (0.0 until synced)"""
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return min(self.samples)[1]
+
+    def get_round_trip(self) -> float | None:
+        """Best observed round trip to the host, in seconds"""
+        with self.lock:
+            if not self.samples:
+                return None
+            return min(self.samples)[0]
+
+    def to_local(self, host_time: float) -> float:
+        """Convert a host timestamp to this node's clock"""
+        return host_time - self.get_offset()
+
+    def to_host(self, local_time: float) -> float:
+        """Convert a timestamp on this node's clock to the host clock"""
+        return local_time + self.get_offset()
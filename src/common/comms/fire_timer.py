@@ -0,0 +1,70 @@
+import threading
+from common.clock import SYSTEM_CLOCK
+
+
+class FireTimer:
+    """Runs a callback once at an absolute time on this node's clock.
+
+    Used to pre-arm a node with the alarm fire time so it starts ringing on
+    its own, without waiting for ALARM_TRIGGERED to arrive over the network.
+    """
+
+    def __init__(self, clock=SYSTEM_CLOCK):
+        """
+        Initialize the fire timer.
+
+        Args:
+            clock: Clock the fire time is measured on (see common.clock)
+        """
+        self.clock = clock
+        self.fire_at = None
+        self.fired = False
+        self._callback = None
+        self._cancel = None
+        self.lock = threading.Lock()
+
+    def arm(self, fire_at: float, callback):
+        """Schedule callback to run at fire_at, replacing any pending schedule"""
+        with self.lock:
+            if self._cancel:
+                self._cancel.set()
+            self.fire_at = fire_at
+            self.fired = False
+            self._callback = callback
+            self._cancel = threading.Event()
+            cancel = self._cancel
+        threading.Thread(target=self._wait_and_fire, args=(fire_at, cancel), daemon=True).start()
+
+    def cancel(self):
+        """Cancel any pending schedule"""
+        with self.lock:
+            if self._cancel:
+                self._cancel.set()
+            self._cancel = None
+            self.fire_at = None
+            self.fired = False
+
+    def is_armed(self) -> bool:
+        """Check if a schedule is pending and has not fired yet"""
+        with self.lock:
+            return self.fire_at is not None and not self.fired
+
+    def _wait_and_fire(self, fire_at, cancel):
+        # Event.wait gives millisecond precision on Linux; re-check the
+        # remaining time in case the wait returns early.
+        while not cancel.is_set():
+            remaining = fire_at - self.clock.time()
+            if remaining <= 0:
+                break
+            self.clock.sleep(remaining, wake=cancel)
+
+        with self.lock:
+            if cancel.is_set() or cancel is not self._cancel:
+                return
+            self.fired = True
+            callback = self._callback
+
+        try:
+            callback()
+        except Exception as e:
+            print(f"[TIMER] Fire callback failed: {e}")
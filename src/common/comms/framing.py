@@ -0,0 +1,20 @@
+class FrameBuffer:
+    """Reassembles newline-delimited frames from a byte stream.
+
+    Buffers raw bytes rather than decoded text, so a multi-byte character
+    split across two recv() calls decodes correctly, and splits all complete
+    frames out of the buffer in one pass.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data: bytes) -> list[str]:
+        """Add received bytes and return any complete frames, in order"""
+        if b"\n" not in data:
+            self.buffer += data
+            return []
+        *frames, self.buffer = (self.buffer + data).split(b"\n")
+        # Invalid UTF-8 is kept (as U+FFFD) so the frame fails to decode as an
+        # event on its own instead of taking the rest of the burst with it
+        return [frame.decode(errors="replace") for frame in frames if frame]
@@ -1,24 +1,115 @@
 # alarm_host.py
+import math
+import queue
 import socket
 import threading
-import time
 from zeroconf import Zeroconf, ServiceInfo
-from common.comms.protocol import AlarmEvent, EventType
+from common.comms.protocol import AlarmEvent, EventType, MalformedFrame, peek_event_type
+from common.comms.multicast import MulticastSender
+from common.comms.framing import FrameBuffer
+from common.comms.rate_limit import InboundLimiter, TokenBucket
+from common.clock import SYSTEM_CLOCK
+from common.timed_lock import TimedLock
 
 class AlarmHost:
     SERVICE_TYPE = "_alarmhost._tcp.local."
     SERVICE_NAME = "AlarmHostService._alarmhost._tcp.local."
-    HEARTBEAT_TIMEOUT = 60  # Remove node if no heartbeat for 60 seconds
+    # Any frame from a node counts as a heartbeat. Nodes that announce their
+    # heartbeat interval in HELLO (it adapts to how close the next alarm is)
+    # are removed after missing HEARTBEAT_MISSES of them; others after
+    # HEARTBEAT_TIMEOUT seconds of silence
+    HEARTBEAT_TIMEOUT = 60
+    HEARTBEAT_MISSES = 3
+    HEARTBEAT_INTERVAL_RANGE = (1, 600)  # Announced intervals are clamped to this
+    HEARTBEAT_CHECK_INTERVAL = 10  # Or shorter, to check each node about once per announced interval
+    MALFORMED_LOG_EVERY = 100  # Log the first malformed frame per node, then every Nth
+    # Pending connections the kernel queues for us; capped by net.core.somaxconn.
+    # A whole site reconnecting after a power cut overflows a small backlog,
+    # and the dropped SYNs are only retried after 1s, 3s, 7s...
+    LISTEN_BACKLOG = 1024
+    # New connections are registered immediately, but their state sync
+    # (on_node_connected) is paced to this many per second after a burst
+    ADMISSION_RATE = 500
+    ADMISSION_BURST = 100
+    # Inbound (rate per second, burst) per node and event type; None covers
+    # the types not listed. A node sends at most one heartbeat every few
+    # seconds and one snooze per ring, so these only bite on a flooding or
+    # stuck node.
+    RATE_LIMITS = {
+        EventType.HEARTBEAT: (1, 5),
+        EventType.SNOOZE_PRESSED: (1, 3),
+        EventType.TIME_SYNC: (5, 20),  # A resync sends a few in a row
+        None: (10, 20),
+    }
+    DROPPED_LOG_EVERY = 100  # Log a node's first dropped frame of each type, then every Nth
+    # After a read with dropped frames the node isn't read again for this
+    # long, so TCP flow control slows the sender instead of us parsing its flood
+    THROTTLE_SECONDS = 0.1
+    # Applied to every accepted node connection
+    SOCKET_OPTIONS = [
+        (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),  # Events are small; don't wait to coalesce
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),  # Notice nodes that lost power mid-connection
+    ] + [
+        (socket.IPPROTO_TCP, getattr(socket, name), value)
+        for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3))
+        if hasattr(socket, name)
+    ]
+    # Time-critical events that also go out over the multicast fast path
+    FAST_PATH_TYPES = (EventType.ALARM_TRIGGERED, EventType.ALARM_CLEARED)
 
-    def __init__(self, port=5001, event_handler=None, on_node_connected=None):
+    def __init__(self, port=5001, event_handler=None, on_node_connected=None, multicast=None,
+                 clock=SYSTEM_CLOCK, on_node_disconnected=None, backlog=LISTEN_BACKLOG,
+                 admission_rate=ADMISSION_RATE, socket_options=None, rate_limits=None, recorder=None):
+        """
+        Initialize the host.
+
+        Args:
+            port: TCP port nodes connect to
+            event_handler: Called with (event, addr) for each received event
+            on_node_connected: Called with (addr, conn) when a node connects
+            multicast: Optional (group, port) to enable the UDP multicast fast path
+            clock: Clock for heartbeat timestamps and timeouts (see common.clock)
+            on_node_disconnected: Called with (addr, reason) once a node is gone;
+                                  reason is "closed" or "timeout"
+            backlog: listen() backlog for the TCP server
+            admission_rate: on_node_connected calls per second once a burst of
+                            ADMISSION_BURST is used up
+            socket_options: (level, option, value) list for accepted connections,
+                            default SOCKET_OPTIONS (e.g. add SO_SNDBUF here)
+            rate_limits: Inbound limits per node, default RATE_LIMITS ({} disables them)
+            recorder: Optional CaptureWriter for every frame in and out (see common.comms.capture)
+        """
         self.port = port
-        self.zeroconf = Zeroconf()
+        self.zeroconf = None   # Created when advertising starts
         self.service_info = None
-        self.clients = {}      # {addr: {"conn": conn, "last_heartbeat": timestamp}}
+        self.clients = {}      # {addr: {"conn": conn, "last_heartbeat": last frame received, ...}}
+        self.groups = {}       # {group: {addr, ...}} from each node's HELLO
         self.running = False
-        self.lock = threading.Lock()
+        self.lock = TimedLock("AlarmHost.lock")  # Wait times in diagnostics (see host/diagnostics.py)
         self.event_handler = event_handler  # Callback for handling received events
         self.on_node_connected = on_node_connected  # Callback when a node connects
+        self.on_node_disconnected = on_node_disconnected  # Callback when a node is removed
+        self.multicast = multicast  # (group, port) for the fast path, or None
+        self.fast_path = MulticastSender(*multicast) if multicast else None
+        self.seq = 0  # Sequence number of the last broadcast event
+        self.clock = clock
+        self.malformed_frames = 0  # Frames skipped because they failed to decode
+        self.backlog = backlog
+        self.socket_options = self.SOCKET_OPTIONS if socket_options is None else socket_options
+        self.admissions = queue.Queue()  # (addr, conn) waiting for on_node_connected
+        self.admission_bucket = TokenBucket(admission_rate, self.ADMISSION_BURST, clock=clock)
+        self.rate_limits = self.RATE_LIMITS if rate_limits is None else rate_limits
+        self.dropped_frames = 0  # Frames refused by the inbound rate limits
+        self.recorder = recorder
+        self.sock = None  # Listening socket, created by start_tcp_server() unless adopted
+        # Set by detach(): reads and accepts from then on go to the new process
+        self.forward = None
+        self.busy = 0  # Receive threads currently handling frames (see detach)
+        self.pending_release = set()  # Adopted nodes the old process may still read (see adopt)
+        # Guards busy and the recv loops' view of forward. Not self.lock:
+        # _send_all holds that across every node's sendall, and reads must
+        # not wait for a slow broadcast
+        self.handling = threading.Condition()
 
     # ------------------------------
     # Zeroconf Service Announce
@@ -47,12 +138,17 @@ class AlarmHost:
             except:
                 pass
 
+        properties = {"role": "host"}
+        if self.multicast:
+            properties["mcast"] = f"{self.multicast[0]}:{self.multicast[1]}"
+
+        self.zeroconf = Zeroconf()
         self.service_info = ServiceInfo(
             type_=self.SERVICE_TYPE,
             name=self.SERVICE_NAME,
             addresses=[socket.inet_aton(ip)],
             port=self.port,
-            properties={"role": "host"}
+            properties=properties
         )
 
         self.zeroconf.register_service(self.service_info)
@@ -62,127 +158,567 @@ class AlarmHost:
     # TCP Server
     # ------------------------------
     def start_tcp_server(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.bind(("", self.port))
-        self.sock.listen(5)
-        print(f"[HOST] TCP server listening on port {self.port}")
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # Rebind right away after a restart, even with old connections in TIME_WAIT
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.bind(("", self.port))
+            self.sock.listen(self.backlog)
+            print(f"[HOST] TCP server listening on port {self.port} (backlog {self.backlog})")
+        else:
+            print(f"[HOST] TCP server serving adopted socket on port {self.port}")
 
         threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._admission_loop, name="admission", daemon=True).start()
         threading.Thread(target=self._heartbeat_monitor, daemon=True).start()
 
     def _accept_loop(self):
+        # Kept minimal so the backlog drains as fast as nodes arrive: logging
+        # and the state sync happen on the admission thread
         while self.running:
             try:
                 conn, addr = self.sock.accept()
-                print(f"[HOST] Node connected from {addr}")
-                with self.lock:
-                    self.clients[addr] = {
-                        "conn": conn,
-                        "last_heartbeat": time.time()
-                    }
-                
-                # Start the client receive loop
-                threading.Thread(
-                    target=self._client_recv_loop, 
-                    args=(conn, addr),
-                    daemon=True
-                ).start()
-                
-                # Call the node connected callback in a separate thread to avoid blocking
-                if self.on_node_connected:
-                    threading.Thread(
-                        target=self.on_node_connected,
-                        args=(addr, conn),
-                        daemon=True
-                    ).start()
+            except OSError as e:
+                if self.running:
+                    print(f"[HOST] Error in accept loop: {e}")
+                    self.clock.sleep(0.1)  # e.g. out of file descriptors; don't spin
+                continue
+            if self.forward:
+                # Accepted after a handoff (this accept was already blocked)
+                self.forward("accepted", addr, conn, None)
+                return
+            self.add_connection(conn, addr)
+
+    def add_connection(self, conn, addr):
+        """Register an accepted node connection and start serving it"""
+        try:
+            for level, option, value in self.socket_options:
+                conn.setsockopt(level, option, value)
+        except OSError as e:
+            print(f"[HOST] Failed to set socket options for {addr}: {e}")
+        with self.lock:
+            now = self.clock.time()
+            self.clients[addr] = self._client_info(conn, now, now)
+        if self.recorder:
+            self.recorder.record("c", addr)
+
+        # Start the client receive loop
+        threading.Thread(
+            target=self._client_recv_loop,
+            args=(conn, addr),
+            daemon=True
+        ).start()
+        self.admissions.put((addr, conn))
+
+    def _client_info(self, conn, connected_at, last_heartbeat, malformed=0, groups=(), timeout=None):
+        if timeout is None:
+            timeout = self.HEARTBEAT_TIMEOUT
+        return {
+            "conn": conn,
+            "connected_at": connected_at,
+            "last_heartbeat": last_heartbeat,
+            "timeout": timeout,  # Seconds of silence before the node is removed
+            "malformed": malformed,
+            "limiter": InboundLimiter(self.rate_limits, clock=self.clock),
+            "groups": groups,
+            "admitted": False,  # on_node_connected has run (or been skipped)
+        }
+
+    def _admission_loop(self):
+        """Log new nodes and run on_node_connected for each, paced by admission_bucket"""
+        while self.running:
+            addr, conn = self.admissions.get()
+            if addr is None:
+                return
+            print(f"[HOST] Node connected from {addr}")
+            if not self.on_node_connected:
+                continue
+            self.clock.sleep(self.admission_bucket.wait_time())
+            self.admission_bucket.take()
+            with self.lock:
+                if self.forward:
+                    return  # Handed off; the new process admits the rest
+                if addr not in self.clients:
+                    continue  # Gone before its turn
+                self.clients[addr]["admitted"] = True
+            try:
+                self.on_node_connected(addr, conn)
             except Exception as e:
-                print(f"[HOST] Error in accept loop: {e}")
-                pass
+                print(f"[HOST] Node connected callback failed for {addr}: {e}")
 
-    def _client_recv_loop(self, conn, addr):
-        buffer = ""
+    def _client_recv_loop(self, conn, addr, initial=b""):
+        frames = FrameBuffer()
+        with self.lock:
+            info = self.clients.get(addr)
+        if info is None:  # Already expired
+            conn.close()
+            return
+        closed = False
         while self.running:
             try:
-                data = conn.recv(4096).decode()
-                if not data:
+                if initial:
+                    data, initial = initial, b""  # Read by the previous process (see adopt)
+                else:
+                    data = conn.recv(4096)
+                with self.handling:
+                    forward = self.forward
+                    if not forward:
+                        self.busy += 1
+                if forward:
+                    # Handed off while we were blocked in recv(): the new
+                    # process carries on from this read
+                    forward("release", addr, conn, frames.buffer + data if data else None)
+                    return
+                try:
+                    throttle = self._handle_data(conn, addr, frames, info, data)
+                finally:
+                    with self.handling:
+                        self.busy -= 1
+                        if not self.busy:
+                            self.handling.notify_all()
+                if throttle is None:
+                    closed = True
                     break
-                buffer += data
-
-                # Messages separated by newline
-                while "\n" in buffer:
-                    packet, buffer = buffer.split("\n", 1)
-                    event = AlarmEvent.from_json(packet)
-                    print(f"[HOST] Received from {addr}: {event.type.name}")
-                    
-                    # Update heartbeat timestamp if it's a heartbeat
-                    if event.type == EventType.HEARTBEAT:
-                        with self.lock:
-                            if addr in self.clients:
-                                self.clients[addr]["last_heartbeat"] = time.time()
-                    
-                    # Delegate to event handler if provided
-                    if self.event_handler:
-                        self.event_handler(event, addr)
-            except:
+                if throttle:
+                    self.clock.sleep(self.THROTTLE_SECONDS)
+            except OSError:
+                closed = True
                 break
 
+        if self.forward and not closed:
+            self.forward("release", addr, conn, frames.buffer)  # Handed off between reads
+            return
         print(f"[HOST] Node disconnected {addr}")
         conn.close()
+        with self.lock:
+            removed = self._remove_client(addr) is not None
+        # An expired node was already removed (and reported) by expire_nodes
+        if removed:
+            self._node_gone(addr, "closed")
+
+    def _handle_data(self, conn, addr, frames, info, data):
+        """Handle one read from a node. Returns whether to throttle it, or None once it closed"""
+        if not data:
+            return None
+        received_at = self.clock.time()
+        # Whatever the node sent shows it's alive, so nodes only send
+        # heartbeats when they have nothing else to send. One store per read,
+        # without the lock: expire_nodes() may miss it by a check at worst
+        info["last_heartbeat"] = received_at
+        limiter = info["limiter"]
+        throttle = False
+        # Messages separated by newline
+        for packet in frames.feed(data):
+            if self.recorder:
+                self.recorder.record("i", addr, packet)  # As received, even if dropped or malformed
+            try:
+                event_type = peek_event_type(packet)
+                # Over-limit frames are dropped before they cost a
+                # decode, a log line or the manager lock
+                if not limiter.allow(event_type):
+                    self._count_dropped(addr, event_type, limiter)
+                    throttle = True
+                    continue
+                # Heartbeats only exist to be received (see above), so
+                # they are never fully decoded
+                if event_type == EventType.HEARTBEAT:
+                    continue
+                event = AlarmEvent.from_json(packet)
+            except MalformedFrame as e:
+                self._count_malformed(addr, e)
+                continue
+            print(f"[HOST] Received from {addr}: {event.type.name}")
+
+            if event.type == EventType.HELLO:
+                hello = event.data or {}
+                if not isinstance(hello, dict):
+                    self._count_malformed(addr, f"HELLO data is not an object: {hello!r:.80}")
+                    continue
+                if "groups" in hello:
+                    groups = hello["groups"]
+                    # A bare string would otherwise become one group per letter
+                    if not isinstance(groups, (list, tuple)) or not all(isinstance(g, str) for g in groups):
+                        self._count_malformed(addr, f"HELLO groups is not a list of names: {groups!r:.80}")
+                        continue
+                    self.set_node_groups(addr, groups)
+                if "heartbeat_interval" in hello:
+                    self.set_heartbeat_interval(addr, hello["heartbeat_interval"])
+                continue
+
+            # Answer clock sync requests directly, stamped with the
+            # time the frame arrived so the node can estimate offset
+            if event.type == EventType.TIME_SYNC:
+                t0 = (event.data or {}).get("t0")
+                if t0 is None:
+                    self._count_malformed(addr, "TIME_SYNC without t0")
+                    continue
+                reply = AlarmEvent(EventType.TIME_SYNC, {
+                    "t0": t0,
+                    "t1": received_at,
+                })
+                self.send_to(addr, reply)
+                continue
+
+            # Delegate to event handler if provided
+            if self.event_handler:
+                try:
+                    self.event_handler(event, addr)
+                except Exception as e:
+                    print(f"[HOST] Event handler failed for {event.type.name} from {addr}: {e}")
+        return throttle
+
+    def _remove_client(self, addr):
+        """Drop addr from clients and the group index. Call with self.lock held"""
+        info = self.clients.pop(addr, None)
+        if info is not None:
+            self._unindex(addr, info["groups"])
+        return info
+
+    def _unindex(self, addr, groups):
+        for group in groups:
+            members = self.groups.get(group)
+            if members is not None:
+                members.discard(addr)
+                if not members:
+                    del self.groups[group]
+
+    def set_node_groups(self, addr, groups):
+        """Record the groups a node belongs to (from its HELLO), replacing any earlier ones"""
+        groups = tuple(sorted({str(group) for group in groups}))
+        with self.lock:
+            info = self.clients.get(addr)
+            if info is None:
+                return
+            self._unindex(addr, info["groups"])
+            info["groups"] = groups
+            for group in groups:
+                self.groups.setdefault(group, set()).add(addr)
+        print(f"[HOST] Node {addr} joined groups: {', '.join(groups) or '(none)'}")
+
+    def set_heartbeat_interval(self, addr, interval):
+        """Expect a frame from a node at least every interval seconds (from its HELLO)"""
+        try:
+            low, high = self.HEARTBEAT_INTERVAL_RANGE
+            value = float(interval)
+            # NaN would pass the clamp and make the node never time out
+            if not math.isfinite(value):
+                raise ValueError("not finite")
+            interval = min(max(value, low), high)
+        except (TypeError, ValueError):
+            self._count_malformed(addr, f"bad heartbeat_interval {interval!r}")
+            return
+        with self.lock:
+            info = self.clients.get(addr)
+            if info is not None:
+                info["timeout"] = interval * self.HEARTBEAT_MISSES
+        print(f"[HOST] Node {addr} heartbeat every {interval:g}s")
+
+    def _node_gone(self, addr, reason):
+        if self.recorder:
+            self.recorder.record("d", addr)
+        if self.on_node_disconnected:
+            try:
+                self.on_node_disconnected(addr, reason)
+            except Exception as e:
+                print(f"[HOST] Node disconnected callback failed for {addr}: {e}")
+
+    def _count_malformed(self, addr, error):
+        with self.lock:
+            self.malformed_frames += 1
+            info = self.clients.get(addr)
+            count = 0
+            if info is not None:
+                info["malformed"] += 1
+                count = info["malformed"]
+        if count == 1 or count % self.MALFORMED_LOG_EVERY == 0:
+            print(f"[HOST] Skipped malformed frame from {addr} ({count} so far): {error}")
+
+    def _count_dropped(self, addr, event_type, limiter):
+        with self.lock:
+            self.dropped_frames += 1
+        count = limiter.dropped[event_type]
+        if count == 1 or count % self.DROPPED_LOG_EVERY == 0:
+            print(f"[HOST] Rate limit: dropped {event_type.name} from {addr} ({count} so far)")
+
+    def record_heartbeat(self, addr, at=None):
+        """Mark a node as alive at time at (default: now)"""
         with self.lock:
             if addr in self.clients:
-                del self.clients[addr]
+                self.clients[addr]["last_heartbeat"] = self.clock.time() if at is None else at
 
     def _heartbeat_monitor(self):
         """Monitor heartbeats and remove nodes that have timed out"""
         while self.running:
-            time.sleep(10)  # Check every 10 seconds
-            current_time = time.time()
-            
-            with self.lock:
-                dead_nodes = [
-                    addr for addr, info in self.clients.items()
-                    if current_time - info["last_heartbeat"] > self.HEARTBEAT_TIMEOUT
-                ]
-                
-                for addr in dead_nodes:
-                    print(f"[HOST] Node {addr} timed out (no heartbeat). Removing...")
-                    try:
-                        self.clients[addr]["conn"].close()
-                    except:
-                        pass
-                    del self.clients[addr]
+            self.clock.sleep(self.heartbeat_check_interval())
+            if self.running:
+                self.expire_nodes()
+
+    def heartbeat_check_interval(self) -> float:
+        """Seconds until the next expiry check: about the shortest heartbeat interval, at most HEARTBEAT_CHECK_INTERVAL"""
+        with self.lock:
+            shortest = min((info["timeout"] for info in self.clients.values()), default=self.HEARTBEAT_TIMEOUT)
+        return min(self.HEARTBEAT_CHECK_INTERVAL, shortest / self.HEARTBEAT_MISSES)
+
+    def expire_nodes(self) -> list:
+        """Disconnect nodes that have been silent for longer than their timeout"""
+        current_time = self.clock.time()
+
+        with self.lock:
+            dead_nodes = [
+                addr for addr, info in self.clients.items()
+                if current_time - info["last_heartbeat"] > info["timeout"]
+            ]
+
+            for addr in dead_nodes:
+                print(f"[HOST] Node {addr} timed out (no heartbeat). Removing...")
+                try:
+                    self.clients[addr]["conn"].close()
+                except:
+                    pass
+                self._remove_client(addr)
+        for addr in dead_nodes:
+            self._node_gone(addr, "timeout")
+        return dead_nodes
 
     # ------------------------------
     # Sending events
     # ------------------------------
     def broadcast(self, event: AlarmEvent):
-        msg = event.to_json() + "\n"
-        print(f"[HOST] Broadcasting: {event.type.name}")
         with self.lock:
-            for addr, info in self.clients.items():
+            self.seq += 1
+            event = event.with_seq(self.seq)
+
+        # Fast path first: one datagram reaches every node. The TCP copy
+        # below carries the same seq and repairs any lost datagram.
+        if self.fast_path and event.type in self.FAST_PATH_TYPES:
+            self.fast_path.send(event)
+
+        self._send_all(event)
+
+    def broadcast_batch(self, events: list[AlarmEvent]):
+        """Broadcast several events as a single BATCH frame per node"""
+        if len(events) == 1:
+            self.broadcast(events[0])
+            return
+        with self.lock:
+            events = [event.with_seq(self.seq + i) for i, event in enumerate(events, 1)]
+            self.seq += len(events)
+        batch = AlarmEvent(EventType.BATCH, {"events": [event.to_dict() for event in events]})
+
+        if self.fast_path and any(event.type in self.FAST_PATH_TYPES for event in events):
+            self.fast_path.send(batch)
+
+        self._send_all(batch)
+
+    @staticmethod
+    def audience(event: AlarmEvent):
+        """Groups an event is addressed to, or None for every node.
+
+        AlarmManager puts the groups of a targeted alarm in data["groups"];
+        a BATCH goes to the union of its events' audiences.
+        """
+        if event.type == EventType.BATCH:
+            groups = set()
+            for data in (event.data or {}).get("events", []):
+                inner = (data.get("data") or {}).get("groups")
+                if not inner:
+                    return None
+                groups.update(inner)
+            return groups or None
+        groups = (event.data or {}).get("groups")
+        return set(groups) if groups else None
+
+    def _send_all(self, event: AlarmEvent):
+        line = event.to_json()
+        msg = (line + "\n").encode()
+        groups = self.audience(event)
+        if self.recorder:
+            self.recorder.record("o", "*" if groups is None else "groups:" + ",".join(sorted(groups)), line)
+        with self.lock:
+            if groups is None:
+                targets = list(self.clients.values())
+            else:
+                # Only the sockets indexed under the target groups are touched
+                addrs = set().union(*(self.groups.get(group, ()) for group in groups))
+                targets = [self.clients[addr] for addr in addrs]
+            for info in targets:
                 try:
-                    info["conn"].sendall(msg.encode())
+                    info["conn"].sendall(msg)
                 except:
                     pass
+        if groups is None:
+            print(f"[HOST] Broadcasting: {event.type.name}")
+        else:
+            print(f"[HOST] Sending {event.type.name} to {len(targets)} nodes in {', '.join(sorted(groups))}")
+
+    def send_to(self, addr, event: AlarmEvent) -> bool:
+        """Send an event to a single node. Returns False if the send failed"""
+        msg = event.to_json() + "\n"
+        if self.recorder:
+            self.recorder.record("o", addr, msg[:-1])
+        with self.lock:
+            info = self.clients.get(addr)
+            if not info:
+                return False
+            try:
+                info["conn"].sendall(msg.encode())
+                return True
+            except:
+                return False
+
+    def get_connected_nodes_count(self, groups=None) -> int:
+        """Get the number of currently connected nodes, or of those in any of groups"""
+        with self.lock:
+            if not groups:
+                return len(self.clients)
+            return len(set().union(*(self.groups.get(group, ()) for group in groups)))
+
+    def in_groups(self, addr, groups) -> bool:
+        """Whether the node at addr is in any of groups (True if groups is empty)"""
+        if not groups:
+            return True
+        with self.lock:
+            info = self.clients.get(addr)
+            return info is not None and not set(info["groups"]).isdisjoint(groups)
+
+    def get_nodes(self) -> list[dict]:
+        """Get a JSON-friendly summary of each connected node"""
+        with self.lock:
+            return [
+                {
+                    "addr": f"{addr[0]}:{addr[1]}",
+                    "connected_at": info["connected_at"],
+                    "last_heartbeat": info["last_heartbeat"],
+                    "timeout": info["timeout"],
+                    "malformed": info["malformed"],
+                    "dropped": {t.name: n for t, n in info["limiter"].dropped.copy().items()},
+                    "groups": list(info["groups"]),
+                }
+                for addr, info in self.clients.items()
+            ]
+
+    # ------------------------------
+    # Handoff to a new process
+    # ------------------------------
+    def detach(self, forward):
+        """Stop serving, without closing anything, so a new process can take over.
+
+        The receive and accept threads can't be woken without closing their
+        sockets, so each carries on until its next read or accept and then
+        calls forward(kind, addr, conn, data) instead of handling it:
+        "release" with the bytes read (plus any partial frame; None if the
+        node closed) or "accepted" for a new connection. Returns once no
+        thread is still handling frames, so snapshot() is consistent.
+        """
+        # Under both locks: the admission loop checks forward under self.lock
+        with self.lock, self.handling:
+            self.forward = forward
+            self.running = False
+        # Without self.lock, which the threads still handling frames may need
+        with self.handling:
+            while self.busy:
+                self.handling.wait()
+        self.admissions.put((None, None))
+        print("[HOST] Detached for handoff")
+
+    def snapshot(self) -> dict:
+        """JSON-friendly state of a detached host, for adopt() in the new process"""
+        with self.lock:
+            return {
+                "port": self.port,
+                "seq": self.seq,
+                "clients": [
+                    {
+                        "addr": list(addr),
+                        "connected_at": info["connected_at"],
+                        "last_heartbeat": info["last_heartbeat"],
+                        "timeout": info["timeout"],
+                        "malformed": info["malformed"],
+                        "groups": list(info["groups"]),
+                        "admitted": info["admitted"],
+                    }
+                    for addr, info in self.clients.items()
+                ],
+            }
+
+    def get_handoff_sockets(self) -> tuple:
+        """(listening socket, {addr: conn}) of a detached host, to pass to the new process"""
+        with self.lock:
+            return self.sock, {addr: info["conn"] for addr, info in self.clients.items()}
+
+    def adopt(self, snapshot: dict, listener, conns: dict):
+        """Take over a detached host's sockets and state. Call before start().
+
+        Nodes are registered straight away, so broadcasts reach them, but
+        each is only read from once release() hands it over (or
+        release_all(), once the old process has exited). Broadcast seq
+        numbers carry on, so nodes don't discard what we send as duplicates.
+
+        Args:
+            snapshot: The old host's snapshot()
+            listener: Its listening socket
+            conns: {addr: connection} for the nodes in the snapshot
+        """
+        self.sock = listener
+        self.seq = snapshot["seq"]
+        with self.lock:
+            for client in snapshot["clients"]:
+                addr = tuple(client["addr"])
+                conn = conns.get(addr)
+                if conn is None:
+                    continue
+                info = self._client_info(conn, client["connected_at"], client["last_heartbeat"],
+                                         client["malformed"], tuple(client["groups"]), client.get("timeout"))
+                info["admitted"] = client["admitted"]
+                self.clients[addr] = info
+                for group in info["groups"]:
+                    self.groups.setdefault(group, set()).add(addr)
+                self.pending_release.add(addr)
+                if not client["admitted"]:
+                    self.admissions.put((addr, conn))
+        print(f"[HOST] Adopted {len(self.pending_release)} node connections (seq {self.seq})")
+
+    def release(self, addr, data):
+        """Start reading an adopted node, beginning with data the old process read (None: it closed)"""
+        with self.lock:
+            if addr not in self.pending_release:
+                return
+            self.pending_release.discard(addr)
+            info = self.clients.get(addr)
+            if info is not None and data is None:
+                self._remove_client(addr)
+        if info is None:
+            return
+        if data is None:
+            print(f"[HOST] Node disconnected {addr}")
+            info["conn"].close()
+            self._node_gone(addr, "closed")
+            return
+        threading.Thread(target=self._client_recv_loop, args=(info["conn"], addr, data), daemon=True).start()
 
-    def get_connected_nodes_count(self) -> int:
-        """Get the number of currently connected nodes"""
+    def release_all(self):
+        """Start reading every adopted node not released yet (the old process is gone)"""
         with self.lock:
-            return len(self.clients)
+            remaining = list(self.pending_release)
+        for addr in remaining:
+            self.release(addr, b"")
 
     # ------------------------------
     # Control
     # ------------------------------
-    def start(self):
+    def start(self, advertise=True):
         self.running = True
-        self.start_advertising()
+        if advertise:
+            self.start_advertising()
         self.start_tcp_server()
 
     def stop(self):
         print("[HOST] Stopping host...")
         self.running = False
-        self.zeroconf.unregister_service(self.service_info)
-        self.zeroconf.close()
+        self.admissions.put((None, None))
+        if self.zeroconf:
+            self.zeroconf.unregister_service(self.service_info)
+            self.zeroconf.close()
         with self.lock:
             for addr, info in self.clients.items():
                 try:
@@ -193,3 +729,7 @@ class AlarmHost:
             self.sock.close()
         except:
             pass
+        if self.fast_path:
+            self.fast_path.close()
+        if self.recorder:
+            self.recorder.close()
@@ -0,0 +1,109 @@
+import threading
+from common.clock import SYSTEM_CLOCK
+from common.comms.protocol import Alarm
+from common.comms.fire_timer import FireTimer
+
+
+class LocalSchedule:
+    """Node-side copy of the host's alarm schedule.
+
+    The node caches the alarm from ALARM_SET and keeps its own deadline timer
+    armed, so it rings on time even if the host is unreachable. Fire times are
+    kept on the host clock (so they identify an occurrence the same way the
+    host does) and converted to the node clock with the ClockSync offset.
+    Alarms are one-shot, like on the host: once fired, the cached alarm is
+    consumed.
+    """
+
+    def __init__(self, clock_sync, on_fire, clock=SYSTEM_CLOCK):
+        """
+        Initialize the local schedule.
+
+        Args:
+            clock_sync: ClockSync used to convert between host and node clocks
+            on_fire: Called with the occurrence's host-clock fire time when it fires
+            clock: This node's clock (see common.clock)
+        """
+        self.clock_sync = clock_sync
+        self.on_fire = on_fire
+        self.clock = clock
+        self.timer = FireTimer(clock=clock)
+        self.alarm = None          # Cached alarm, None once fired or cleared
+        self.fire_at = None        # Host-clock fire time of the pending occurrence
+        self.last_fired_at = None  # Host-clock fire time of the last occurrence that fired
+        self.lock = threading.Lock()
+
+    def set_alarm(self, alarm: Alarm, fire_at: float | None = None):
+        """Cache an alarm and arm the timer. fire_at overrides the locally computed time"""
+        if fire_at is None:
+            host_now = self.clock_sync.to_host(self.clock.time())
+            fire_at = alarm.get_next_trigger_time(now=host_now)
+        with self.lock:
+            if self._already_fired(fire_at):
+                return
+            self.alarm = alarm
+            self.fire_at = fire_at
+        self._arm()
+
+    def mark_fired(self, fire_at: float | None):
+        """Record that an occurrence fired by other means (e.g. ALARM_TRIGGERED)"""
+        with self.lock:
+            if fire_at is None or self._matches(self.fire_at, fire_at):
+                self.alarm = None
+                self.fire_at = None
+                self.timer.cancel()
+            if fire_at is not None:
+                self.last_fired_at = fire_at
+
+    def has_fired(self, fire_at: float | None) -> bool:
+        """Check if the occurrence at fire_at has already fired locally"""
+        with self.lock:
+            return fire_at is not None and self._already_fired(fire_at)
+
+    def clear(self):
+        """Drop the cached alarm"""
+        with self.lock:
+            self.alarm = None
+            self.fire_at = None
+        self.timer.cancel()
+
+    def resync(self):
+        """Re-arm with the latest clock offset (call after a TIME_SYNC reply)"""
+        with self.lock:
+            if self.fire_at is None:
+                return
+        self._arm()
+
+    def get_alarm(self) -> Alarm | None:
+        with self.lock:
+            return self.alarm
+
+    def get_fire_at(self) -> float | None:
+        """Host-clock fire time of the pending occurrence, if any"""
+        with self.lock:
+            return self.fire_at
+
+    def _arm(self):
+        with self.lock:
+            fire_at = self.fire_at
+        if fire_at is None:
+            return
+        local_fire_at = self.clock_sync.to_local(fire_at)
+        self.timer.arm(local_fire_at, lambda: self._fire(fire_at))
+
+    def _fire(self, fire_at):
+        with self.lock:
+            if not self._matches(self.fire_at, fire_at):
+                return
+            self.alarm = None
+            self.fire_at = None
+            self.last_fired_at = fire_at
+        self.on_fire(fire_at)
+
+    def _already_fired(self, fire_at):
+        return self._matches(self.last_fired_at, fire_at)
+
+    @staticmethod
+    def _matches(a, b):
+        # Host and node compute fire times independently; allow a little slack
+        return a is not None and b is not None and abs(a - b) < 1.0
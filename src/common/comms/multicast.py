@@ -0,0 +1,105 @@
+import socket
+import struct
+import threading
+from common.comms.protocol import AlarmEvent
+
+DEFAULT_GROUP = "239.255.42.99"  # Organization-local scope, stays on the LAN
+DEFAULT_PORT = 5002
+
+
+class MulticastSender:
+    """Host side of the UDP multicast fast path.
+
+    One datagram reaches every subscribed node, so time-critical events cost
+    a single send regardless of node count. Delivery is best-effort; the TCP
+    stream carries the same events (with the same sequence number) as the
+    repair path.
+    """
+
+    def __init__(self, group=DEFAULT_GROUP, port=DEFAULT_PORT, interface="0.0.0.0", ttl=1):
+        """
+        Initialize the multicast sender.
+
+        Args:
+            group: Multicast group address
+            port: UDP port nodes listen on
+            interface: Local interface address to send from
+            ttl: Multicast TTL (1 keeps packets on the local subnet)
+        """
+        self.group = group
+        self.port = port
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+    def send(self, event: AlarmEvent) -> bool:
+        """Send one event datagram. Returns False if the send failed"""
+        try:
+            self.sock.sendto(event.to_json().encode(), (self.group, self.port))
+            return True
+        except OSError as e:
+            print(f"[MCAST] Failed to send {event.type.name}: {e}")
+            return False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class MulticastReceiver:
+    """Node side of the UDP multicast fast path"""
+
+    def __init__(self, handler, group=DEFAULT_GROUP, port=DEFAULT_PORT, interface="0.0.0.0", allowed_sender=None):
+        """
+        Initialize the multicast receiver.
+
+        Args:
+            handler: Called with each received AlarmEvent
+            group: Multicast group address
+            port: UDP port to listen on
+            interface: Local interface address to join the group on
+            allowed_sender: If set, drop datagrams not sent from this IP
+        """
+        self.handler = handler
+        self.allowed_sender = allowed_sender
+        self.running = False
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind(("", port))
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._recv_loop, daemon=True).start()
+
+    def _recv_loop(self):
+        while self.running:
+            try:
+                data, (sender, _) = self.sock.recvfrom(65535)
+            except OSError:
+                break
+            if self.allowed_sender and sender != self.allowed_sender:
+                continue
+            try:
+                event = AlarmEvent.from_json(data.decode())
+            except Exception as e:
+                print(f"[MCAST] Dropping malformed datagram from {sender}: {e}")
+                continue
+            try:
+                self.handler(event)
+            except Exception as e:
+                # Keep listening: the TCP copy of the event still arrives
+                print(f"[MCAST] Dropping {event.type.name} from {sender} the handler could not apply: {e}")
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
@@ -1,11 +1,24 @@
-from zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
 import socket
-import json
+import time
 from common.comms.protocol import AlarmEvent, EventType
+from common.comms.clock_sync import ClockSync
 
 class AlarmNode:
-    def __init__(self):
-        self.zeroconf = Zeroconf()
+    CONNECT_TIMEOUT = 5  # Seconds to wait for the host to accept a connection
+
+    def __init__(self, groups=(), recorder=None):
+        """
+        Initialize the node.
+
+        Args:
+            groups: Groups (room, floor, role) this node belongs to; alarms
+                    targeted at other groups are not sent to it
+            recorder: Optional CaptureWriter for every frame to and from the
+                      host (see common.comms.capture)
+        """
+        self.groups = tuple(groups)
+        self.recorder = recorder
+        self.zeroconf = None   # Created when discovery starts
         self.browser = None
         self.host_ip = None
         self.host_port = None
@@ -13,10 +26,18 @@ class AlarmNode:
         self.connected = False
         self.alarm_triggered = False  # Track if alarm is currently triggered
         self.event_handler = None  # Callback for handling received events
+        self.clock_sync = ClockSync()  # Offset between our clock and the host's
+        self.multicast = None  # (group, port) of the host's fast path, if advertised
+        self.heartbeat_interval = None  # Announced to the host in HELLO (see set_heartbeat_interval)
+        self.last_sent = 0.0  # time.monotonic() of the last frame sent; any frame is a heartbeat
         print("[NODE] Initialized")
 
     def start_discovery(self):
         """Start discovering the host via Zeroconf"""
+        # zeroconf (and the asyncio/ifaddr stack under it) is most of the
+        # node's import time and RSS, so only load it when discovery is used
+        from zeroconf import ServiceBrowser, Zeroconf
+        self.zeroconf = Zeroconf()
         self.browser = ServiceBrowser(
             self.zeroconf,
             "_alarmhost._tcp.local.",
@@ -25,6 +46,7 @@ class AlarmNode:
         print("[NODE] Searching for host...")
 
     def _on_service_state_change(self, zeroconf, service_type, name, state_change):
+        from zeroconf import ServiceStateChange
         print(f"[DEBUG] Zeroconf change: {name} -> {state_change}")
 
         # Host appeared
@@ -33,30 +55,72 @@ class AlarmNode:
             if info:
                 self.host_ip = self._decode_ip(info)
                 self.host_port = info.port
+                self.multicast = self._decode_multicast(info)
                 print(f"[NODE] Found host at {self.host_ip}:{self.host_port}")
                 self._connect_to_host()
 
-        # Host disappeared
+        # Host disappeared. Keep the last address around so we can keep
+        # trying to reconnect; mDNS can lag well behind the host coming back.
         elif state_change == ServiceStateChange.Removed:
             print("[NODE] Host disappeared.")
-            self.host_ip = None
-            self.host_port = None
             self.connected = False
 
     def _decode_ip(self, info):
         return ".".join(str(b) for b in info.addresses[0])
 
+    def _decode_multicast(self, info):
+        value = (info.properties or {}).get(b"mcast")
+        if not value:
+            return None
+        group, port = value.decode().rsplit(":", 1)
+        return group, int(port)
+
+    def connect(self, host_ip, host_port, multicast=None) -> bool:
+        """Connect to a known host address directly, skipping discovery.
+
+        Args:
+            host_ip: Address of the host TCP server
+            host_port: Port of the host TCP server
+            multicast: Optional (group, port) of the host's fast path
+        """
+        self.host_ip = host_ip
+        self.host_port = host_port
+        self.multicast = multicast
+        self._connect_to_host()
+        return self.connected
+
     def _connect_to_host(self):
         """Connect to the host via TCP"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.settimeout(self.CONNECT_TIMEOUT)
             self.socket.connect((self.host_ip, self.host_port))
+            self.socket.settimeout(None)
             self.connected = True
             print(f"[NODE] Connected to host at {self.host_ip}:{self.host_port}")
+            if self.recorder:
+                self.recorder.record("c", (self.host_ip, self.host_port))
+            # Before anything else, so the host indexes us under our groups
+            hello = {"groups": list(self.groups)}
+            if self.heartbeat_interval is not None:
+                hello["heartbeat_interval"] = self.heartbeat_interval
+            self.send(AlarmEvent(EventType.HELLO, hello))
         except Exception as e:
             print(f"[NODE] Failed to connect to host: {e}")
             self.connected = False
 
+    def reconnect(self) -> bool:
+        """Try to reconnect to the last known host address"""
+        if self.host_ip is None or self.host_port is None:
+            return False
+        if self.socket:
+            try:
+                self.socket.close()
+            except:
+                pass
+        self._connect_to_host()
+        return self.connected
+
     def send(self, event: AlarmEvent):
         """Send an alarm event to the host"""
         if not self.connected or self.socket is None:
@@ -64,12 +128,40 @@ class AlarmNode:
             return
         try:
             message = event.to_json()
+            if self.recorder:
+                self.recorder.record("o", (self.host_ip, self.host_port), message)
             self.socket.sendall((message + "\n").encode())
+            self.last_sent = time.monotonic()
             print(f"[NODE] Sent event: {event.type.name}")
         except Exception as e:
             print(f"[NODE] Failed to send event: {e}")
             self.connected = False
 
+    def idle_for(self) -> float:
+        """Seconds since we last sent the host anything"""
+        return time.monotonic() - self.last_sent
+
+    def set_heartbeat_interval(self, interval: float):
+        """Promise the host a frame at least every interval seconds.
+
+        The host removes nodes that miss a few intervals in a row, so tell it
+        before going quiet for longer. Sent only when the interval changes.
+        """
+        if interval == self.heartbeat_interval:
+            return
+        self.heartbeat_interval = interval
+        if self.connected:
+            self.send(AlarmEvent(EventType.HELLO, {"heartbeat_interval": interval}))
+
+    def sync_clock(self):
+        """Send a TIME_SYNC request; the reply is fed to clock_sync by the receiver"""
+        self.send(AlarmEvent(EventType.TIME_SYNC, self.clock_sync.make_request()))
+
+    def record_received(self, frame: str):
+        """Capture a frame received from the host (the receive loop lives in the app)"""
+        if self.recorder:
+            self.recorder.record("i", (self.host_ip, self.host_port), frame)
+
     def set_event_handler(self, handler):
         """Set callback for handling received events"""
         self.event_handler = handler
@@ -89,5 +181,7 @@ class AlarmNode:
             self.browser.cancel()
         if self.zeroconf:
             self.zeroconf.close()
+        if self.recorder:
+            self.recorder.close()
         self.connected = False
         print("[NODE] Stopped")
@@ -1,8 +1,9 @@
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass
+import datetime
 import json
 import time
 from enum import Enum, auto
-from typing import Any
+from common.trigger_table import local_zone, next_occurrences
 
 class EventType(Enum):
     ALARM_SET = auto()
@@ -11,13 +12,25 @@ class EventType(Enum):
     HEARTBEAT = auto()
     SNOOZE_PRESSED = auto()
     ACK = auto()
+    TIME_SYNC = auto()
+    ALARM_ARMED = auto()
+    BATCH = auto()
+    HELLO = auto()  # Node -> host right after connecting: {"groups": [...], "heartbeat_interval": s};
+                    # resent with just "heartbeat_interval" when that changes
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Alarm:
-    """Represents an alarm with hours and minutes in 12-hour format"""
+    """Represents an alarm with hours and minutes in 12-hour format.
+
+    Immutable and slotted, so an instance is just its four fields.
+
+    groups targets the alarm at nodes in any of those groups (rooms, floors,
+    roles); empty means every node.
+    """
     hours: int  # 1-12
     minutes: int  # 0-59
     is_pm: bool = False  # True for PM, False for AM
+    groups: tuple[str, ...] = ()
 
     def __post_init__(self):
         """Validate alarm time"""
@@ -25,75 +38,142 @@ class Alarm:
             raise ValueError(f"Hours must be 1-12 for 12-hour format, got {self.hours}")
         if not (0 <= self.minutes <= 59):
             raise ValueError(f"Minutes must be 0-59, got {self.minutes}")
+        if not isinstance(self.groups, tuple):
+            object.__setattr__(self, "groups", tuple(self.groups))
 
     def to_dict(self) -> dict:
-        return {"hours": self.hours, "minutes": self.minutes, "is_pm": self.is_pm}
+        data = {"hours": self.hours, "minutes": self.minutes, "is_pm": self.is_pm}
+        if self.groups:
+            data["groups"] = list(self.groups)
+        return data
 
     @staticmethod
     def from_dict(data: dict) -> "Alarm":
         return Alarm(
             hours=data["hours"],
             minutes=data["minutes"],
-            is_pm=data.get("is_pm", False)
+            is_pm=data.get("is_pm", False),
+            groups=tuple(data.get("groups", ())),
         )
 
+    def is_for(self, groups) -> bool:
+        """Whether a node in groups should ring for this alarm"""
+        return not self.groups or not set(self.groups).isdisjoint(groups)
+
     def get_24hr_time(self) -> tuple[int, int]:
         """Convert 12-hour format to 24-hour format. Returns (hour_24, minutes)"""
         # 12:xx AM = 00:xx (midnight hour)
         # 1-11:xx AM = 1-11:xx (morning hours)
         # 12:xx PM = 12:xx (noon hour)
         # 1-11:xx PM = 13-23:xx (afternoon/evening hours)
-        
-        if self.is_pm:
-            # PM times
-            if self.hours == 12:
-                hour_24 = 12  # 12 PM stays 12
-            else:
-                hour_24 = self.hours + 12  # 1-11 PM becomes 13-23
-        else:
-            # AM times
-            if self.hours == 12:
-                hour_24 = 0  # 12 AM becomes 00 (midnight)
-            else:
-                hour_24 = self.hours  # 1-11 AM stays 1-11
-        
-        return hour_24, self.minutes
-
-    def get_next_trigger_time(self) -> float:
-        """Calculate the next trigger time (unix timestamp) for this alarm"""
-        import datetime
-        now = datetime.datetime.now()
+        return self.hours % 12 + (12 if self.is_pm else 0), self.minutes
+
+    def get_next_trigger_time(self, now=None, tz=None) -> float:
+        """Calculate the next trigger time (unix timestamp) for this alarm after now.
+
+        now may be a timestamp or a datetime (naive means local time) and
+        defaults to the current time. DST gaps and overlaps are resolved as
+        in common.trigger_table.resolve_local_time.
+        """
+        if now is None:
+            now = time.time()
+        elif isinstance(now, datetime.datetime):
+            now = now.timestamp()
         hour_24, minute = self.get_24hr_time()
-        alarm_time = now.replace(hour=hour_24, minute=minute, second=0, microsecond=0)
-        
-        # If the alarm time has already passed today, schedule for tomorrow
-        if alarm_time <= now:
-            alarm_time += datetime.timedelta(days=1)
-        
-        return alarm_time.timestamp()
+        return next_occurrences(hour_24, minute, now, tz or local_zone())[0][0]
 
     def __str__(self) -> str:
         """Return a human-readable string representation"""
         period = "PM" if self.is_pm else "AM"
         return f"{self.hours}:{self.minutes:02d} {period}"
 
-@dataclass
+class MalformedFrame(ValueError):
+    """A frame that does not decode to a valid AlarmEvent"""
+
+
+# Every frame written by AlarmEvent.to_json() starts with this, followed by
+# the numeric type (to_dict() puts it first)
+_TYPE_PREFIX = '{"type": '
+
+
+def peek_event_type(frame: str) -> EventType:
+    """
+    Classify a frame by its type without decoding the rest of it.
+
+    Only the type field is checked, so the caller must still decode (and
+    validate) any frame it needs the contents of.
+
+    Raises:
+        MalformedFrame: if the frame has no recognizable type
+    """
+    if frame.startswith(_TYPE_PREFIX):
+        end = frame.find(",", len(_TYPE_PREFIX))
+        try:
+            return EventType(int(frame[len(_TYPE_PREFIX):end]))
+        except ValueError:
+            pass
+    # Not in our own encoding (or not valid at all): take the slow path
+    try:
+        return EventType(json.loads(frame)["type"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise MalformedFrame(f"{e}: {frame[:80]!r}") from e
+
+
+@dataclass(frozen=True, slots=True)
 class AlarmEvent:
+    """One protocol message. Immutable, so one instance can be shared by the
+    dispatcher workers and the host's send path (see with_seq)."""
     type: EventType
-    data: dict[str, Any] = None
+    data: dict | None = None
     timestamp: float | None = None
+    seq: int | None = None  # Host broadcast sequence number, used to drop duplicates
 
     def __post_init__(self):
         if self.timestamp is None:
-            self.timestamp = time.time()
+            object.__setattr__(self, "timestamp", time.time())
+
+    def to_dict(self) -> dict:
+        # Keep "type" first: peek_event_type relies on it. data is shared,
+        # not copied; events are treated as read-only once created.
+        return {"type": self.type.value, "data": self.data, "timestamp": self.timestamp, "seq": self.seq}
 
     def to_json(self) -> str:
-        payload = asdict(self)
-        payload["type"] = self.type.value
-        return json.dumps(payload)
+        return json.dumps(self.to_dict())
+
+    def with_seq(self, seq: int) -> "AlarmEvent":
+        """A copy of this event stamped with a host broadcast sequence number"""
+        return AlarmEvent(self.type, self.data, self.timestamp, seq)
+
+    @staticmethod
+    def from_dict(raw: dict) -> "AlarmEvent":
+        return AlarmEvent(EventType(raw["type"]), raw.get("data"), raw.get("timestamp"), raw.get("seq"))
 
     @staticmethod
     def from_json(data: str) -> "AlarmEvent":
-        raw = json.loads(data)
-        raw["type"] = EventType(raw["type"])
-        return AlarmEvent(**raw)
+        try:
+            return AlarmEvent.from_dict(json.loads(data))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise MalformedFrame(f"{e}: {data[:80]!r}") from e
+
+    def unpack(self, on_malformed=None) -> list["AlarmEvent"]:
+        """Events carried by this frame: the contents of a BATCH, else just this event.
+
+        Raises MalformedFrame if a BATCH has no list of events. An inner event
+        that doesn't decode raises it too, unless on_malformed is given: then
+        it is called with the MalformedFrame and the other events are kept.
+        """
+        if self.type != EventType.BATCH:
+            return [self]
+        raw_events = (self.data or {}).get("events") if isinstance(self.data, dict) else None
+        if not isinstance(raw_events, list):
+            raise MalformedFrame(f"BATCH without a list of events: {self.data!r:.80}")
+        events = []
+        for raw in raw_events:
+            try:
+                events.append(AlarmEvent.from_dict(raw))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                error = MalformedFrame(f"{e}: {raw!r:.80}")
+                if on_malformed is None:
+                    raise error from e
+                on_malformed(error)
+        return events
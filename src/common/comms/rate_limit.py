@@ -0,0 +1,78 @@
+from common.clock import SYSTEM_CLOCK
+
+
+class TokenBucket:
+    """Token bucket: allows bursts of up to `burst`, refilling at `rate` per second.
+
+    Not thread-safe; callers that share a bucket across threads hold their
+    own lock around it.
+    """
+
+    def __init__(self, rate: float, burst: float, clock=SYSTEM_CLOCK):
+        """
+        Initialize the bucket, full.
+
+        Args:
+            rate: Tokens added per second
+            burst: Bucket capacity (the largest burst allowed at once)
+            clock: Clock for refill timing (see common.clock)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock.monotonic()
+
+    def _refill(self):
+        now = self.clock.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, count: float = 1) -> bool:
+        """Take count tokens if available. Returns False (taking none) if not"""
+        self._refill()
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+    def wait_time(self, count: float = 1) -> float:
+        """Seconds until count tokens will be available (0 if they are now)"""
+        self._refill()
+        return max(0.0, (count - self.tokens) / self.rate)
+
+
+class InboundLimiter:
+    """Per-event-type token buckets for the frames of one connection.
+
+    Each event type in `limits` gets its own bucket, created on first use;
+    types not listed share the bucket under the None key, if there is one.
+    Meant to be owned by the connection's receive thread.
+    """
+
+    def __init__(self, limits: dict, clock=SYSTEM_CLOCK):
+        """
+        Initialize the limiter.
+
+        Args:
+            limits: {event type or None: (rate per second, burst)}; an empty
+                    dict allows everything
+            clock: Clock for refill timing (see common.clock)
+        """
+        self.limits = limits
+        self.clock = clock
+        self.buckets = {}
+        self.dropped = {}  # {event type: frames refused}
+
+    def allow(self, event_type) -> bool:
+        """Take a token for one frame of event_type; False (and counted) if over the limit"""
+        key = event_type if event_type in self.limits else None
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if key not in self.limits:
+                return True
+            bucket = self.buckets[key] = TokenBucket(*self.limits[key], clock=self.clock)
+        if bucket.take():
+            return True
+        self.dropped[event_type] = self.dropped.get(event_type, 0) + 1
+        return False
@@ -1,5 +1,5 @@
 import RPi.GPIO as GPIO
-import time
+from common.clock import SYSTEM_CLOCK
 
 # Global flag to ensure GPIO.setmode is called only once
 _GPIO_MODE_SET = False
@@ -17,17 +17,19 @@ def _ensure_gpio_mode():
 class SnoozeButton:
     """Handles snooze button input with debouncing using RPi.GPIO."""
     
-    def __init__(self, button_pin=27, hold_time=0.1):
+    def __init__(self, button_pin=27, hold_time=0.1, clock=SYSTEM_CLOCK):
         """
         Initialize the snooze button.
         
         Args:
             button_pin: GPIO pin number for the button
             hold_time: Time to hold button before registering (debounce), in seconds
+            clock: Clock the debounce and timeout are measured on (see common.clock)
         """
         _ensure_gpio_mode()
         self.pin = button_pin
         self.hold_time = hold_time
+        self.clock = clock
         self.pressed = False
         self._last_press_time = 0
         
@@ -53,16 +55,16 @@ class SnoozeButton:
         Returns:
             True if button was pressed, False if timeout occurred
         """
-        start = time.time()
+        start = self.clock.monotonic()
         while True:
             if self.is_pressed():
                 # Debounce: wait for hold_time
-                time.sleep(self.hold_time)
+                self.clock.sleep(self.hold_time)
                 if self.is_pressed():
                     return True
-            if timeout and (time.time() - start) > timeout:
+            if timeout and (self.clock.monotonic() - start) > timeout:
                 return False
-            time.sleep(0.01)
+            self.clock.sleep(0.01)
     
     def close(self):
         """Clean up GPIO resources"""
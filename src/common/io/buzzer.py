@@ -1,6 +1,6 @@
 import RPi.GPIO as GPIO
-import time
 import threading
+from common.clock import SYSTEM_CLOCK
 
 # Global flag to ensure GPIO.setmode is called only once
 _GPIO_MODE_SET = False
@@ -18,17 +18,19 @@ def _ensure_gpio_mode():
 class BuzzerController:
     """Buzzer controller using RPi.GPIO with PWM for passive buzzers"""
     
-    def __init__(self, buzzer_pin, frequency=1000):
+    def __init__(self, buzzer_pin, frequency=1000, clock=SYSTEM_CLOCK):
         """
         Initialize buzzer controller.
         
         Args:
             buzzer_pin: GPIO pin number for the buzzer
             frequency: PWM frequency in Hz (default 1000 for passive buzzer)
+            clock: Clock the beep pattern is timed on (see common.clock)
         """
         _ensure_gpio_mode()
         self.pin = buzzer_pin
         self.frequency = frequency
+        self.clock = clock
         self.is_on = False
         self._pwm = None
         self._beep_thread = None
@@ -66,13 +68,13 @@ class BuzzerController:
         while self.is_on:
             try:
                 self._pwm.start(5)
-                time.sleep(0.3)  # Beep for 300ms
+                self.clock.sleep(0.3)  # Beep for 300ms
                 
                 if not self.is_on:
                     break
                 
                 self._pwm.stop()
-                time.sleep(0.3)  # Silence for 300ms
+                self.clock.sleep(0.3)  # Silence for 300ms
             except Exception:
                 break
 
@@ -1,6 +1,6 @@
 import RPi.GPIO as GPIO
 import threading
-import time
+from common.clock import SYSTEM_CLOCK
 
 # Global flag to ensure GPIO.setmode is called only once
 _GPIO_MODE_SET = False
@@ -18,13 +18,14 @@ def _ensure_gpio_mode():
 class LedController:
     """Simple LED controller with steady on/off and blink support using RPi.GPIO."""
 
-    def __init__(self, pin):
+    def __init__(self, pin, clock=SYSTEM_CLOCK):
         _ensure_gpio_mode()
         try:
             GPIO.setup(pin, GPIO.OUT)
         except Exception:
             pass  # Pin may already be set up
         self.pin = pin
+        self.clock = clock  # Times the blink loop (see common.clock)
         self._blinking = False
         self._blink_thread = None
 
@@ -53,14 +54,14 @@ class LedController:
                     GPIO.output(self.pin, GPIO.HIGH)
                 except Exception:
                     pass
-                time.sleep(on_time)
+                self.clock.sleep(on_time)
                 if not self._blinking:
                     break
                 try:
                     GPIO.output(self.pin, GPIO.LOW)
                 except Exception:
                     pass
-                time.sleep(off_time)
+                self.clock.sleep(off_time)
             # Ensure LED off when stopping blink
             try:
                 GPIO.output(self.pin, GPIO.LOW)
@@ -0,0 +1,92 @@
+import threading
+import time
+
+
+class TimedLock:
+    """threading.Lock that keeps count of how long threads waited for it.
+
+    A drop-in for the host's main locks (with, acquire/release, and as the
+    lock of a threading.Condition). Counters are approximate but cost
+    almost nothing: `with` on a free lock goes straight to the C lock, and
+    only a thread that finds it taken goes through the timed path.
+
+    A plain Python __enter__/__exit__ would not do. Python can switch
+    threads after any call returns, so a thread could lose the GIL right
+    after acquiring and keep everyone waiting for a whole switch interval
+    (5ms) while holding the lock. `with` looks both methods up before it
+    acquires, so the properties below do their bookkeeping first and hand
+    back the C lock's own methods.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the lock.
+
+        Args:
+            name: Shown in stats() and the host's /admin/locks report
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0      # Acquisitions that found the lock taken
+        self.wait_total = 0.0   # Seconds spent waiting, summed over all threads
+        self.wait_max = 0.0
+
+    def acquire(self, blocking=True, timeout=-1) -> bool:
+        self.acquisitions += 1
+        if not blocking or not self._lock.locked():
+            return self._lock.acquire(blocking, timeout)
+        return self._timed_acquire(timeout)
+
+    def _timed_acquire(self, timeout=-1) -> bool:
+        started = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        waited = time.perf_counter() - started
+        self.contended += 1
+        self.wait_total += waited
+        if waited > self.wait_max:
+            self.wait_max = waited
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    @property
+    def __enter__(self):
+        self.acquisitions += 1
+        if self._lock.locked():
+            return self._timed_acquire
+        return self._lock.__enter__
+
+    @property
+    def __exit__(self):
+        return self._lock.__exit__
+
+    def _is_owned(self) -> bool:
+        # For threading.Condition; its fallback would count as an acquisition
+        if self._lock.acquire(False):
+            self._lock.release()
+            return False
+        return True
+
+    def stats(self) -> dict:
+        """Counters since start (or the last reset), wait times in milliseconds"""
+        acquisitions, contended, wait_total = self.acquisitions, self.contended, self.wait_total
+        return {
+            "name": self.name,
+            "acquisitions": acquisitions,
+            "contended": contended,
+            "wait_total_ms": round(wait_total * 1000, 3),
+            "wait_mean_ms": round(wait_total * 1000 / contended, 3) if contended else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "locked": self.locked(),
+        }
+
+    def reset(self):
+        with self:
+            self.acquisitions = self.contended = 0
+            self.wait_total = self.wait_max = 0.0
@@ -0,0 +1,111 @@
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+LOCALTIME_FILE = "/etc/localtime"
+
+
+def local_zone():
+    """The process's local timezone as a tzinfo with full DST rules.
+
+    Follows the TZ environment variable (re-read on every call, so a
+    time.tzset() after changing it is picked up) and falls back to
+    /etc/localtime, then to the current fixed UTC offset.
+    """
+    return _load_zone(os.environ.get("TZ"))
+
+
+@lru_cache(maxsize=8)
+def _load_zone(key):
+    # Imported on first use: zoneinfo costs ~10ms of node startup and is
+    # not needed until the first alarm is scheduled
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    try:
+        if key:
+            return ZoneInfo(key.lstrip(":"))
+        with open(LOCALTIME_FILE, "rb") as f:
+            return ZoneInfo.from_file(f, key="localtime")
+    except (ZoneInfoNotFoundError, OSError, ValueError):
+        offset = time.localtime().tm_gmtoff
+        print(f"[TRIGGERS] No tz database for {key or LOCALTIME_FILE}, using fixed UTC offset {offset}s")
+        return timezone(timedelta(seconds=offset))
+
+
+def resolve_local_time(day: date, hour: int, minute: int, tz) -> tuple[float, str]:
+    """
+    Turn a wall-clock time on a given day into a unix timestamp.
+
+    Returns:
+        (timestamp, kind) where kind is "normal", "nonexistent" (inside a
+        spring-forward gap: shifted forward by the gap, so 2:30 becomes 3:30)
+        or "ambiguous" (inside a fall-back overlap: the first occurrence)
+    """
+    wall = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+    # fold=0 uses the offset in effect before a transition, which is the
+    # first of two ambiguous times and shifts a nonexistent time forward
+    ts = wall.timestamp()
+    if wall.utcoffset() != wall.replace(fold=1).utcoffset():
+        round_trip = datetime.fromtimestamp(ts, tz).replace(tzinfo=None)
+        kind = "ambiguous" if round_trip == wall.replace(tzinfo=None) else "nonexistent"
+    else:
+        kind = "normal"
+    return ts, kind
+
+
+def next_occurrences(hour: int, minute: int, after: float, tz, count: int = 1) -> list[tuple[float, str]]:
+    """The next count times (timestamp, kind) the wall clock reads hour:minute after a timestamp"""
+    day = datetime.fromtimestamp(after, tz).date()
+    occurrences = []
+    while len(occurrences) < count:
+        ts, kind = resolve_local_time(day, hour, minute, tz)
+        if ts > after:
+            occurrences.append((ts, kind))
+        day += timedelta(days=1)
+    return occurrences
+
+
+class TriggerTable:
+    """Precomputed upcoming fire times of one alarm.
+
+    Computing fire times is timezone aware (see resolve_local_time), so DST
+    transitions are baked into the table when it is built. The table is only
+    rebuilt when it runs out, when the local timezone changes, or when the
+    clock jumps back before the time it was built for; schedule edits build
+    a new table.
+    """
+
+    def __init__(self, alarm, size: int = 8, zone=local_zone):
+        """
+        Initialize the trigger table.
+
+        Args:
+            alarm: Alarm to compute fire times for
+            size: Number of occurrences to precompute
+            zone: Function returning the timezone to compute in
+        """
+        self.alarm = alarm
+        self.size = size
+        self.zone = zone
+        self.tz = None
+        self.built_at = None
+        self.occurrences = []  # [(timestamp, kind)], ascending
+        self.rebuilds = 0
+
+    def next_after(self, now: float) -> tuple[float, str]:
+        """The first occurrence (timestamp, kind) strictly after now"""
+        tz = self.zone()
+        if tz is not self.tz or self.built_at is None or now < self.built_at:
+            self._build(now, tz)
+        while self.occurrences and self.occurrences[0][0] <= now:
+            self.occurrences.pop(0)
+        if not self.occurrences:
+            self._build(now, tz)
+        return self.occurrences[0]
+
+    def _build(self, now, tz):
+        hour, minute = self.alarm.get_24hr_time()
+        self.tz = tz
+        self.built_at = now
+        self.occurrences = next_occurrences(hour, minute, now, tz, self.size)
+        self.rebuilds += 1
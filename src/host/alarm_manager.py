@@ -1,9 +1,28 @@
 import threading
+from typing import NamedTuple
 from common.comms.protocol import Alarm, AlarmEvent, EventType
+from common.timed_lock import TimedLock
+
+
+class AlarmState(NamedTuple):
+    """One version of the alarm state. Never modified; each change publishes a new one"""
+    version: int = 0
+    alarm: Alarm | None = None          # Single alarm scheduled
+    active: bool = False                # Is the alarm currently ringing?
+    snooze_count: int = 0               # Number of devices that have snoozed
+    armed_fire_at: float | None = None  # Fire time nodes have been pre-armed with
+    active_fire_at: float | None = None # Fire time of the occurrence currently ringing
 
 
 class AlarmManager:
-    """Manages alarm state and handles alarm-related events"""
+    """Manages alarm state and handles alarm-related events.
+
+    Changes are made under the lock and published as a new immutable
+    AlarmState. Readers take the current one with snapshot() (or the
+    getters) without locking, so polling the state never waits for a
+    change in progress. wait_for_version() blocks until a newer state
+    exists.
+    """
     
     def __init__(self, event_callback):
         """
@@ -11,74 +30,194 @@ class AlarmManager:
         
         Args:
             event_callback: Function to call when broadcasting events.
-                           Takes (event: AlarmEvent) as argument.
+                           Takes (event: AlarmEvent) as argument. It is
+                           called while the manager lock is held, so events
+                           are published in the order the state changed; it
+                           must only queue the event (see EventDispatcher),
+                           never do network or GPIO I/O itself.
         """
-        self.current_alarm = None  # Single Alarm object scheduled
-        self.alarm_active = False  # Is an alarm currently triggered?
-        self.snooze_count = 0      # Number of devices that have snoozed
-        self.lock = threading.Lock()
+        self.state = AlarmState()
+        self.lock = TimedLock("AlarmManager.lock")  # Serializes changes; readers don't take it
+        self.published = threading.Condition()  # Notified with each new state (see wait_for_version)
+        self.waiting = 0  # Threads in wait_for_version, so _publish can skip notifying nobody
         self.event_callback = event_callback
+        # Set on every state change so the scheduler can sleep until the
+        # next deadline instead of polling (it clears the flag itself)
+        self.changed = threading.Event()
+
+    @staticmethod
+    def _audience(*alarms) -> dict:
+        """Event data limiting delivery to the nodes these alarms target.
+
+        Empty (everyone) if any of them targets every node; None entries are
+        skipped.
+        """
+        groups = set()
+        for alarm in alarms:
+            if alarm is None:
+                continue
+            if not alarm.groups:
+                return {}
+            groups.update(alarm.groups)
+        return {"groups": sorted(groups)} if groups else {}
+
+    def _publish(self, **changes) -> AlarmState:
+        """Replace the state with a copy carrying changes. Call with self.lock held"""
+        self.state = self.state._replace(version=self.state.version + 1, **changes)
+        if self.waiting:
+            with self.published:
+                self.published.notify_all()
+        return self.state
 
     def set_alarm(self, alarm: Alarm):
         """Set the alarm to be scheduled"""
         with self.lock:
-            self.current_alarm = alarm
-            self.alarm_active = False
-            self.snooze_count = 0
+            # The previous alarm's nodes hear about the new one too, so
+            # those it doesn't target drop their local copy
+            audience = self._audience(self.state.alarm, alarm)
+            self._publish(alarm=alarm, active=False, snooze_count=0, armed_fire_at=None)
+            # Broadcast alarm set to nodes so they can update indicators
+            event = AlarmEvent(EventType.ALARM_SET, {"alarm": alarm.to_dict(), **audience})
+            self.event_callback(event)
+            self.changed.set()
         print(f"[ALARM] Alarm set for {alarm}")
-        # Broadcast alarm set to nodes so they can update indicators
-        event = AlarmEvent(EventType.ALARM_SET, {"alarm": alarm.to_dict()})
-        self.event_callback(event)
 
     def remove_alarm(self):
         """Remove the currently scheduled alarm"""
         with self.lock:
-            self.current_alarm = None
-            self.alarm_active = False
-            self.snooze_count = 0
+            audience = self._audience(self.state.alarm)
+            self._publish(alarm=None, active=False, snooze_count=0, armed_fire_at=None)
+            event = AlarmEvent(EventType.ALARM_CLEARED, audience)
+            self.event_callback(event)
+            self.changed.set()
         print("[ALARM] Alarm removed")
-        event = AlarmEvent(EventType.ALARM_CLEARED, {})
-        self.event_callback(event)
 
-    def trigger_alarm(self, alarm: Alarm):
+    def arm_alarm(self, alarm: Alarm, fire_at: float):
+        """Tell nodes ahead of time when the alarm will fire (host clock)"""
+        with self.lock:
+            if self.state.active or self.state.armed_fire_at == fire_at:
+                return
+            self._publish(armed_fire_at=fire_at)
+            event = AlarmEvent(EventType.ALARM_ARMED, {"alarm": alarm.to_dict(), "fire_at": fire_at,
+                                                       **self._audience(alarm)})
+            self.event_callback(event)
+        print(f"[ALARM] Nodes armed for {alarm}")
+
+    def trigger_alarm(self, alarm: Alarm, fire_at: float | None = None):
         """Trigger an alarm and broadcast to all nodes"""
         with self.lock:
-            if self.alarm_active:
+            if self.state.active:
                 print("[ALARM] Alarm already active, ignoring trigger")
                 return
-            self.alarm_active = True
-            self.snooze_count = 0
-        
+            self._publish(active=True, snooze_count=0, armed_fire_at=None, active_fire_at=fire_at)
+            event = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": alarm.to_dict(), "fire_at": fire_at,
+                                                           **self._audience(alarm)})
+            self.event_callback(event)
+            self.changed.set()
         print(f"[ALARM] ALARM TRIGGERED for {alarm}")
-        event = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": alarm.to_dict()})
-        self.event_callback(event)
 
-    def handle_snooze(self, connected_nodes_count: int, source="node"):
-        """Handle snooze from either node or host"""
+    def handle_snooze(self, connected_nodes_count: int, source="node", fire_at=None) -> str:
+        """Handle snooze from either node or host.
+
+        fire_at identifies the occurrence the snooze was pressed for. Nodes
+        that rang on their own while the host was unreachable report their
+        snoozes late; those are ignored unless that occurrence is still ringing.
+
+        Returns what came of it: "counted", "cleared" (the last one needed),
+        "stale" or "not_ringing".
+        """
         with self.lock:
-            if not self.alarm_active:
-                return
+            state = self.state
+            if not state.active:
+                return "not_ringing"
+            if (fire_at is not None and state.active_fire_at is not None
+                    and abs(fire_at - state.active_fire_at) >= 1.0):
+                stale = True
+            else:
+                stale = False
+                snooze_count = state.snooze_count + 1
+                total_devices = connected_nodes_count + 1  # host + nodes
+                cleared = snooze_count >= total_devices
 
-            self.snooze_count += 1
-            total_devices = connected_nodes_count + 1  # host + nodes
+                if not cleared:
+                    self._publish(snooze_count=snooze_count)
+                else:
+                    audience = self._audience(state.alarm)
+                    self._publish(alarm=None, active=False, snooze_count=0, armed_fire_at=None)
+                    event = AlarmEvent(EventType.ALARM_CLEARED, audience)
+                    self.event_callback(event)
+                    self.changed.set()
 
-            print(f"[ALARM] Snooze from {source}. "
-                f"{self.snooze_count}/{total_devices} devices snoozed.")
+        if stale:
+            print(f"[ALARM] Ignoring stale snooze from {source}")
+            return "stale"
+        print(f"[ALARM] Snooze from {source}. "
+            f"{snooze_count}/{total_devices} devices snoozed.")
+        if cleared:
+            print(f"[ALARM] All {total_devices} devices snoozed. Clearing alarm.")
+            return "cleared"
+        return "counted"
 
-            if self.snooze_count >= total_devices:
-                print(f"[ALARM] All {total_devices} devices snoozed. Clearing alarm.")
-                self.alarm_active = False
-                self.current_alarm = None
-                self.snooze_count = 0
-                event = AlarmEvent(EventType.ALARM_CLEARED, {})
-                self.event_callback(event)
+    def snapshot(self) -> AlarmState:
+        """The current state, without locking. Fields of one snapshot are always consistent"""
+        return self.state
+
+    def wait_for_version(self, version: int, timeout: float | None = None) -> AlarmState:
+        """
+        Block until the state is newer than version, instead of polling.
+
+        Args:
+            version: Version the caller last saw (AlarmState.version)
+            timeout: Seconds to wait at most; None waits indefinitely
+
+        Returns:
+            The current state; its version is still version if the timeout passed
+        """
+        with self.published:
+            self.waiting += 1
+            try:
+                self.published.wait_for(lambda: self.state.version > version, timeout)
+            finally:
+                self.waiting -= 1
+        return self.state
 
     def is_alarm_active(self) -> bool:
         """Check if an alarm is currently active"""
-        with self.lock:
-            return self.alarm_active
+        return self.state.active
+
+    def get_armed_fire_at(self) -> float | None:
+        """Get the fire time nodes are currently armed with, if any"""
+        return self.state.armed_fire_at
+
+    def get_active_fire_at(self) -> float | None:
+        """Get the fire time of the occurrence currently ringing, if any"""
+        return self.state.active_fire_at
 
     def get_current_alarm(self) -> Alarm:
         """Get the currently scheduled alarm"""
+        return self.state.alarm
+
+    def get_state(self) -> dict:
+        """Snapshot of the alarm state (JSON-friendly), e.g. to hand to a new host process"""
+        state = self.state
+        return {
+            "alarm": state.alarm.to_dict() if state.alarm else None,
+            "active": state.active,
+            "snooze_count": state.snooze_count,
+            "armed_fire_at": state.armed_fire_at,
+            "active_fire_at": state.active_fire_at,
+        }
+
+    def restore_state(self, state: dict):
+        """Resume from a get_state() snapshot. Nodes already have this state, so no events are sent"""
         with self.lock:
-            return self.current_alarm
+            restored = self._publish(
+                alarm=Alarm.from_dict(state["alarm"]) if state["alarm"] else None,
+                active=state["active"],
+                snooze_count=state["snooze_count"],
+                armed_fire_at=state["armed_fire_at"],
+                active_fire_at=state["active_fire_at"],
+            )
+            self.changed.set()
+        print(f"[ALARM] State restored: {restored.alarm or 'no alarm'}"
+              + (" (ringing)" if restored.active else ""))
@@ -1,122 +1,124 @@
 from common.comms.host_server import AlarmHost
 from host.alarm_manager import AlarmManager
+from host.event_dispatcher import EventDispatcher
+from host.scheduler import AlarmScheduler
+from host.control import ControlServer
+from host.handoff import HandoffError, HandoffServer, Takeover
+from host.history import EventHistory, NODE_CONNECTED, NODE_DISCONNECTED, SNOOZE
+from host import diagnostics
+from common.clock import SYSTEM_CLOCK
 from common.comms.protocol import Alarm, AlarmEvent, EventType
+from common.comms import multicast
+from common.comms.capture import CaptureWriter
 from common.io.lcd import LCD
 from common.io.time_display import TimeDisplay
 from common.io.buzzer import BuzzerController
 from common.io.button import SnoozeButton
 
-from flask import Flask, render_template, redirect, url_for
-from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField
-from wtforms.validators import InputRequired
-from wtforms_components import TimeField
-from datetime import datetime
-
+import argparse
+import os
+import subprocess
+import sys
 import time
 import threading
 
+# How far ahead of the alarm nodes are told the exact fire time, so they can
+# ring from their own timer even if the network drops at the critical moment
+ARM_LEAD_SECONDS = 30
+
+# UDP multicast fast path for ALARM_TRIGGERED/ALARM_CLEARED. Set to None on
+# networks that filter multicast; the TCP stream alone still delivers everything.
+MULTICAST_FAST_PATH = (multicast.DEFAULT_GROUP, multicast.DEFAULT_PORT)
+
+# Seconds to collect state changes (e.g. rapid form submissions) into one
+# broadcast and LCD update. ALARM_TRIGGERED is never held back.
+COALESCE_WINDOW = 0.05
+
+clock = SYSTEM_CLOCK  # Swap for a SimulatedClock to fast-forward the host loops
 host = None
 alarm_manager = None
+scheduler = None
+scheduler_thread = None
+dispatcher = None
+control = None
+history = None  # Timeline of alarm events and node comings and goings (see host/history.py)
+web = None
 lcd = None
 buzzer = None
 button = None
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = "secretkey"
-
-class AlarmTime(FlaskForm):
-    time = TimeField('Time', validators = [InputRequired()])
-    submit = SubmitField("Set Alarm")
-
-@app.route("/", methods = ["GET", "POST"])
-def index():
-    form = AlarmTime()
-    if form.validate_on_submit():
-        t = form.time.data
-        # Convert the submitted time (a datetime.time) to our Alarm (12-hour format)
-        hour24 = t.hour
-        minute = t.minute
-        # Convert 24-hour to 12-hour + is_pm flag
-        if hour24 == 0:
-            hour12 = 12
-            is_pm = False
-        elif 1 <= hour24 < 12:
-            hour12 = hour24
-            is_pm = False
-        elif hour24 == 12:
-            hour12 = 12
-            is_pm = True
-        else:
-            hour12 = hour24 - 12
-            is_pm = True
-
-        alarm = Alarm(hours=hour12, minutes=minute, is_pm=is_pm)
-        if alarm_manager:
-            alarm_manager.set_alarm(alarm)
-            msg = f"Alarm set for {alarm}"
-            # Update LCD immediately so display doesn't wait for the next minute tick
-            try:
-                if lcd:
-                    display_now = TimeDisplay(current_time=datetime.now(), alarm=alarm)
-                    lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
-            except Exception as e:
-                print(f"[HOST APP] Failed to update LCD after setting alarm: {e}")
-        else:
-            msg = f"Alarm created (server not running): {alarm}"
 
-        return render_template("index.html", form=form, message=msg, current_alarm=alarm)
-    
-    # On GET request, fetch the current alarm from alarm_manager
-    current_alarm = alarm_manager.get_current_alarm() if alarm_manager else None
-    return render_template("index.html", form=form, current_alarm=current_alarm)
+def target_groups() -> tuple:
+    """Groups the current alarm targets; empty if it rings on every node"""
+    alarm = alarm_manager.get_current_alarm()
+    return alarm.groups if alarm else ()
 
 
-@app.route("/remove", methods = ["POST"])
-def remove_alarm():
-    """Remove the currently scheduled alarm"""
-    if alarm_manager:
-        alarm_manager.remove_alarm()
-        # Update LCD to clear alarm display
-        try:
-            if lcd:
-                display_now = TimeDisplay(current_time=datetime.now(), alarm=None)
-                lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
-        except Exception as e:
-            print(f"[HOST APP] Failed to update LCD after removing alarm: {e}")
-    return redirect(url_for('index'))
+def node_name(addr) -> str:
+    return f"{addr[0]}:{addr[1]}"
 
 
 def handle_event(event: AlarmEvent, addr):
     if event.type == EventType.SNOOZE_PRESSED:
-        alarm_manager.handle_snooze(
-            connected_nodes_count=host.get_connected_nodes_count(),
-            source=str(addr)
+        fire_at = (event.data or {}).get("fire_at")
+        # Quorum is per target group: only nodes the alarm rang on count
+        groups = target_groups()
+        if not host.in_groups(addr, groups):
+            print(f"[HOST] Ignoring snooze from {addr}: not in {', '.join(groups)}")
+            history.record(SNOOZE, node_name(addr), {"fire_at": fire_at, "result": "not_in_groups"})
+            return
+        result = alarm_manager.handle_snooze(
+            connected_nodes_count=host.get_connected_nodes_count(groups),
+            source=str(addr),
+            fire_at=fire_at
         )
+        history.record(SNOOZE, node_name(addr), {"fire_at": fire_at, "result": result})
+
 
 
+def send_state(addr, event: AlarmEvent):
+    """Send one state-sync event to a node (through the host, so it is captured)"""
+    if not host.send_to(addr, event):
+        raise ConnectionError("send failed")
+
 
 def on_node_connected(addr, conn):
     """Called when a new node connects - send current alarm state"""
+    control.publish("node_connected", {"addr": node_name(addr)})
+    history.record(NODE_CONNECTED, node_name(addr))
     try:
-        alarm = alarm_manager.get_current_alarm()
+        # One snapshot, so the node is sent a consistent state even if it
+        # changes meanwhile (a newer state reaches it as a broadcast anyway)
+        state = alarm_manager.snapshot()
+        alarm = state.alarm
         if alarm:
             try:
                 # Send the current alarm to the newly connected node
                 event = AlarmEvent(EventType.ALARM_SET, {"alarm": alarm.to_dict()})
-                msg = event.to_json() + "\n"
-                conn.sendall(msg.encode())
+                send_state(addr, event)
                 print(f"[HOST APP] Sent ALARM_SET to node {addr}")
             except Exception as e:
                 print(f"[HOST APP] Failed to send ALARM_SET to node {addr}: {e}")
                 return
             
+            # If nodes are already armed for this alarm, arm the newcomer too
+            fire_at = state.armed_fire_at
+            if fire_at is not None:
+                try:
+                    armed_event = AlarmEvent(EventType.ALARM_ARMED, {"alarm": alarm.to_dict(), "fire_at": fire_at})
+                    send_state(addr, armed_event)
+                    print(f"[HOST APP] Sent ALARM_ARMED to node {addr}")
+                except Exception as e:
+                    print(f"[HOST APP] Failed to send ALARM_ARMED to node {addr}: {e}")
+
             # If alarm is currently active, also send TRIGGERED event
             try:
-                if alarm_manager.is_alarm_active():
-                    triggered_event = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": alarm.to_dict()})
-                    msg = triggered_event.to_json() + "\n"
-                    conn.sendall(msg.encode())
+                if state.active:
+                    triggered_event = AlarmEvent(EventType.ALARM_TRIGGERED, {
+                        "alarm": alarm.to_dict(),
+                        "fire_at": state.active_fire_at,
+                    })
+                    send_state(addr, triggered_event)
                     print(f"[HOST APP] Sent ALARM_TRIGGERED to node {addr}")
             except Exception as e:
                 print(f"[HOST APP] Failed to send ALARM_TRIGGERED to node {addr}: {e}")
@@ -124,18 +126,29 @@ def on_node_connected(addr, conn):
         print(f"[HOST APP] Error in on_node_connected for {addr}: {e}")
 
 
+def on_node_disconnected(addr, reason):
+    """Called when a node disconnects ("closed") or times out ("timeout")"""
+    control.publish("node_disconnected", {"addr": node_name(addr), "reason": reason})
+    history.record(NODE_DISCONNECTED, node_name(addr), {"reason": reason})
+
+
 def button_monitor():
     """Monitor button presses while alarm is active"""
     while host and host.running:
         try:
-            if alarm_manager.is_alarm_active() and button:
-                if button.is_pressed():
-                    alarm_manager.handle_snooze(
-                        connected_nodes_count=host.get_connected_nodes_count(),
-                        source="host"
-                    )
-                    time.sleep(0.5)
-            time.sleep(0.05)  # Poll every 50ms
+            state = alarm_manager.snapshot()
+            if not state.active or not button:
+                # Nothing to read until the alarm rings
+                alarm_manager.wait_for_version(state.version, timeout=1.0)
+                continue
+            if button.is_pressed():
+                result = alarm_manager.handle_snooze(
+                    connected_nodes_count=host.get_connected_nodes_count(target_groups()),
+                    source="host"
+                )
+                history.record(SNOOZE, "host", {"fire_at": state.active_fire_at, "result": result})
+                time.sleep(0.5)
+            time.sleep(0.05)  # Poll every 50ms while ringing
         except Exception as e:
             print(f"[HOST] Error in button monitor: {e}")
             time.sleep(0.05)
@@ -145,7 +158,7 @@ def update_display():
     """Update LCD display every minute with current time and alarm status"""
     while host and host.running:
         try:
-            current_time = datetime.now()
+            current_time = clock.now()
             alarm = alarm_manager.get_current_alarm()
 
             # Create a TimeDisplay object with current time and alarm
@@ -157,62 +170,31 @@ def update_display():
             print(f"[HOST] Display updated: {display}")
 
             # Update every minute (60 seconds)
-            time.sleep(60)
+            clock.sleep(60)
         except Exception as e:
             print(f"[HOST] Error updating display: {e}")
-            time.sleep(60)
+            clock.sleep(60)
 
 
-def alarm_scheduler():
-    """Monitor scheduled alarm and trigger it at the right time"""
-    last_logged_time = None  # Track last time we logged the countdown
-    while host and host.running:
-        time.sleep(1)  # Check every second
-        
-        if alarm_manager.is_alarm_active():
-            continue  # Skip if an alarm is already active
-        
-        alarm = alarm_manager.get_current_alarm()
-        if not alarm:
-            last_logged_time = None
-            continue  # Skip if no alarm set
-        
-        current_time = datetime.now()
-        hour_24, minute = alarm.get_24hr_time()
-        
-        # Create alarm time for today
-        alarm_time = current_time.replace(
-            hour=hour_24,
-            minute=minute,
-            second=0,
-            microsecond=0
-        )
-        
-        # If alarm time has passed today, schedule for tomorrow using timedelta
-        if alarm_time <= current_time:
-            from datetime import timedelta
-            alarm_time = alarm_time + timedelta(days=1)
-        
-        time_until_alarm = (alarm_time - current_time).total_seconds()
-        time_diff = (current_time - alarm_time).total_seconds()
-        
-        # Log countdown only when first set or when within 60 seconds
-        if last_logged_time is None or time_until_alarm < 60:
-            if last_logged_time is None:
-                print(f"[HOST SCHEDULER] Alarm set for {alarm} ({alarm_time.strftime('%H:%M:%S')}). Time until: {int(time_until_alarm)}s")
-            last_logged_time = current_time
-        
-        # Check if we're within 1 second of the alarm time
-        if -1 < time_diff < 1:
-            print(f"[HOST SCHEDULER] TRIGGERING ALARM! (time diff: {time_diff:.2f}s)")
-            alarm_manager.trigger_alarm(alarm)
+def hardware_worker(events: list[AlarmEvent]):
+    """Flush coalesced alarm events to the buzzer and LCD"""
+    for event in events:
+        update_hardware(event)
 
 
-def alarm_event_callback(event: AlarmEvent):
-    """Callback for alarm events - broadcasts and updates hardware if needed"""
-    host.broadcast(event)
-    
-    if event.type == EventType.ALARM_TRIGGERED:
+def update_hardware(event: AlarmEvent):
+    """Update buzzer and LCD for an alarm event"""
+    if event.type == EventType.ALARM_SET:
+        # Update LCD immediately so display doesn't wait for the next minute tick
+        try:
+            if lcd:
+                alarm = Alarm.from_dict(event.data["alarm"])
+                display_now = TimeDisplay(current_time=clock.now(), alarm=alarm)
+                lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
+        except Exception as e:
+            print(f"[HOST APP] Failed to update LCD after setting alarm: {e}")
+
+    elif event.type == EventType.ALARM_TRIGGERED:
         # Turn on buzzer
         if buzzer:
             buzzer.turn_on()
@@ -221,7 +203,7 @@ def alarm_event_callback(event: AlarmEvent):
         try:
             if lcd:
                 alarm = Alarm.from_dict(event.data["alarm"])
-                display = TimeDisplay(current_time=datetime.now(), alarm=alarm)
+                display = TimeDisplay(current_time=clock.now(), alarm=alarm)
                 lcd.write(display.get_time_line(), "ALARM RINGING!")
                 print("[HOST APP] LCD updated - alarm triggered")
         except Exception as e:
@@ -239,28 +221,99 @@ def alarm_event_callback(event: AlarmEvent):
         
         try:
             if lcd:
-                display_now = TimeDisplay(current_time=datetime.now(), alarm=None)
+                display_now = TimeDisplay(current_time=clock.now(), alarm=None)
                 lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
                 print("[HOST APP] LCD updated - alarm cleared")
         except Exception as e:
             print(f"[HOST APP] Failed to update LCD on alarm clear: {e}")
 
 
-def main():
-    global host, alarm_manager, lcd, buzzer, button
-    host = AlarmHost(port=5001, event_handler=handle_event, on_node_connected=on_node_connected)
-    alarm_manager = AlarmManager(event_callback=alarm_event_callback)
-    
-    # Start Flask web server in a background thread so the form works
+def prepare_handoff() -> dict:
+    """Quiesce this process for a handoff (see host/handoff.py); returns the state to pass on.
+
+    Runs once the host is detached, so no node event can change the alarm
+    state any more. Queued broadcasts are still flushed to the nodes over
+    our copies of their connections before the snapshot is taken.
+    """
+    scheduler.stop()
+    if scheduler_thread:
+        scheduler_thread.join(timeout=5)
+    control.stop()
+    if web:
+        web.terminate()  # Frees the web port for the new process's UI
+        web.wait(timeout=5)
+    dispatcher.stop(flush=True)
+    history.close()  # The new process reloads it from the spill file, if any
+    if host.recorder:
+        host.recorder.close()  # We exit without cleanup; the new process appends its own run
+    return {"alarm_manager": alarm_manager.get_state()}
+
+
+def start_web(port):
+    """Run the web UI in its own process (host/web.py); it reaches us over the control socket"""
     try:
-        flask_thread = threading.Thread(
-            target=lambda: app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False),
-            daemon=True,
-        )
-        flask_thread.start()
-        print("[HOST APP] Flask webserver started on port 5000")
+        web = subprocess.Popen([sys.executable, "-m", "host.web", "--port", str(port), "--control", control.path])
+        print(f"[HOST APP] Web UI started on port {port} (pid {web.pid})")
+        return web
     except Exception as e:
-        print(f"[HOST APP] Failed to start Flask webserver: {e}")
+        print(f"[HOST APP] Failed to start web UI: {e}")
+        return None
+
+
+def main():
+    global host, alarm_manager, scheduler, scheduler_thread, dispatcher, control, history, web, lcd, buzzer, button
+    parser = argparse.ArgumentParser(description="Alarm host core")
+    parser.add_argument("--no-web", action="store_true", help="don't start the web UI process (run `python -m host.web` yourself)")
+    parser.add_argument("--web-port", type=int, default=5000)
+    parser.add_argument("--takeover", action="store_true",
+                        help="take over the node connections and state of the running host (zero-downtime upgrade)")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="append every frame to and from the nodes to this capture file (see tools.replay)")
+    parser.add_argument("--history", metavar="PATH",
+                        help="also write the event timeline to this file, so it survives restarts and upgrades")
+    parser.add_argument("--history-size", type=int, default=5000, help="events kept in memory (default 5000)")
+    args = parser.parse_args()
+
+    # Taken over first: the running host stops its web UI and control socket
+    # while handing off, so ours can bind
+    takeover = None
+    if args.takeover:
+        takeover = Takeover()
+        try:
+            takeover.connect()
+        except HandoffError as e:
+            print(f"[HOST APP] {e}")
+            sys.exit(1)
+
+    # Opened before taking over: the old process has closed its spill file by now
+    history = EventHistory(capacity=args.history_size, spill_path=args.history, clock=clock)
+    host = AlarmHost(port=5001, event_handler=handle_event, on_node_connected=on_node_connected,
+                     multicast=MULTICAST_FAST_PATH, clock=clock, on_node_disconnected=on_node_disconnected,
+                     recorder=CaptureWriter(args.capture, clock=clock) if args.capture else None)
+    # State changes are queued to separate network and hardware workers, so
+    # neither socket sends nor GPIO/LCD writes happen under the manager lock
+    dispatcher = EventDispatcher()
+    dispatcher.add_worker("network", host.broadcast_batch, window=COALESCE_WINDOW)
+    dispatcher.add_worker("hardware", hardware_worker, window=COALESCE_WINDOW)
+    dispatcher.add_worker("control", lambda events: control.publish_events(events), window=COALESCE_WINDOW)
+    # Every transition, not just the latest state, belongs in the timeline
+    dispatcher.add_worker("history", history.record_events, window=0, coalesce=False)
+    dispatcher.start()
+    alarm_manager = AlarmManager(event_callback=dispatcher.publish)
+    if takeover:
+        alarm_manager.restore_state(takeover.state["alarm_manager"])
+        host.adopt(takeover.host_state, takeover.listener, takeover.conns)
+    scheduler = AlarmScheduler(alarm_manager, clock=clock, arm_lead=ARM_LEAD_SECONDS)
+    
+    # The web UI runs in a separate process and only sends commands here,
+    # so page rendering never holds the GIL while an alarm is due. It gets
+    # live status from the "control" worker's pushes.
+    control = ControlServer(alarm_manager, status_callback=lambda: {"nodes": host.get_connected_nodes_count()},
+                            nodes_callback=host.get_nodes, locks=[host.lock, alarm_manager.lock],
+                            history=history)
+    control.start()
+    diagnostics.install_signal_handler()  # kill -USR1 dumps every thread's stack to stderr
+    web = None if args.no_web else start_web(args.web_port)
 
     # Initialize LCD and Buzzer
     try:
@@ -281,14 +334,30 @@ def main():
         print("[HOST APP] Button initialized")
     except Exception as e:
         print(f"[HOST APP] Failed to initialize Button: {e}")
-    
-    host.start()
+
+    if takeover:
+        # The old process keeps answering mDNS until it exits; advertising
+        # before then would clash with its registration
+        host.start(advertise=False)
+        if alarm_manager.is_alarm_active():
+            update_hardware(AlarmEvent(EventType.ALARM_TRIGGERED,
+                                       {"alarm": alarm_manager.get_current_alarm().to_dict()}))
+
+        def follow_takeover():
+            takeover.follow(host)
+            host.start_advertising()
+        threading.Thread(target=follow_takeover, name="takeover", daemon=True).start()
+    else:
+        host.start()
+    handoff = HandoffServer(host, prepare_handoff)
+    handoff.start()
 
     print("[HOST APP] Host is running.")
-    time.sleep(2)
+    if not takeover:
+        time.sleep(2)  # The old scheduler is already stopped when taking over
 
     # Start the alarm scheduler thread
-    scheduler_thread = threading.Thread(target=alarm_scheduler, daemon=True)
+    scheduler_thread = threading.Thread(target=scheduler.run, daemon=True)
     scheduler_thread.start()
 
     # Start the display update thread
@@ -299,10 +368,15 @@ def main():
     button_thread = threading.Thread(target=button_monitor, daemon=True)
     button_thread.start()
 
-    # Keep alive forever
+    # Keep alive until stopped or handed off to a new process
     try:
-        while True:
-            time.sleep(1)
+        while not handoff.done.wait(1):
+            pass
+        # Closing the node connections, GPIO or zeroconf (which would send an
+        # mDNS goodbye) would undo the handoff, so skip all cleanup
+        print("[HOST APP] Handed off to the new host process, exiting")
+        sys.stdout.flush()
+        os._exit(0)
     except KeyboardInterrupt:
         print("[HOST APP] Stopping")
         if lcd:
@@ -311,7 +385,14 @@ def main():
             buzzer.turn_off()
         if button:
             button.close()
+        if web:
+            web.terminate()
+        handoff.stop()
+        control.stop()
+        scheduler.stop()
+        dispatcher.stop()
         host.stop()
+        history.close()
 
 if __name__ == "__main__":
     main()
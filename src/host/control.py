@@ -0,0 +1,311 @@
+import json
+import os
+import socket
+import threading
+from common.comms.framing import FrameBuffer
+from common.comms.protocol import Alarm
+from host import diagnostics
+
+DEFAULT_PATH = os.environ.get("ALARM_MESH_CONTROL", "/tmp/alarm-mesh-control.sock")
+
+
+class ControlError(ConnectionError):
+    """The core process could not be reached or rejected a command"""
+
+
+class ControlServer:
+    """Core-process end of the command/status channel to the web process.
+
+    Listens on a Unix socket for newline-delimited JSON requests and answers
+    each with one JSON line. Commands only touch AlarmManager (which queues
+    its events), so the web process can never hold up the scheduler or the
+    node connections for longer than a lock acquisition.
+
+    A connection that sends {"cmd": "subscribe"} is also pushed a line
+    {"push": kind, "data": ..., "status": ...} on every publish(), so the web
+    process can stream live status without polling.
+
+    The history command answers the web UI's /api/history from the core's
+    EventHistory. The diagnostics commands (threads, profile, locks) are
+    what the web UI's /admin pages show; a profile holds its connection for as long as
+    it samples, so clients send it on a connection of its own.
+    """
+
+    SEND_TIMEOUT = 1.0  # A subscriber that can't take a push this fast is dropped
+
+    def __init__(self, alarm_manager, status_callback=None, nodes_callback=None, path=DEFAULT_PATH, locks=(),
+                 history=None):
+        """
+        Initialize the control server.
+
+        Args:
+            alarm_manager: AlarmManager commands are applied to
+            status_callback: Optional function returning extra status fields (dict)
+            nodes_callback: Optional function returning the connected nodes (list of dicts)
+            path: Unix socket path
+            locks: TimedLocks whose wait times the "locks" command reports
+            history: Optional EventHistory the "history" command queries
+        """
+        self.alarm_manager = alarm_manager
+        self.locks = list(locks)
+        self.history = history
+        self.status_callback = status_callback
+        self.nodes_callback = nodes_callback
+        self.path = path
+        self.sock = None
+        self.running = False
+        self.subscribers = []  # Connections that asked for pushed status updates
+        self.subscribers_lock = threading.Lock()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a previous run
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(8)
+        self.running = True
+        threading.Thread(target=self._accept_loop, name="control", daemon=True).start()
+        print(f"[CONTROL] Listening on {self.path}")
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), name="control-conn", daemon=True).start()
+
+    def _serve(self, conn):
+        frames = FrameBuffer()
+        with conn:
+            while self.running:
+                try:
+                    data = conn.recv(4096)
+                except TimeoutError:
+                    continue  # Subscribers have a send timeout, which applies here too
+                except OSError:
+                    break
+                if not data:
+                    break
+                for frame in frames.feed(data):
+                    try:
+                        request = json.loads(frame)
+                        if request.get("cmd") == "subscribe":
+                            self._subscribe(conn)
+                            continue
+                        reply = self.handle(request)
+                    except Exception as e:
+                        reply = {"ok": False, "error": str(e)}
+                    try:
+                        conn.sendall((json.dumps(reply) + "\n").encode())
+                    except OSError:
+                        return
+        self._unsubscribe(conn)
+
+    def _subscribe(self, conn):
+        # The reply carries the current status and is sent under the lock,
+        # so it can't be overtaken by a push
+        with self.subscribers_lock:
+            conn.settimeout(self.SEND_TIMEOUT)
+            conn.sendall((json.dumps({"ok": True, "status": self.status()}) + "\n").encode())
+            self.subscribers.append(conn)
+        print(f"[CONTROL] Status subscriber added ({len(self.subscribers)} total)")
+
+    def _unsubscribe(self, conn):
+        with self.subscribers_lock:
+            if conn in self.subscribers:
+                self.subscribers.remove(conn)
+
+    def publish(self, kind: str, data: dict | None = None):
+        """Push the current status, tagged with what changed, to every subscriber"""
+        with self.subscribers_lock:
+            if not self.subscribers:
+                return
+            line = (json.dumps({"push": kind, "data": data or {}, "status": self.status()}) + "\n").encode()
+            for conn in list(self.subscribers):
+                try:
+                    conn.sendall(line)
+                except OSError as e:
+                    print(f"[CONTROL] Dropping status subscriber: {e}")
+                    self.subscribers.remove(conn)
+                    try:
+                        conn.shutdown(socket.SHUT_RDWR)  # Wakes its _serve thread, which closes it
+                    except OSError:
+                        pass
+
+    def publish_events(self, events: list):
+        """Publish a batch of AlarmManager events. Use as an EventDispatcher worker"""
+        self.publish("alarm", {"events": [event.type.name for event in events]})
+
+    def handle(self, request: dict) -> dict:
+        """Apply one command and return the reply"""
+        command = request.get("cmd")
+        if command == "set_alarm":
+            self.alarm_manager.set_alarm(Alarm.from_dict(request["alarm"]))
+        elif command == "remove_alarm":
+            self.alarm_manager.remove_alarm()
+        elif command == "nodes":
+            return {"ok": True, "nodes": self.nodes_callback() if self.nodes_callback else []}
+        elif command == "history":
+            if self.history is None:
+                return {"ok": False, "error": "history is not enabled"}
+            entries = self.history.query(since=request.get("since"), until=request.get("until"),
+                                         node=request.get("node"), kinds=request.get("kinds"),
+                                         limit=int(request.get("limit", 200)))
+            return {"ok": True, "entries": entries, "stats": self.history.stats()}
+        elif command == "threads":
+            return {"ok": True, "threads": diagnostics.dump_threads()}
+        elif command == "profile":
+            interval = float(request.get("interval", diagnostics.DEFAULT_SAMPLE_INTERVAL))
+            print(f"[CONTROL] Profiling for {request['seconds']}s")
+            return {"ok": True, "stacks": diagnostics.sample_profile(float(request["seconds"]), interval)}
+        elif command == "locks":
+            stats = [lock.stats() for lock in self.locks]
+            if request.get("reset"):
+                for lock in self.locks:
+                    lock.reset()
+            return {"ok": True, "locks": stats}
+        elif command != "status":
+            return {"ok": False, "error": f"unknown command {command!r}"}
+        return {"ok": True, "status": self.status()}
+
+    def status(self) -> dict:
+        state = self.alarm_manager.snapshot()
+        status = {
+            "alarm": state.alarm.to_dict() if state.alarm else None,
+            "active": state.active,
+            "armed_fire_at": state.armed_fire_at,
+            "version": state.version,
+        }
+        if self.status_callback:
+            status.update(self.status_callback())
+        return status
+
+
+class ControlClient:
+    """Web-process end of the command/status channel.
+
+    Thread-safe; requests are serialized over one connection, which is
+    re-opened on the next request if the core restarts.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, timeout=2.0):
+        """
+        Initialize the control client.
+
+        Args:
+            path: Unix socket path of the core's ControlServer
+            timeout: Seconds to wait for the core to answer
+        """
+        self.path = path
+        self.timeout = timeout
+        self.sock = None
+        self.frames = None
+        self.lock = threading.Lock()
+
+    def status(self) -> dict:
+        return self.request({"cmd": "status"})["status"]
+
+    def set_alarm(self, alarm: Alarm) -> dict:
+        return self.request({"cmd": "set_alarm", "alarm": alarm.to_dict()})["status"]
+
+    def remove_alarm(self) -> dict:
+        return self.request({"cmd": "remove_alarm"})["status"]
+
+    def nodes(self) -> list[dict]:
+        return self.request({"cmd": "nodes"})["nodes"]
+
+    def history(self, since=None, until=None, node=None, kinds=None, limit=200) -> dict:
+        """Recorded events matching the filters (see EventHistory.query), plus the history's stats"""
+        request = {"cmd": "history", "since": since, "until": until, "node": node, "kinds": kinds, "limit": limit}
+        reply = self.request(request)
+        return {"entries": reply["entries"], "stats": reply["stats"]}
+
+    def threads(self) -> str:
+        return self.request({"cmd": "threads"})["threads"]
+
+    def profile(self, seconds: float, interval: float | None = None) -> str:
+        """Collapsed stacks of the core sampled for seconds (see host.diagnostics)"""
+        request = {"cmd": "profile", "seconds": seconds}
+        if interval:
+            request["interval"] = interval
+        return self.request(request, timeout=seconds + self.timeout)["stacks"]
+
+    def locks(self, reset=False) -> list[dict]:
+        return self.request({"cmd": "locks", "reset": reset})["locks"]
+
+    def request(self, request: dict, timeout: float | None = None) -> dict:
+        """Send one command and wait for its reply. Raises ControlError
+
+        With a timeout, the command goes over a connection of its own, so a
+        slow one (a profile) doesn't hold up the others.
+        """
+        if timeout is not None:
+            return self._request_once(request, timeout)
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.sendall((json.dumps(request) + "\n").encode())
+                reply = self._read_reply()
+            except (OSError, ValueError) as e:
+                self.close()
+                raise ControlError(f"core unreachable at {self.path}: {e}") from e
+        if not reply.get("ok"):
+            raise ControlError(reply.get("error", "command failed"))
+        return reply
+
+    def _request_once(self, request: dict, timeout: float) -> dict:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(timeout)
+                sock.connect(self.path)
+                sock.sendall((json.dumps(request) + "\n").encode())
+                frames = FrameBuffer()
+                while True:
+                    data = sock.recv(65536)
+                    if not data:
+                        raise ConnectionResetError("core closed the connection")
+                    replies = frames.feed(data)
+                    if replies:
+                        reply = json.loads(replies[0])
+                        break
+        except (OSError, ValueError) as e:
+            raise ControlError(f"core unreachable at {self.path}: {e}") from e
+        if not reply.get("ok"):
+            raise ControlError(reply.get("error", "command failed"))
+        return reply
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+    def _connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+        self.frames = FrameBuffer()
+
+    def _read_reply(self) -> dict:
+        while True:
+            data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionResetError("core closed the connection")
+            frames = self.frames.feed(data)
+            if frames:
+                return json.loads(frames[0])
@@ -0,0 +1,89 @@
+"""Live diagnostics for a sluggish host process: thread stacks and a sampling profile.
+
+Both only read sys._current_frames(), so they work in a running process
+without restarting it under a profiler. The core exposes them over the
+control socket (host/control.py) and the web UI at /admin/* (host/web.py);
+SIGUSR1 writes a thread dump to stderr even if the web UI is down or the
+GIL is stuck.
+"""
+import faulthandler
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+MAX_PROFILE_SECONDS = 30
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+_profile_lock = threading.Lock()  # One profile at a time; two would sample each other
+
+
+def _thread_names() -> dict:
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+def dump_threads() -> str:
+    """Stack of every thread in this process, innermost call last"""
+    names = _thread_names()
+    lines = []
+    for ident, frame in sorted(sys._current_frames().items()):
+        lines.append(f'Thread "{names.get(ident, "?")}" ({ident}):')
+        lines.extend(line.rstrip("\n") for line in traceback.format_stack(frame))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _collapse(frame, thread_name) -> str:
+    """One sample as "thread;outer (file:line);...;inner (file:line)" """
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+        frame = frame.f_back
+    calls.append(thread_name)
+    return ";".join(reversed(calls))
+
+
+def sample_profile(seconds: float, interval: float = DEFAULT_SAMPLE_INTERVAL) -> str:
+    """
+    Sample every thread's stack for a while and return collapsed stacks.
+
+    The output is one "stack count" line per distinct stack, the format
+    flamegraph.pl and speedscope read. Functions are named with the line
+    they start on, so samples anywhere in a function add up. Blocked
+    threads are sampled too (in recv, wait, acquire...), which shows where
+    time goes rather than just where CPU goes.
+
+    Args:
+        seconds: How long to sample, at most MAX_PROFILE_SECONDS
+        interval: Seconds between samples
+
+    Raises:
+        RuntimeError: Another profile is running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("a profile is already running")
+    try:
+        seconds = min(max(seconds, interval), MAX_PROFILE_SECONDS)
+        own = threading.get_ident()
+        stacks = Counter()
+        names = _thread_names()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = _thread_names()
+                stacks[_collapse(frame, names.get(ident, str(ident)))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+    finally:
+        _profile_lock.release()
+
+
+def install_signal_handler(signum=signal.SIGUSR1):
+    """Dump every thread's stack to stderr on signum (`kill -USR1 <pid>`)"""
+    faulthandler.register(signum, all_threads=True)
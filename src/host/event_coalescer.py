@@ -0,0 +1,121 @@
+import threading
+from common.comms.protocol import AlarmEvent, EventType
+
+# Which earlier pending events a new state event makes obsolete. ALARM_SET and
+# ALARM_CLEARED each describe the whole state, so they supersede everything.
+SUPERSEDES = {
+    EventType.ALARM_SET: {EventType.ALARM_SET, EventType.ALARM_CLEARED, EventType.ALARM_ARMED, EventType.ALARM_TRIGGERED},
+    EventType.ALARM_CLEARED: {EventType.ALARM_SET, EventType.ALARM_CLEARED, EventType.ALARM_ARMED, EventType.ALARM_TRIGGERED},
+    EventType.ALARM_TRIGGERED: {EventType.ALARM_ARMED, EventType.ALARM_TRIGGERED},
+    EventType.ALARM_ARMED: {EventType.ALARM_ARMED},
+}
+
+# Events that must not wait out the coalescing window
+URGENT_TYPES = (EventType.ALARM_TRIGGERED,)
+
+
+def coalesce(events: list[AlarmEvent]) -> list[AlarmEvent]:
+    """Drop events superseded by a later one, keeping the rest in order"""
+    result = []
+    for event in events:
+        superseded = SUPERSEDES.get(event.type, set())
+        dropped = [e for e in result if e.type in superseded]
+        if dropped:
+            result = [e for e in result if e.type not in superseded]
+            event = widen_audience(event, dropped)
+        result.append(event)
+    return result
+
+
+def widen_audience(event: AlarmEvent, dropped: list[AlarmEvent]) -> AlarmEvent:
+    """Make event reach every node the dropped events were addressed to.
+
+    A group-targeted event carries its audience in data["groups"] (see
+    AlarmManager); without the key it goes to every node.
+    """
+    groups = (event.data or {}).get("groups")
+    if not groups:
+        return event
+    groups = set(groups)
+    for other in dropped:
+        other_groups = (other.data or {}).get("groups")
+        if not other_groups:
+            return AlarmEvent(event.type, {k: v for k, v in event.data.items() if k != "groups"})
+        groups.update(other_groups)
+    return AlarmEvent(event.type, {**event.data, "groups": sorted(groups)})
+
+
+class EventCoalescer:
+    """Collapses bursts of AlarmManager state events into one flush per tick.
+
+    Rapid set/remove/set sequences from the web UI would otherwise each
+    cost a broadcast to every node plus an LCD rewrite. Events submitted
+    within `window` seconds of the first pending one are coalesced and handed
+    to flush_callback together; nodes still converge to the final state
+    because the surviving events are applied in order.
+    """
+
+    def __init__(self, flush_callback, window=0.05, name="coalescer", coalesce=True):
+        """
+        Initialize the coalescer.
+
+        Args:
+            flush_callback: Called with a list of coalesced events, in order
+            window: Seconds to hold the first pending event for later ones
+            name: Label for logs and the flush thread
+            coalesce: False to pass every event on (batched, but none dropped)
+        """
+        self.flush_callback = flush_callback
+        self.name = name
+        self.window = window
+        self.coalesce = coalesce
+        self.pending = []
+        self.urgent = False
+        self.running = False
+        self.flush_on_stop = False
+        self.thread = None
+        self.cond = threading.Condition()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, flush=False, timeout=5.0):
+        """Stop the flush thread. With flush, pending events are flushed first and this waits for that"""
+        with self.cond:
+            self.running = False
+            self.flush_on_stop = flush
+            self.cond.notify()
+        if flush and self.thread:
+            self.thread.join(timeout)
+
+    def submit(self, event: AlarmEvent):
+        """Queue an event for the next flush. Use as AlarmManager's event_callback"""
+        with self.cond:
+            if self.coalesce:
+                self.pending = coalesce(self.pending + [event])
+            else:
+                self.pending.append(event)
+            if event.type in URGENT_TYPES:
+                self.urgent = True
+            self.cond.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+                if self.running:
+                    # Hold the first event for the window unless something urgent arrives
+                    self.cond.wait_for(lambda: self.urgent or not self.running, timeout=self.window)
+                if not self.running and not (self.flush_on_stop and self.pending):
+                    return
+                events = self.pending
+                self.pending = []
+                self.urgent = False
+
+            try:
+                self.flush_callback(events)
+            except Exception as e:
+                print(f"[{self.name.upper()}] Flush failed: {e}")
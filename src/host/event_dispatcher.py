@@ -0,0 +1,43 @@
+from common.comms.protocol import AlarmEvent
+from host.event_coalescer import EventCoalescer
+
+
+class EventDispatcher:
+    """Publishes AlarmManager state transitions to independent workers.
+
+    publish() only appends to each worker's queue, so it is cheap enough to
+    call while AlarmManager holds its lock. Each worker coalesces and flushes
+    on its own thread, so slow GPIO/LCD writes can't delay broadcasts to
+    nodes and neither can block the manager.
+    """
+
+    def __init__(self):
+        self.workers = []
+
+    def add_worker(self, name, flush_callback, window=0.05, coalesce=True) -> EventCoalescer:
+        """
+        Register a worker.
+
+        Args:
+            name: Label for logs and the worker thread
+            flush_callback: Called on the worker thread with a list of coalesced events
+            window: Coalescing window in seconds (see EventCoalescer)
+            coalesce: False for workers that must see every event, e.g. history
+        """
+        worker = EventCoalescer(flush_callback, window=window, name=name, coalesce=coalesce)
+        self.workers.append(worker)
+        return worker
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self, flush=False):
+        """Stop every worker; with flush, wait for them to flush what is already queued"""
+        for worker in self.workers:
+            worker.stop(flush=flush)
+
+    def publish(self, event: AlarmEvent):
+        """Queue an event for every worker. Use as AlarmManager's event_callback"""
+        for worker in self.workers:
+            worker.submit(event)
@@ -0,0 +1,237 @@
+import base64
+import json
+import os
+import socket
+import threading
+
+DEFAULT_PATH = os.environ.get("ALARM_MESH_HANDOFF", "/tmp/alarm-mesh-handoff.sock")
+
+# SOCK_SEQPACKET keeps each JSON message and the descriptors sent with it
+# together. The kernel passes at most 253 descriptors per message.
+FDS_PER_MESSAGE = 200
+MAX_MESSAGE = 256 * 1024
+
+
+class HandoffError(ConnectionError):
+    """No running host to take over from, or the handoff broke off"""
+
+
+def _send(sock, message: dict, fds=()):
+    data = json.dumps(message).encode()
+    if fds:
+        socket.send_fds(sock, [data], list(fds))
+    else:
+        sock.send(data)
+
+
+def _recv(sock):
+    """Next (message, fds), or (None, []) once the other process has closed"""
+    data, fds, flags, _ = socket.recv_fds(sock, MAX_MESSAGE, FDS_PER_MESSAGE)
+    if flags & (socket.MSG_TRUNC | socket.MSG_CTRUNC):
+        for fd in fds:
+            os.close(fd)
+        raise HandoffError("handoff message truncated")
+    if not data:
+        return None, []
+    return json.loads(data), fds
+
+
+class HandoffServer:
+    """Running-host end of a zero-downtime restart.
+
+    A new host process started with --takeover connects here. This one then
+    detaches its AlarmHost, quiesces the rest of the app (prepare), and
+    sends the new process a snapshot along with the listening socket and
+    every node connection, so no node ever sees its connection close.
+
+    Afterwards it keeps forwarding what its blocked receive/accept threads
+    still pick up (see AlarmHost.detach) until every node has been released
+    or the drain timeout has passed, then sets `done`: the app should exit
+    without closing anything.
+    """
+
+    # Nodes announce how often they send at least a heartbeat (a minute while
+    # idle, see client/app.py), so waiting out the longest interval of the
+    # handed-over nodes, plus this slack for their once-a-second send check
+    # and the network, means every live node has sent something (releasing
+    # its connection). A frame our blocked recv() picked up after we exited
+    # would never be forwarded.
+    DRAIN_MARGIN = 10
+
+    def __init__(self, host, prepare, path=DEFAULT_PATH):
+        """
+        Initialize the handoff server.
+
+        Args:
+            host: AlarmHost to hand over
+            prepare: Called once the host is detached; stops everything that
+                     could still change state and returns the app state to
+                     pass on (JSON-friendly dict)
+            path: Unix socket path
+        """
+        self.host = host
+        self.prepare = prepare
+        self.path = path
+        self.sock = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.unreleased = set()
+        self.sent = threading.Event()  # Snapshot and sockets are through; forwarding may start
+        self.released = threading.Event()
+        self.done = threading.Event()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left over from a previous run
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.bind(self.path)
+        self.sock.listen(1)
+        threading.Thread(target=self._accept, name="handoff", daemon=True).start()
+        print(f"[HANDOFF] Listening on {self.path}")
+
+    def stop(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _accept(self):
+        try:
+            conn, _ = self.sock.accept()
+            message, _ = _recv(conn)
+        except (OSError, ValueError) as e:
+            print(f"[HANDOFF] Listener failed: {e}")
+            return
+        if not message or message.get("cmd") != "handoff":
+            print(f"[HANDOFF] Unexpected request: {message!r}")
+            conn.close()
+            return
+        # Free the path for the new process's own handoff server
+        self.stop()
+        self.conn = conn
+        try:
+            self._hand_off()
+        except (OSError, ValueError) as e:
+            # Too late to resume: nodes will reconnect to whichever host is up
+            print(f"[HANDOFF] Handoff failed: {e}")
+            self.sent.set()
+        self.done.set()
+
+    def _hand_off(self):
+        print("[HANDOFF] New host process connected, handing off")
+        self.host.detach(self._forward)
+        state = self.prepare()
+        snapshot = self.host.snapshot()
+        listener, conns = self.host.get_handoff_sockets()
+        clients = snapshot.pop("clients")
+        with self.send_lock:
+            self.unreleased = {tuple(client["addr"]) for client in clients}
+            _send(self.conn, {"state": state, "host": snapshot}, [listener.fileno()])
+            for i in range(0, len(clients), FDS_PER_MESSAGE):
+                chunk = clients[i:i + FDS_PER_MESSAGE]
+                _send(self.conn, {"clients": chunk}, [conns[tuple(client["addr"])].fileno() for client in chunk])
+            _send(self.conn, {"ready": True})
+        self.sent.set()
+        drain_timeout = self._drain_timeout(clients)
+        print(f"[HANDOFF] Handed over {len(clients)} node connections; draining (up to {drain_timeout:g}s)")
+        if self.unreleased and not self.released.wait(drain_timeout):
+            print(f"[HANDOFF] {len(self.unreleased)} nodes not released after {drain_timeout:g}s")
+        print("[HANDOFF] Done")
+
+    def _drain_timeout(self, clients) -> float:
+        """Seconds until every handed-over node has sent something, if it is still alive"""
+        # A node's timeout is HEARTBEAT_MISSES of its intervals (HEARTBEAT_TIMEOUT if unannounced)
+        longest = max((client["timeout"] for client in clients), default=0) / self.host.HEARTBEAT_MISSES
+        return longest + self.DRAIN_MARGIN
+
+    def _forward(self, kind, addr, conn, data):
+        """AlarmHost.detach callback: pass a read or accept to the new process"""
+        message = {"kind": kind, "addr": list(addr)}
+        if data is None:
+            message["closed"] = True
+        elif data:
+            message["data"] = base64.b64encode(data).decode()
+        self.sent.wait()  # Reads can't overtake the snapshot
+        try:
+            with self.send_lock:
+                _send(self.conn, message, [conn.fileno()] if kind == "accepted" else ())
+                self.unreleased.discard(tuple(addr))
+                if not self.unreleased:
+                    self.released.set()
+        except OSError as e:
+            print(f"[HANDOFF] Failed to forward {kind} for {addr}: {e}")
+        conn.close()  # Our copy; the new process has its own
+
+
+class Takeover:
+    """New-process end of a zero-downtime restart (see HandoffServer)"""
+
+    def __init__(self, path=DEFAULT_PATH, timeout=30.0):
+        """
+        Initialize the takeover.
+
+        Args:
+            path: Unix socket path of the running host's HandoffServer
+            timeout: Seconds to wait for the running host to hand over
+        """
+        self.path = path
+        self.timeout = timeout
+        self.sock = None
+        self.state = None        # App state from the old process's prepare()
+        self.host_state = None   # AlarmHost.snapshot(), for AlarmHost.adopt()
+        self.listener = None
+        self.conns = {}          # {addr: node connection}
+
+    def connect(self):
+        """Ask the running host to hand over and receive its sockets. Raises HandoffError"""
+        try:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.path)
+            _send(self.sock, {"cmd": "handoff"})
+            message, fds = _recv(self.sock)
+            if message is None or "state" not in message:
+                raise HandoffError("running host closed the handoff")
+            self.state = message["state"]
+            self.host_state = message["host"]
+            self.listener = socket.socket(fileno=fds[0])
+            clients = []
+            while True:
+                message, fds = _recv(self.sock)
+                if message is None:
+                    raise HandoffError("running host closed the handoff")
+                if message.get("ready"):
+                    break
+                for client, fd in zip(message["clients"], fds):
+                    self.conns[tuple(client["addr"])] = socket.socket(fileno=fd)
+                    clients.append(client)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            raise HandoffError(f"takeover from {self.path} failed: {e}") from e
+        self.host_state["clients"] = clients
+        self.sock.settimeout(None)
+        print(f"[HANDOFF] Took over {len(self.conns)} node connections")
+
+    def follow(self, host):
+        """Apply what the old process forwards to host until it exits (blocks)"""
+        while True:
+            try:
+                message, fds = _recv(self.sock)
+            except (OSError, ValueError) as e:
+                print(f"[HANDOFF] Lost the old host process: {e}")
+                break
+            if message is None:
+                break
+            addr = tuple(message["addr"])
+            if message["kind"] == "accepted":
+                host.add_connection(socket.socket(fileno=fds[0]), addr)
+            elif message.get("closed"):
+                host.release(addr, None)
+            else:
+                host.release(addr, base64.b64decode(message.get("data", "")))
+        self.sock.close()
+        host.release_all()
+        print("[HANDOFF] Old host process exited")
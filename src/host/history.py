@@ -0,0 +1,210 @@
+import json
+import os
+import sys
+import threading
+from collections import deque
+from common.clock import SYSTEM_CLOCK
+
+# What history keeps, besides the AlarmManager event types (ALARM_SET, ...)
+NODE_CONNECTED = "NODE_CONNECTED"
+NODE_DISCONNECTED = "NODE_DISCONNECTED"
+SNOOZE = "SNOOZE"
+
+
+class EventHistory:
+    """Fixed-size timeline of recent alarm events and node comings and goings.
+
+    Entries live in a ring buffer of `capacity` slots; once it is full each
+    new entry overwrites the oldest. With details capped at MAX_DETAIL
+    characters, memory stays under about capacity * 1 KB whatever happens
+    (about 5 MB at the default capacity).
+
+    Entries are kept in the order they were recorded, so time ranges are
+    found by binary search (over times clamped to never go backwards, in
+    case the wall clock steps back). A per-node index holds the ring slots
+    of each node's entries and shrinks with the ring.
+
+    With spill_path, every entry is also appended to a segment file of
+    compact JSON lines, line-buffered so a crash doesn't lose the entries
+    leading up to it. Once the file reaches segment_bytes it is rotated to
+    spill_path + ".1" (replacing the previous one), so disk use is capped
+    too. A new host process (a restart or a takeover) reloads the newest
+    entries from there, so the timeline survives it.
+    """
+
+    MAX_DETAIL = 512  # Characters of JSON detail kept per entry
+    MAX_QUERY = 1000  # Entries one query returns at most
+
+    def __init__(self, capacity=5000, spill_path=None, segment_bytes=4 * 1024 * 1024, clock=SYSTEM_CLOCK):
+        """
+        Initialize the history.
+
+        Args:
+            capacity: Entries kept in memory
+            spill_path: Optional file to append entries to (see above)
+            segment_bytes: Size at which the spill file is rotated
+            clock: Clock for entry timestamps (see common.clock)
+        """
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.segment_bytes = segment_bytes
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = [None] * capacity  # (seq, time, kind, node, detail JSON) ring
+        self.times = [0.0] * capacity     # Index times, non-decreasing in ring order
+        self.start = 0                    # Slot of the oldest entry
+        self.count = 0
+        self.seq = 0                      # Sequence number of the last entry
+        self.by_node = {}                 # {node: deque of its entries' slots, oldest first}
+        self.spill = None
+        if spill_path:
+            self._load()
+            self.spill = open(spill_path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, kind: str, node=None, detail=None):
+        """
+        Add an entry.
+
+        Args:
+            kind: Event type name (ALARM_TRIGGERED, NODE_CONNECTED, ...)
+            node: "ip:port" of the node it concerns (or "host"); None for alarm-wide events
+            detail: JSON-friendly dict, truncated to MAX_DETAIL characters
+        """
+        detail = json.dumps(detail or {}, separators=(",", ":"), default=str)
+        if len(detail) > self.MAX_DETAIL:
+            # Escaping at most doubles the (ASCII) preview, so this fits
+            detail = json.dumps({"truncated": detail[:self.MAX_DETAIL // 2 - 16]})
+        # One string per node however many entries it has
+        node = None if node is None else sys.intern(str(node))
+        with self.lock:
+            self.seq += 1
+            entry = (self.seq, self.clock.time(), kind, node, detail)
+            self._append(entry)
+            if self.spill:
+                self._spill(entry)
+
+    def record_events(self, events: list):
+        """Record a batch of AlarmManager events. Use as a non-coalescing EventDispatcher worker"""
+        for event in events:
+            self.record(event.type.name, detail=event.data)
+
+    def _append(self, entry):
+        """Put entry in the ring, evicting the oldest if full. Call with self.lock held"""
+        if self.count == self.capacity:
+            oldest = self.entries[self.start]
+            self._unindex(oldest)
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        else:
+            slot = (self.start + self.count) % self.capacity
+            self.count += 1
+        previous = self.times[(slot - 1) % self.capacity] if self.count > 1 else entry[1]
+        self.entries[slot] = entry
+        self.times[slot] = max(entry[1], previous)
+        if entry[3] is not None:
+            self.by_node.setdefault(entry[3], deque()).append(slot)
+
+    def _unindex(self, entry):
+        node = entry[3]
+        if node is None:
+            return
+        slots = self.by_node[node]
+        slots.popleft()  # A node's oldest entry is always the first to go
+        if not slots:
+            del self.by_node[node]
+
+    def _first_at(self, t) -> int:
+        """Position (0 = oldest) of the first entry recorded at or after t"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[(self.start + middle) % self.capacity] < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, since=None, until=None, node=None, kinds=None, limit=200) -> list[dict]:
+        """
+        Entries matching every given filter, oldest first.
+
+        Args:
+            since: Unix time to start from (inclusive)
+            until: Unix time to stop at (exclusive)
+            node: Only entries about this node ("ip:port" or "host")
+            kinds: Only entries of these kinds
+            limit: At most this many (up to MAX_QUERY), the newest ones if there are more
+        """
+        kinds = set(kinds) if kinds else None
+        limit = max(1, min(limit, self.MAX_QUERY))
+        with self.lock:
+            if not self.count:
+                return []
+            first = 0 if since is None else self._first_at(since)
+            end = self.count if until is None else self._first_at(until)
+            if node is not None:
+                # Walk the node's own entries instead of the whole range
+                slots = reversed(self.by_node.get(str(node), ()))
+            else:
+                slots = ((self.start + position) % self.capacity for position in range(end - 1, first - 1, -1))
+            matches = []
+            # Newest first, so the walk stops as soon as limit is reached
+            for slot in slots:
+                position = (slot - self.start) % self.capacity
+                if position >= end:
+                    continue
+                if position < first:
+                    break
+                entry = self.entries[slot]
+                if kinds and entry[2] not in kinds:
+                    continue
+                matches.append(entry)
+                if len(matches) >= limit:
+                    break
+        return [
+            {"seq": seq, "time": t, "kind": kind, "node": entry_node, "detail": json.loads(detail)}
+            for seq, t, kind, entry_node, detail in reversed(matches)
+        ]
+
+    def stats(self) -> dict:
+        with self.lock:
+            oldest = self.entries[self.start] if self.count else None
+            return {"entries": self.count, "capacity": self.capacity, "nodes": len(self.by_node),
+                    "oldest": oldest[1] if oldest else None, "spill_path": self.spill_path}
+
+    # ------------------------------
+    # Spill file
+    # ------------------------------
+    def _spill(self, entry):
+        """Append entry to the spill file. Call with self.lock held"""
+        seq, t, kind, node, detail = entry
+        self.spill.write(f'[{seq},{t:.6f},{json.dumps(kind)},{json.dumps(node)},{detail}]\n')
+        if self.spill.tell() >= self.segment_bytes:
+            self.spill.close()
+            os.replace(self.spill_path, self.spill_path + ".1")
+            self.spill = open(self.spill_path, "a", encoding="utf-8", buffering=1)
+
+    def _load(self):
+        """Refill the ring from the spill files of a previous run"""
+        loaded = 0
+        for path in (self.spill_path + ".1", self.spill_path):
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        try:
+                            seq, t, kind, node, detail = json.loads(line)
+                        except ValueError:
+                            continue  # Torn last line of a crashed run
+                        self._append((seq, t, kind, node, json.dumps(detail, separators=(",", ":"))))
+                        self.seq = max(self.seq, seq)
+                        loaded += 1
+            except FileNotFoundError:
+                continue
+        if loaded:
+            print(f"[HISTORY] Reloaded {self.count} of {loaded} entries from {self.spill_path}")
+
+    def close(self):
+        with self.lock:
+            if self.spill:
+                self.spill.close()
+                self.spill = None
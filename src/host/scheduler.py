@@ -0,0 +1,101 @@
+import threading
+from datetime import datetime
+from common.clock import SYSTEM_CLOCK
+from common.trigger_table import TriggerTable
+
+
+class AlarmScheduler:
+    """Arms and triggers the scheduled alarm at the right time.
+
+    Sleeps until the next deadline (arming the nodes, then firing) instead of
+    polling every second, and wakes early whenever the alarm manager state
+    changes. Fire times come from a timezone-aware TriggerTable that is only
+    rebuilt when the alarm or the timezone changes. All time comes from the
+    injected clock, so a SimulatedClock can run days of schedule in
+    milliseconds.
+    """
+
+    # Longest single sleep, so a wall clock jump (NTP step, manual change) is
+    # noticed within a minute even if nothing else wakes the scheduler
+    MAX_SLEEP = 60.0
+    # Hand over to the final precise sleep this long before fire time
+    # (covers the time it takes to get from waking up to the final sleep)
+    FINAL_SLEEP = 1.5
+
+    def __init__(self, alarm_manager, clock=SYSTEM_CLOCK, arm_lead=30):
+        """
+        Initialize the scheduler.
+
+        Args:
+            alarm_manager: AlarmManager holding the alarm to schedule
+            clock: Clock to read time from and sleep on (see common.clock)
+            arm_lead: Seconds before fire time to pre-arm the nodes
+        """
+        self.alarm_manager = alarm_manager
+        self.clock = clock
+        self.arm_lead = arm_lead
+        self.running = False
+        self._stop = threading.Event()
+        self.table = None  # TriggerTable of the current alarm
+
+    def run(self):
+        """Schedule alarms until stop() is called (blocks)"""
+        self.running = True
+        self._stop.clear()
+        while self.running:
+            self.step()
+
+    def stop(self):
+        self.running = False
+        self._stop.set()
+        self.alarm_manager.changed.set()
+
+    def step(self):
+        """Handle the current alarm state once, then sleep until the next deadline"""
+        manager = self.alarm_manager
+        manager.changed.clear()
+        state = manager.snapshot()
+
+        if state.active:
+            # Nothing to do until the alarm is snoozed away or replaced
+            self.clock.sleep(self.MAX_SLEEP, wake=manager.changed)
+            return
+
+        alarm = state.alarm
+        if not alarm:
+            self.table = None
+            self.clock.sleep(self.MAX_SLEEP, wake=manager.changed)
+            return
+
+        now = self.clock.time()
+        if self.table is None or self.table.alarm is not alarm:
+            self.table = TriggerTable(alarm)
+            fire_at, kind = self.table.next_after(now)
+            alarm_time = datetime.fromtimestamp(fire_at, self.table.tz)
+            note = f", {kind} local time" if kind != "normal" else ""
+            print(f"[HOST SCHEDULER] Alarm set for {alarm} ({alarm_time.strftime('%Y-%m-%d %H:%M:%S %Z')}{note}). "
+                  f"Time until: {int(fire_at - now)}s")
+        fire_at, _ = self.table.next_after(now)
+        time_until_alarm = fire_at - now
+
+        # Pre-arm nodes with the exact fire time so they ring together
+        if time_until_alarm <= self.arm_lead:
+            manager.arm_alarm(alarm, fire_at)
+
+        if time_until_alarm <= self.FINAL_SLEEP:
+            # Sleep out the remainder and fire on time
+            if self.clock.sleep(fire_at - self.clock.time(), wake=self._stop):
+                return
+            if manager.get_current_alarm() is not alarm:
+                return  # Alarm was changed or removed while we waited
+            time_diff = self.clock.time() - fire_at
+            print(f"[HOST SCHEDULER] TRIGGERING ALARM! (time diff: {time_diff:.3f}s)")
+            manager.trigger_alarm(alarm, fire_at)
+            return
+
+        # Sleep until the next deadline: arming time, then the final sleep
+        if time_until_alarm > self.arm_lead:
+            next_deadline = time_until_alarm - self.arm_lead
+        else:
+            next_deadline = time_until_alarm - self.FINAL_SLEEP
+        self.clock.sleep(min(next_deadline, self.MAX_SLEEP), wake=manager.changed)
@@ -0,0 +1,583 @@
+"""Web UI process for the alarm host.
+
+Runs separately from the real-time core (host/app.py) and talks to it only
+through the control socket (host/control.py), so rendering pages never
+competes with alarm triggering for the core's GIL. host/app.py starts it
+automatically; run it directly with `python -m host.web` if the core was
+started with --no-web.
+
+Besides the form UI it serves a JSON API (/api/status, /api/alarm,
+/api/nodes, /api/history). API responses carry an ETag, so a dashboard polling with
+If-None-Match gets an empty 304 until something changes; those are mostly
+answered by NotModified without entering Flask or asking the core.
+
+/api/events streams status changes as server-sent events. The core pushes
+them to one StatusFeed subscription here, which fans them out to every open
+page, so open dashboards cost no polling at all.
+
+/admin/threads, /admin/profile and /admin/locks (host/diagnostics.py) show
+where a sluggish core, or this process, spends its time. They are only
+served when ALARM_MESH_ADMIN_TOKEN is set, to requests carrying it.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from host.control import ControlClient, ControlError, DEFAULT_PATH
+from host import diagnostics
+from common.comms.framing import FrameBuffer
+from common.comms.protocol import Alarm
+
+from flask import Flask, Response, render_template, redirect, request, url_for
+from flask_wtf import FlaskForm
+from markupsafe import Markup
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from wtforms import StringField, SubmitField
+from wtforms.validators import InputRequired, Optional
+from wtforms_components import TimeField
+
+WEB_PORT = 5000
+# Run below the core's priority, so a burst of page loads yields the CPU to
+# the scheduler and node connections on a single-core Pi
+WEB_NICE = 10
+# Request worker threads; each page or API call holds one for a control
+# socket round trip plus rendering
+WEB_THREADS = 8
+# How long a status or node list read from the core is reused. Polling
+# dashboards then cost the core one round trip per second in total, however
+# many there are; commands sent from here drop the cache immediately.
+CORE_CACHE_TTL = 1.0
+# Open /api/events streams; each holds a server thread while open, so the
+# server gets this many threads on top of --threads
+MAX_STREAMS = 16
+STREAM_BUFFER = 8        # Pushes queued per stream before the oldest are dropped
+STREAM_KEEPALIVE = 15.0  # Seconds between comments on an idle stream
+# Bearer token for /admin/*; unset turns those pages off. Inherited from the
+# core process when it starts us.
+ADMIN_TOKEN = os.environ.get("ALARM_MESH_ADMIN_TOKEN")
+
+control = ControlClient()
+
+app = Flask(__name__)
+app.config['SECRET_KEY'] = "secretkey"
+
+class AlarmTime(FlaskForm):
+    time = TimeField('Time', validators = [InputRequired()])
+    groups = StringField('Groups (comma-separated, blank for every node)', validators = [Optional()])
+    submit = SubmitField("Set Alarm")
+
+
+def parse_groups(value) -> tuple:
+    """Groups from "a, b" or ["a", "b"]; empty targets every node"""
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(group.strip() for group in value or () if str(group).strip())
+
+
+def api_groups(data: dict) -> tuple:
+    """Groups of a JSON API alarm: a list of names, or absent. Raises ValueError"""
+    groups = data.get("groups")
+    if groups is None:
+        return ()
+    if not isinstance(groups, list) or not all(isinstance(group, str) for group in groups):
+        raise ValueError(f"groups must be a list of names, got {groups!r}")
+    return parse_groups(groups)
+
+
+def alarm_from_24h(hour24: int, minute: int, groups=()) -> Alarm:
+    """Convert a 24-hour time to our Alarm (12-hour format)"""
+    if hour24 == 0:
+        hour12 = 12
+        is_pm = False
+    elif 1 <= hour24 < 12:
+        hour12 = hour24
+        is_pm = False
+    elif hour24 == 12:
+        hour12 = 12
+        is_pm = True
+    else:
+        hour12 = hour24 - 12
+        is_pm = True
+    return Alarm(hours=hour12, minutes=minute, is_pm=is_pm, groups=groups)
+
+
+_core_cache = {}  # name -> (fetched_at, value)
+_core_cache_lock = threading.Lock()
+_etags = {}  # API path -> (core cache name, ETag, fetched_at of the value it was computed from)
+
+
+def from_core(name, fetch):
+    """Value of fetch() from the core, reused for up to CORE_CACHE_TTL seconds"""
+    with _core_cache_lock:
+        cached = _core_cache.get(name)
+    if cached and time.monotonic() - cached[0] < CORE_CACHE_TTL:
+        return cached[1]
+    value = fetch()
+    with _core_cache_lock:
+        _core_cache[name] = (time.monotonic(), value)
+    return value
+
+
+def core_status() -> dict:
+    return from_core("status", control.status)
+
+
+def core_command(command, *args) -> dict:
+    """Send a command to the core; its reply is the fresh status"""
+    with _core_cache_lock:
+        _core_cache.clear()
+    status = command(*args)
+    with _core_cache_lock:
+        _core_cache["status"] = (time.monotonic(), status)
+    return status
+
+
+class Stream:
+    """One open /api/events response: a bounded queue of pushes to send.
+
+    Every push carries the full status, so when a slow client's buffer
+    overflows, dropping the oldest loses nothing it still needs.
+    """
+
+    def __init__(self, size=STREAM_BUFFER):
+        self.pending = deque(maxlen=size)
+        self.ready = threading.Event()
+        self.dropped = 0
+
+    def put(self, message):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(message)
+        self.ready.set()
+
+    def take(self, timeout) -> list:
+        """Wait up to timeout seconds for pushes and return them (maybe none)"""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        messages = []
+        while self.pending:
+            messages.append(self.pending.popleft())
+        return messages
+
+
+class StatusFeed:
+    """A single status subscription to the core, fanned out to every stream.
+
+    Also keeps the core cache current, so API reads and page loads between
+    pushes don't ask the core either.
+    """
+
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, max_streams=MAX_STREAMS):
+        self.max_streams = max_streams
+        self.streams = set()
+        self.latest = None  # Last message, sent first to every new stream
+        self.lock = threading.Lock()
+        self.started = False
+
+    def open(self) -> Stream | None:
+        """Register a new stream, or None if max_streams are already open"""
+        with self.lock:
+            if len(self.streams) >= self.max_streams:
+                return None
+            if not self.started:
+                self.started = True
+                threading.Thread(target=self._run, name="status-feed", daemon=True).start()
+            stream = Stream()
+            if self.latest:
+                stream.put(self.latest)
+            self.streams.add(stream)
+            return stream
+
+    def close(self, stream: Stream):
+        with self.lock:
+            self.streams.discard(stream)
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except (OSError, ValueError) as e:
+                print(f"[WEB] Status feed lost: {e}")
+            time.sleep(self.RECONNECT_DELAY)
+
+    def _listen(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(control.path)
+            sock.sendall(b'{"cmd": "subscribe"}\n')
+            frames = FrameBuffer()
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    raise ConnectionResetError("core closed the status feed")
+                for frame in frames.feed(data):
+                    message = json.loads(frame)
+                    # The reply to subscribe carries the status to start from
+                    self._deliver(message.get("push", "status"), message.get("data", {}), message["status"])
+
+    def _deliver(self, kind, data, status):
+        with _core_cache_lock:
+            _core_cache["status"] = (time.monotonic(), status)
+            if kind.startswith("node_"):
+                _core_cache.pop("nodes", None)
+        message = f"event: status\ndata: {json.dumps({'kind': kind, 'data': data, 'status': status})}\n\n"
+        with self.lock:
+            self.latest = message
+            for stream in self.streams:
+                stream.put(message)
+
+
+feed = StatusFeed()
+
+
+@lru_cache(maxsize=32)
+def render_alarm(alarm: Alarm | None) -> Markup:
+    """Render the current-alarm box. Alarms are immutable, so each is rendered once"""
+    if alarm is None:
+        return Markup("")
+    return Markup(render_template("current_alarm.html", current_alarm=alarm))
+
+
+@app.route("/", methods = ["GET", "POST"])
+def index():
+    form = AlarmTime()
+    if form.validate_on_submit():
+        t = form.time.data
+        # Convert the submitted time (a datetime.time) to our Alarm
+        alarm = alarm_from_24h(t.hour, t.minute, parse_groups(form.groups.data))
+        try:
+            core_command(control.set_alarm, alarm)
+            msg = f"Alarm set for {alarm}"
+        except ControlError as e:
+            print(f"[WEB] Failed to set alarm: {e}")
+            msg = f"Alarm created (server not running): {alarm}"
+
+        return render_template("index.html", form=form, message=msg, alarm_html=render_alarm(alarm))
+
+    # On GET request, fetch the current alarm from the core
+    try:
+        status = core_status()
+        current_alarm = Alarm.from_dict(status["alarm"]) if status["alarm"] else None
+    except ControlError as e:
+        print(f"[WEB] Failed to read alarm status: {e}")
+        current_alarm = None
+    return render_template("index.html", form=form, alarm_html=render_alarm(current_alarm))
+
+
+@app.route("/remove", methods = ["POST"])
+def remove_alarm():
+    """Remove the currently scheduled alarm"""
+    try:
+        core_command(control.remove_alarm)
+    except ControlError as e:
+        print(f"[WEB] Failed to remove alarm: {e}")
+    return redirect(url_for('index'))
+
+
+# ------------------------------
+# JSON API
+# ------------------------------
+def json_response(payload, status=200, source=None) -> Response:
+    """JSON response; GETs get a content ETag and a 304 if the client already has it.
+
+    Args:
+        payload: JSON-serializable response body
+        status: HTTP status code
+        source: Name of the core cache entry the payload was built from, so
+                NotModified can answer the next poll on this path by itself
+    """
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    response = Response(body, status=status, mimetype="application/json")
+    if status == 200 and request.method == "GET":
+        etag = hashlib.blake2b(body.encode(), digest_size=8).hexdigest()
+        response.set_etag(etag)
+        # Cacheable, but always revalidated
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if source:
+            with _core_cache_lock:
+                cached = _core_cache.get(source)
+            if cached:
+                _etags[request.path] = (source, response.headers["ETag"], cached[0])
+    return response
+
+
+class NotModified:
+    """WSGI middleware that answers unchanged API polls before Flask runs.
+
+    A poll whose If-None-Match equals the ETag last served for that path,
+    while the core cache entry it was built from is still fresh, gets an
+    empty 304 for a dict lookup instead of a trip through Flask.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ["REQUEST_METHOD"] == "GET" and "HTTP_IF_NONE_MATCH" in environ:
+            known = _etags.get(environ["PATH_INFO"])
+            if known and environ["HTTP_IF_NONE_MATCH"] == known[1]:
+                source, etag, fetched_at = known
+                cached = _core_cache.get(source)
+                if cached and cached[0] == fetched_at and time.monotonic() - fetched_at < CORE_CACHE_TTL:
+                    start_response("304 Not Modified", [("ETag", etag), ("Cache-Control", "no-cache")])
+                    return []
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = NotModified(app.wsgi_app)
+
+
+def api_error(message, status) -> Response:
+    return json_response({"error": message}, status)
+
+
+@app.errorhandler(ControlError)
+def core_unreachable(e):
+    if request.path.startswith(("/api/", "/admin/")):
+        return api_error(str(e), 503)
+    raise e
+
+
+@app.get("/api/status")
+def api_status():
+    return json_response(core_status(), source="status")
+
+
+@app.get("/api/alarm")
+def api_get_alarm():
+    return json_response({"alarm": core_status()["alarm"]}, source="status")
+
+
+@app.route("/api/alarm", methods=["PUT", "POST"])
+def api_set_alarm():
+    """Set the alarm from {"time": "HH:MM"} (24-hour) or {"hours", "minutes", "is_pm"}.
+
+    Either form takes an optional "groups" list to target the alarm.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return api_error("expected a JSON object", 400)
+    try:
+        if "time" in data:
+            hour24, minute = (int(part) for part in str(data["time"]).split(":"))
+            if not 0 <= hour24 <= 23:
+                raise ValueError(f"Hours must be 0-23, got {hour24}")
+            alarm = alarm_from_24h(hour24, minute, api_groups(data))
+        else:
+            alarm = Alarm.from_dict({**data, "groups": api_groups(data)})
+    except (KeyError, TypeError, ValueError) as e:
+        return api_error(f"invalid alarm: {e}", 400)
+    return json_response(core_command(control.set_alarm, alarm))
+
+
+@app.delete("/api/alarm")
+def api_remove_alarm():
+    return json_response(core_command(control.remove_alarm))
+
+
+@app.get("/api/nodes")
+def api_nodes():
+    return json_response({"nodes": from_core("nodes", control.nodes)}, source="nodes")
+
+
+def parse_time(value) -> float | None:
+    """Unix time from a unix timestamp or an ISO 8601 date/time (local time unless it has an offset)"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+@app.get("/api/history")
+def api_history():
+    """Recorded alarm and node events, oldest first.
+
+    Filters: ?since= and ?until= (unix time or ISO 8601), ?node=ip:port (or
+    "host"), ?kind= (repeatable or comma-separated) and ?limit= (the newest
+    ones if more match).
+    """
+    try:
+        since = parse_time(request.args.get("since"))
+        until = parse_time(request.args.get("until"))
+        limit = int(request.args.get("limit", 200))
+    except ValueError as e:
+        return api_error(f"invalid parameter: {e}", 400)
+    kinds = [kind for value in request.args.getlist("kind") for kind in value.split(",") if kind]
+    return json_response(control.history(since=since, until=until, node=request.args.get("node") or None,
+                                         kinds=kinds or None, limit=limit))
+
+
+@app.get("/api/events")
+def api_events():
+    """Server-sent events: a "status" event with the full status on every change"""
+    stream = feed.open()
+    if stream is None:
+        response = api_error("too many open streams, poll /api/status instead", 503)
+        response.headers["Retry-After"] = "30"
+        return response
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                messages = stream.take(STREAM_KEEPALIVE)
+                # The keepalive also finds closed connections, which only
+                # fail on write
+                yield "".join(messages) if messages else ": keepalive\n\n"
+        finally:
+            feed.close(stream)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ------------------------------
+# Diagnostics
+# ------------------------------
+@app.before_request
+def admin_only():
+    """/admin/* needs "Authorization: Bearer <ALARM_MESH_ADMIN_TOKEN>" and is a 404 without a token set"""
+    if not request.path.startswith("/admin/"):
+        return None
+    if not ADMIN_TOKEN:
+        return api_error("not found", 404)
+    given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(given.encode(), ADMIN_TOKEN.encode()):
+        response = api_error("admin token required", 401)
+        response.headers["WWW-Authenticate"] = "Bearer"
+        return response
+    return None
+
+
+def in_web_process() -> bool:
+    """?process=web diagnoses this process instead of the core"""
+    return request.args.get("process", "core") == "web"
+
+
+def text_response(body) -> Response:
+    return Response(body, mimetype="text/plain", headers={"Cache-Control": "no-store"})
+
+
+@app.get("/admin/threads")
+def admin_threads():
+    """Every thread's stack"""
+    return text_response(diagnostics.dump_threads() if in_web_process() else control.threads())
+
+
+@app.get("/admin/profile")
+def admin_profile():
+    """Sample for ?seconds= (default 5) and return collapsed stacks for flamegraph.pl or speedscope"""
+    try:
+        seconds = float(request.args.get("seconds", 5))
+        interval = float(request.args.get("interval", diagnostics.DEFAULT_SAMPLE_INTERVAL))
+    except ValueError as e:
+        return api_error(f"invalid parameter: {e}", 400)
+    if not 0 < seconds <= diagnostics.MAX_PROFILE_SECONDS or not 0 < interval <= 1:
+        return api_error(f"seconds must be 0-{diagnostics.MAX_PROFILE_SECONDS}, interval 0-1", 400)
+    try:
+        if in_web_process():
+            stacks = diagnostics.sample_profile(seconds, interval)
+        else:
+            stacks = control.profile(seconds, interval)
+    except (RuntimeError, ControlError) as e:
+        if "already running" in str(e):
+            return api_error(str(e), 409)
+        raise
+    return text_response(stacks)
+
+
+@app.get("/admin/locks")
+def admin_locks():
+    """Wait times of the core's AlarmHost and AlarmManager locks; ?reset=1 starts a new measurement"""
+    return json_response({"locks": control.locks(reset=request.args.get("reset") == "1")})
+
+
+# ------------------------------
+# Serving
+# ------------------------------
+class OneRequestHandler(WSGIRequestHandler):
+    """Close the connection after each response, so an idle keep-alive
+    client can't hold one of the pool's workers"""
+    protocol_version = "HTTP/1.0"
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug's WSGI server with requests handled by a fixed thread pool.
+
+    The threaded dev server starts a thread per connection, so a burst of
+    page loads becomes a burst of threads; here they queue for the pool.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=WEB_THREADS):
+        super().__init__(host, port, app, handler=OneRequestHandler)
+        self.requests = queue.SimpleQueue()
+        self.threads = threads
+        # Daemon threads, so an open event stream can't hold up shutdown
+        for i in range(threads):
+            threading.Thread(target=self._worker, name=f"web-{i}", daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self.requests.put((request, client_address))
+
+    def _worker(self):
+        while True:
+            request, client_address = self.requests.get()
+            if request is None:
+                return
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in range(self.threads):
+            self.requests.put((None, None))  # Idle workers exit
+
+
+def serve(host, port, threads=WEB_THREADS):
+    """Serve the app with waitress if installed, else with PooledWSGIServer"""
+    try:
+        import waitress
+    except ImportError:
+        print(f"[WEB] waitress not installed, using the built-in pooled server ({threads} threads)")
+        PooledWSGIServer(host, port, app, threads=threads).serve_forever()
+    else:
+        print(f"[WEB] Serving with waitress ({threads} threads)")
+        waitress.serve(app, host=host, port=port, threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alarm host web UI")
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    parser.add_argument("--control", default=DEFAULT_PATH, help="control socket of the core process")
+    parser.add_argument("--nice", type=int, default=WEB_NICE, help="niceness increment for this process")
+    parser.add_argument("--threads", type=int, default=WEB_THREADS, help="request worker threads")
+    args = parser.parse_args()
+
+    if args.nice:
+        os.nice(args.nice)
+    diagnostics.install_signal_handler()
+    control.path = args.control
+    print(f"[WEB] Serving on port {args.port}, core at {args.control}")
+    serve("0.0.0.0", args.port, threads=args.threads + MAX_STREAMS)
+
+
+if __name__ == "__main__":
+    main()
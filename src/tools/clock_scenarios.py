@@ -0,0 +1,197 @@
+"""Fast-forward scheduler scenarios on a simulated clock.
+
+Runs the real AlarmScheduler, AlarmManager and AlarmHost heartbeat expiry
+against common.clock.SimulatedClock, so days of behavior take milliseconds:
+
+  week       a daily 7:00 AM alarm, snoozed two minutes after it rings and
+             set again for the next morning, for seven days
+  dst        alarms inside the spring-forward gap and the fall-back overlap
+             (America/New_York), showing when they actually fire
+  heartbeat  nodes with relaxed, alert and unannounced heartbeat intervals,
+             some going quiet
+
+Run from src/:  python -m tools.clock_scenarios
+"""
+import argparse
+import contextlib
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from common.clock import SimulatedClock, SimulationFinished
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import Alarm, EventType
+from host.alarm_manager import AlarmManager
+from host.scheduler import AlarmScheduler
+
+SNOOZE_AFTER = 120  # Seconds an alarm rings before the simulated user snoozes it
+
+
+def run_schedule(clock, alarms, arm_lead=30):
+    """Run the scheduler until the clock's stop time.
+
+    alarms is a list of (set at, Alarm) to set along the way. The alarm is
+    snoozed SNOOZE_AFTER seconds after each trigger. Returns the recorded
+    [(sim time, AlarmEvent)] from the manager.
+    """
+    events = []
+    manager = None
+
+    def snooze():
+        manager.handle_snooze(connected_nodes_count=0, source="sim")
+
+    def record(event):
+        # Called under the manager lock: only queue follow-up actions
+        events.append((clock.time(), event))
+        if event.type == EventType.ALARM_TRIGGERED:
+            clock.call_later(SNOOZE_AFTER, snooze)
+
+    manager = AlarmManager(event_callback=record)
+    for when, alarm in alarms:
+        clock.call_at(when, lambda alarm=alarm: manager.set_alarm(alarm))
+
+    scheduler = AlarmScheduler(manager, clock=clock, arm_lead=arm_lead)
+    try:
+        scheduler.run()
+    except SimulationFinished:
+        pass
+    return events
+
+
+def triggers(events):
+    """[(sim time triggered, fire_at)] of every ALARM_TRIGGERED"""
+    return [(at, event.data["fire_at"]) for at, event in events if event.type == EventType.ALARM_TRIGGERED]
+
+
+def week_scenario():
+    start = datetime(2026, 6, 1, 6, 0)
+    clock = SimulatedClock(start=start, stop_at=start + timedelta(days=7))
+    alarm_times = [(start, Alarm(hours=7, minutes=0))]
+    # One-shot alarms: set it again every evening for the next morning
+    for day in range(1, 7):
+        alarm_times.append((start + timedelta(days=day - 1, hours=15), Alarm(hours=7, minutes=0)))
+
+    events = run_schedule(clock, alarm_times)
+    fired = triggers(events)
+    armed = [at for at, event in events if event.type == EventType.ALARM_ARMED]
+    late = [at - fire_at for at, fire_at in fired]
+    report = [f"week: {len(fired)} triggers, {len(armed)} arms over 7 simulated days"]
+    for at, fire_at in fired:
+        report.append(f"  rang {datetime.fromtimestamp(at):%a %Y-%m-%d %H:%M:%S}")
+    report.append(f"  max trigger lateness: {max(late, default=0.0) * 1000:.3f}ms")
+    return report
+
+
+def dst_scenario():
+    cases = [
+        ("spring forward, 2:30 AM does not exist", datetime(2026, 3, 7, 12, 0), Alarm(hours=2, minutes=30)),
+        ("fall back, 1:30 AM happens twice", datetime(2026, 10, 31, 12, 0), Alarm(hours=1, minutes=30)),
+        ("spring forward, 7:00 AM on a 23-hour day", datetime(2026, 3, 7, 12, 0), Alarm(hours=7, minutes=0)),
+        ("fall back, 7:00 AM on a 25-hour day", datetime(2026, 10, 31, 12, 0), Alarm(hours=7, minutes=0)),
+    ]
+    report = []
+    previous_tz = os.environ.get("TZ")
+    os.environ["TZ"] = "America/New_York"
+    time.tzset()
+    try:
+        for label, start, alarm in cases:
+            clock = SimulatedClock(start=start, stop_at=start + timedelta(days=1))
+            fired = triggers(run_schedule(clock, [(start, alarm)]))
+            rang = ", ".join(
+                f"{datetime.fromtimestamp(at):%Y-%m-%d %H:%M} {time.strftime('%Z', time.localtime(at))}"
+                for at, _ in fired
+            ) or "never"
+            report.append(f"dst: {label}: alarm {alarm} rang {len(fired)}x: {rang}")
+    finally:
+        if previous_tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = previous_tz
+        time.tzset()
+    return report
+
+
+def heartbeat_scenario():
+    clock = SimulatedClock(start=datetime(2026, 6, 1, 12, 0))
+    host = AlarmHost(port=0, clock=clock)
+    clock.stop_at = clock.time() + 3600
+    quiet_until = clock.time() + 300
+
+    # (heartbeat interval, announced in HELLO?, goes quiet?)
+    nodes = {
+        "relaxed, steady": (60, True, False),
+        "alert, quiet": (5, True, True),
+        "unannounced, quiet": (10, False, True),
+    }
+    addrs = {}
+    pairs = []
+    for i, (name, (interval, announced, _)) in enumerate(nodes.items()):
+        addr = (f"10.0.0.{i + 1}", 5001)
+        local, remote = socket.socketpair()
+        pairs.append(remote)
+        host.clients[addr] = host._client_info(local, clock.time(), clock.time(), groups=("ward",))
+        host.groups.setdefault("ward", set()).add(addr)
+        if announced:
+            host.set_heartbeat_interval(addr, interval)
+        addrs[name] = addr
+
+    def heartbeat(name):
+        interval, _, quiet = nodes[name]
+        if quiet and clock.time() >= quiet_until:
+            return
+        host.record_heartbeat(addrs[name])
+        clock.call_later(interval, lambda: heartbeat(name))
+
+    for name in nodes:
+        clock.call_later(nodes[name][0], lambda name=name: heartbeat(name))
+
+    removed = {}
+    checks = 0
+    try:
+        # Same loop as AlarmHost._heartbeat_monitor, recording removal times
+        while True:
+            clock.sleep(host.heartbeat_check_interval())
+            checks += 1
+            for addr in host.expire_nodes():
+                removed[addr] = clock.time()
+    except SimulationFinished:
+        pass
+    for remote in pairs:
+        remote.close()
+
+    report = []
+    for name, (interval, _, quiet) in nodes.items():
+        at = removed.get(addrs[name])
+        if quiet:
+            outcome = f"removed {at - quiet_until:.0f}s after it went quiet" if at else "never removed"
+        else:
+            outcome = "removed" if at else "kept over 1 simulated hour"
+        report.append(f"heartbeat: {name} node (every {interval}s): {outcome}")
+    report.append(f"  ({checks} expiry checks; timeout {host.HEARTBEAT_MISSES} intervals, "
+                  f"{host.HEARTBEAT_TIMEOUT}s unannounced)")
+    return report
+
+
+SCENARIOS = {"week": week_scenario, "dst": dst_scenario, "heartbeat": heartbeat_scenario}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--verbose", action="store_true", help="show scheduler and manager logs")
+    args = parser.parse_args()
+
+    for name in args.scenarios or SCENARIOS:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+        started = time.perf_counter()
+        logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with logs:
+            report = SCENARIOS[name]()
+        elapsed = (time.perf_counter() - started) * 1000
+        print("\n".join(report))
+        print(f"  ({elapsed:.1f}ms real time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Benchmark alarm fan-out: TCP broadcast vs. the UDP multicast fast path.
+
+Connects N loopback receivers to a real AlarmHost and measures, per
+broadcast, how long until the first/median/last receiver sees the event.
+In multicast mode every receiver also keeps its TCP connection open, since
+the host still sends the TCP repair copy after the datagram.
+
+On loopback all receivers share this machine's CPU, so the kernel's
+per-socket multicast delivery and the single receiver thread dominate
+"last" at high node counts. "handoff" (time until every copy is on its
+way) is the number that carries over to a real LAN.
+
+With --groups G, node i joins group "g{i mod G}" and a third row sends
+each event targeted at group g0 only, over TCP; "last" is then the last
+member of g0 to hear it.
+
+Run from src/:  python -m tools.fanout_bench --nodes 10 100 1000
+"""
+import argparse
+import contextlib
+import os
+import resource
+import selectors
+import socket
+import struct
+import threading
+import time
+from common.comms.host_server import AlarmHost
+from common.comms.multicast import DEFAULT_GROUP, MulticastSender
+from common.comms.protocol import AlarmEvent, EventType
+from tools.stats import percentile
+
+
+class Receivers:
+    """N loopback TCP clients plus N multicast sockets, drained by one thread"""
+
+    def __init__(self, host, mcast_port, count, groups=0):
+        self.selector = selectors.DefaultSelector()
+        self.tcp = []
+        self.udp = []
+        self.members = set()  # TCP sockets in group g0
+        for i in range(count):
+            conn = socket.create_connection(("127.0.0.1", host.port))
+            if groups:
+                hello = AlarmEvent(EventType.HELLO, {"groups": [f"g{i % groups}"]})
+                conn.sendall((hello.to_json() + "\n").encode())
+                if i % groups == 0:
+                    self.members.add(conn)
+            conn.setblocking(False)
+            self.selector.register(conn, selectors.EVENT_READ, "tcp")
+            self.tcp.append(conn)
+
+            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            udp.bind(("", mcast_port))
+            membership = struct.pack("4s4s", socket.inet_aton(DEFAULT_GROUP), socket.inet_aton("127.0.0.1"))
+            udp.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            udp.setblocking(False)
+            self.selector.register(udp, selectors.EVENT_READ, "udp")
+            self.udp.append(udp)
+
+        self.lock = threading.Lock()
+        self.measure = None     # "tcp" or "udp": which sockets count this round
+        self.expected = 0       # Arrivals that complete the round
+        self.arrivals = {}      # {sock: perf_counter at first read}
+        self.done = threading.Event()
+        self.running = True
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def start_round(self, kind, expected):
+        with self.lock:
+            self.measure = kind
+            self.expected = expected
+            self.arrivals = {}
+            self.done.clear()
+
+    def _drain(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                now = time.perf_counter()
+                try:
+                    key.fileobj.recv(65536)
+                except OSError:
+                    continue
+                with self.lock:
+                    if key.data == self.measure and key.fileobj not in self.arrivals:
+                        self.arrivals[key.fileobj] = now
+                        if len(self.arrivals) == self.expected:
+                            self.done.set()
+
+    def close(self):
+        self.running = False
+        for sock in self.tcp + self.udp:
+            sock.close()
+
+
+def run(host, receivers, kind, iterations, targeted=False):
+    """Broadcast iterations events and summarize when receivers of kind heard them.
+
+    "handoff" is how long until every copy of the event was handed to the
+    kernel: the whole broadcast() call for TCP, just the datagram for multicast.
+    If targeted, the events are addressed to group g0 only.
+    """
+    expected = len(receivers.members) if targeted else len(receivers.tcp)
+    audience = {"groups": ["g0"]} if targeted else {}
+    firsts, medians, lasts, send_times, handoffs = [], [], [], [], []
+    fast_path_sent = []
+    if host.fast_path:
+        send_datagram = host.fast_path.send
+
+        def timed_send(event):
+            result = send_datagram(event)
+            fast_path_sent.append(time.perf_counter())
+            return result
+        host.fast_path.send = timed_send
+
+    for i in range(iterations):
+        event_type = EventType.ALARM_TRIGGERED if i % 2 == 0 else EventType.ALARM_CLEARED
+        receivers.start_round(kind, expected)
+        fast_path_sent.clear()
+        t0 = time.perf_counter()
+        host.broadcast(AlarmEvent(event_type, {"alarm": {"hours": 7, "minutes": 0, "is_pm": False}, **audience}))
+        send_times.append(time.perf_counter() - t0)
+        handoffs.append((fast_path_sent[0] if fast_path_sent else t0 + send_times[-1]) - t0)
+        if not receivers.done.wait(timeout=5):
+            print(f"  warning: only {len(receivers.arrivals)} receivers heard round {i}")
+        with receivers.lock:
+            latencies = sorted(t - t0 for t in receivers.arrivals.values())
+        if latencies:
+            firsts.append(latencies[0])
+            medians.append(percentile(latencies, 50))
+            lasts.append(latencies[-1])
+        time.sleep(0.05)
+    return {
+        "first_ms": percentile(firsts, 50) * 1000,
+        "median_ms": percentile(medians, 50) * 1000,
+        "last_ms": percentile(lasts, 50) * 1000,
+        "broadcast_call_ms": percentile(send_times, 50) * 1000,
+        "handoff_ms": percentile(handoffs, 50) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--port", type=int, default=5201, help="first TCP port (two ports per size)")
+    parser.add_argument("--mcast-port", type=int, default=5202)
+    parser.add_argument("--groups", type=int, default=0, help="split nodes into this many groups and add a targeted row")
+    args = parser.parse_args()
+
+    # Each node costs three descriptors (host side, TCP client, UDP socket)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    # Host logs every broadcast and disconnect; keep them out of the report
+    results = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for i, count in enumerate(args.nodes):
+            # Fresh ports per size: the previous host's connections linger in TIME_WAIT
+            port = args.port + 2 * i
+            mcast_port = args.mcast_port + 2 * i
+            host = AlarmHost(port=port)
+            host.start(advertise=False)
+            receivers = Receivers(host, mcast_port, count, args.groups)
+            while host.get_connected_nodes_count() < count:
+                time.sleep(0.05)
+            while args.groups and host.get_connected_nodes_count(["g0"]) < len(receivers.members):
+                time.sleep(0.05)  # HELLOs still being read
+
+            host.fast_path = None
+            results.append((count, "tcp", run(host, receivers, "tcp", args.iterations)))
+            host.fast_path = MulticastSender(DEFAULT_GROUP, mcast_port, interface="127.0.0.1")
+            results.append((count, "multicast", run(host, receivers, "udp", args.iterations)))
+            if args.groups:
+                host.fast_path = None
+                results.append((count, f"tcp 1/{args.groups}", run(host, receivers, "tcp", args.iterations, targeted=True)))
+
+            receivers.close()
+            host.stop()
+            time.sleep(0.5)
+
+    print(f"{'nodes':>6} {'path':<10} {'handoff':>9} {'first':>9} {'median':>9} {'last':>9} {'call':>9}")
+    for count, label, result in results:
+        print(f"{count:>6} {label:<10} {result['handoff_ms']:>7.3f}ms {result['first_ms']:>7.3f}ms "
+              f"{result['median_ms']:>7.3f}ms {result['last_ms']:>7.3f}ms {result['broadcast_call_ms']:>7.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
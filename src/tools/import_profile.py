@@ -0,0 +1,62 @@
+"""Startup import profile of the node runtime (python -X importtime, summarized).
+
+Imports the given modules in a fresh interpreter and lists the slowest
+imports by cumulative time (including everything they pulled in) and by
+self time. Defaults to the node runtime minus the GPIO drivers, which only
+import on a Pi; pass client.app explicitly there.
+
+Run from src/:  python -m tools.import_profile [--discovery] [module ...]
+"""
+import argparse
+import subprocess
+import sys
+
+NODE_RUNTIME = [
+    "common.comms.node_client",
+    "common.comms.local_schedule",
+    "common.comms.multicast",
+    "common.comms.framing",
+]
+
+
+def profile(modules):
+    """[(self us, cumulative us, depth, name)] for every module imported"""
+    code = "".join(f"import {module}\n" for module in modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", help="modules to import (default: the node runtime)")
+    parser.add_argument("--discovery", action="store_true", help="also import zeroconf, as a node without --host does")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    modules = args.modules or list(NODE_RUNTIME)
+    if args.discovery:
+        modules.append("zeroconf")
+    rows = profile(modules)
+    total = sum(row[0] for row in rows)
+
+    print(f"{len(rows)} modules, {total / 1000:.1f}ms total import time for: {' '.join(modules)}")
+    print("\nslowest by cumulative time (ms, % of total):")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} {cumulative_us / total * 100:5.1f}%  {'  ' * min(depth, 6)}{name}")
+    print("\nslowest by self time (ms):")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: -row[0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Reconnect storm: N nodes connect to a fresh host at the same instant.
+
+Models a building coming back after a power cut. The host runs in a child
+process with an alarm set, so every admitted node is sent ALARM_SET (its
+state sync). All N connections are opened at once from non-blocking
+sockets in this process. Each node sends a heartbeat as soon as it is
+connected and every 10s after (client/app.py sends its HELLO first and
+is quieter after), and a connection that is refused or reset is retried
+after --retry seconds. Reports how long
+until the host had accepted every node and until every node had its state.
+
+Compare against the old listen() backlog of 5:
+    python -m tools.reconnect_storm --nodes 1000 --backlog 5
+
+Run from src/:  python -m tools.reconnect_storm --nodes 1000
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import selectors
+import socket
+import time
+from common.comms.protocol import Alarm, AlarmEvent, EventType
+from tools.stats import summarize_ms
+
+
+HEARTBEAT = (AlarmEvent(EventType.HEARTBEAT).to_json() + "\n").encode()
+HEARTBEAT_INTERVAL = 10
+
+
+def host_process(backlog, admission_rate, conn, verbose):
+    """Child process: a host with an alarm set and a state sync like host/app.py's"""
+    from common.comms.host_server import AlarmHost
+
+    logs = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        state = (AlarmEvent(EventType.ALARM_SET, {"alarm": Alarm(hours=7, minutes=0).to_dict()}).to_json() + "\n").encode()
+
+        def sync_state(addr, node_conn):
+            node_conn.sendall(state)
+
+        host = AlarmHost(port=0, on_node_connected=sync_state, backlog=backlog, admission_rate=admission_rate)
+        host.start(advertise=False)
+        conn.send(host.sock.getsockname()[1])
+        while True:
+            command = conn.recv()
+            if command == "count":
+                conn.send(host.get_connected_nodes_count())
+            elif command == "stop":
+                host.stop()
+                conn.send("ok")
+                return
+
+
+class StormNode:
+    """One non-blocking connection that waits for its ALARM_SET"""
+
+    def __init__(self, index):
+        self.index = index
+        self.sock = None
+        self.buffer = b""
+        self.retries = 0
+        self.retry_at = None
+        self.heartbeat_at = None  # Next heartbeat, once connected
+        self.synced_at = None
+
+    def open(self, selector, port):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        self.sock.connect_ex(("127.0.0.1", port))
+        self.heartbeat_at = None
+        # Writable once connected; then send the first heartbeat
+        selector.register(self.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, self)
+
+    def on_writable(self, selector):
+        selector.modify(self.sock, selectors.EVENT_READ, self)
+        self.heartbeat()
+
+    def heartbeat(self):
+        self.heartbeat_at = time.time() + HEARTBEAT_INTERVAL
+        with contextlib.suppress(OSError):
+            self.sock.send(HEARTBEAT)
+
+    def on_readable(self, selector, retry_delay) -> bool:
+        """Read what arrived; True once synced. Schedules a retry on failure"""
+        try:
+            data = self.sock.recv(4096)
+        except OSError:
+            data = b""
+        if not data:
+            selector.unregister(self.sock)
+            self.sock.close()
+            self.retries += 1
+            self.retry_at = time.time() + retry_delay
+            self.heartbeat_at = None
+            return False
+        self.buffer += data
+        if b"\n" in self.buffer:
+            self.synced_at = time.time()
+            return True
+        return False
+
+
+def storm(port, count, retry_delay, timeout, host_count):
+    """Connect count nodes at once; returns (nodes, time all were accepted by the host)"""
+    selector = selectors.DefaultSelector()
+    nodes = [StormNode(i) for i in range(count)]
+    started = time.time()
+    for node in nodes:
+        node.open(selector, port)
+
+    all_accepted = None
+    synced = 0
+    next_count = started
+    while (synced < count or all_accepted is None) and time.time() - started < timeout:
+        for key, mask in selector.select(timeout=0.05):
+            node = key.data
+            if mask & selectors.EVENT_WRITE:
+                node.on_writable(selector)
+            if mask & selectors.EVENT_READ and node.on_readable(selector, retry_delay):
+                selector.unregister(key.fileobj)
+                synced += 1
+        now = time.time()
+        for node in nodes:
+            if node.retry_at is not None and node.retry_at <= now:
+                node.retry_at = None
+                node.open(selector, port)
+            elif node.heartbeat_at is not None and node.heartbeat_at <= now and not node.synced_at:
+                node.heartbeat()
+        if all_accepted is None and now >= next_count:
+            next_count = now + 0.05
+            if host_count() >= count:
+                all_accepted = now
+    for node in nodes:
+        with contextlib.suppress(OSError):
+            node.sock.close()
+    return nodes, started, all_accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--backlog", type=int, default=None, help="host listen() backlog (default: AlarmHost.LISTEN_BACKLOG)")
+    parser.add_argument("--admission-rate", type=float, default=None,
+                        help="state syncs per second after the initial burst (default: AlarmHost.ADMISSION_RATE)")
+    parser.add_argument("--retry", type=float, default=5.0, help="seconds before a refused node retries (client/app.py waits 5)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--verbose", action="store_true", help="show host logs")
+    args = parser.parse_args()
+
+    from common.comms.host_server import AlarmHost
+    backlog = AlarmHost.LISTEN_BACKLOG if args.backlog is None else args.backlog
+    admission_rate = AlarmHost.ADMISSION_RATE if args.admission_rate is None else args.admission_rate
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    host = multiprocessing.Process(target=host_process, daemon=True,
+                                   args=(backlog, admission_rate, child_conn, args.verbose))
+    host.start()
+    port = parent_conn.recv()
+
+    def host_count():
+        parent_conn.send("count")
+        return parent_conn.recv()
+
+    nodes, started, all_accepted = storm(port, args.nodes, args.retry, args.timeout, host_count)
+    parent_conn.send("stop")
+    parent_conn.recv()
+    host.join(timeout=5)
+
+    synced = [node.synced_at - started for node in nodes if node.synced_at]
+    retried = sum(1 for node in nodes if node.retries)
+    sync = summarize_ms(synced)
+    print(f"{args.nodes} simultaneous reconnects, backlog {backlog}, admission {admission_rate:.0f}/s, "
+          f"refused nodes retry after {args.retry}s")
+    if all_accepted:
+        print(f"  all accepted by host after {(all_accepted - started) * 1000:.0f}ms")
+    else:
+        print(f"  host never had all {args.nodes} nodes within {args.timeout}s")
+    print(f"  state synced: {len(synced)}/{args.nodes}, p50 {sync['p50_ms']:.0f}ms "
+          f"p99 {sync['p99_ms']:.0f}ms last {sync['max_ms']:.0f}ms")
+    print(f"  nodes that had to retry: {retried} ({sum(node.retries for node in nodes)} retries)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Replay a capture (see common.comms.capture) into a host or a node.
+
+Record one with `python -m host.app --capture site.cap` (or client.app on a
+node), then:
+
+  summary  what the capture holds: duration, peers, frames by direction
+           and type
+  host     reconnects every captured node to a fresh host core (in a child
+           process) and sends what each node sent, at the captured times
+           divided by --speed (0: as fast as possible). The host's own
+           decisions in the capture (ALARM_SET, ALARM_ARMED, ALARM_TRIGGERED,
+           from the web UI and the scheduler) are applied to its AlarmManager at the
+           same points, so replayed snoozes meet a ringing alarm as they did
+           on site. A captured ALARM_CLEARED that the replay didn't
+           reproduce by itself (the alarm was removed in the web UI or
+           snoozed on the host's button, neither of which is captured) is
+           forced with remove_alarm() and counted. Reports the host's CPU
+           time and compares the events it sent with the captured ones, so
+           a capture doubles as a regression workload. Faster replays
+           coalesce more events into BATCH frames, and hit the inbound rate
+           limits sooner (--no-limits).
+  node     plays the host for one node: sends it what the captured host
+           sent that node (or, for a node capture, what the node received).
+           Fire times are shifted onto the replay's timeline and TIME_SYNC
+           requests are answered live, since the captured replies would be
+           meaningless now. Uses a SimNode unless --external, which waits
+           for a real node (`python -m client.app --host 127.0.0.1:PORT`).
+
+Run from src/:  python -m tools.replay host site.cap --speed 10
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import selectors
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+from common.comms.capture import read_capture
+from common.comms.framing import FrameBuffer
+from common.comms.protocol import Alarm, AlarmEvent, EventType, MalformedFrame, peek_event_type
+
+# Host decisions replayed into the AlarmManager in host mode
+DRIVEN_TYPES = ("ALARM_SET", "ALARM_ARMED", "ALARM_TRIGGERED")
+
+
+def load(path):
+    """Records of every run in the capture, as (absolute time, Record), and the header of the first run"""
+    records = []
+    first_header = None
+    for header, record in read_capture(path):
+        if first_header is None:
+            first_header = header
+        records.append((float(header.get("start", 0)) + record.time, record))
+    return records, first_header or {}
+
+
+def frame_type(frame) -> str:
+    try:
+        event_type = peek_event_type(frame)
+    except MalformedFrame:
+        return "(malformed)"
+    return event_type.name if event_type else "(other)"
+
+
+def event_types(frame) -> list[str]:
+    """Type names of a frame, with a BATCH counted as the events inside it"""
+    name = frame_type(frame)
+    if name != "BATCH":
+        return [name]
+    try:
+        return [EventType(inner["type"]).name for inner in json.loads(frame)["data"]["events"]]
+    except (ValueError, KeyError, TypeError):
+        return ["(malformed)"]
+
+
+def summary(path):
+    records, header = load(path)
+    if not records:
+        print(f"{path}: no records")
+        return
+    counts = Counter((record.direction, frame_type(record.frame)) for _, record in records if record.frame)
+    peers = {record.peer for _, record in records if record.peer != "*" and not record.peer.startswith("groups:")}
+    print(f"{path}: {header.get('role', '?')} capture, {len(records)} records over "
+          f"{records[-1][0] - records[0][0]:.1f}s, {len(peers)} peers")
+    print(f"  {'connects':<12} {sum(1 for _, r in records if r.direction == 'c')}")
+    print(f"  {'disconnects':<12} {sum(1 for _, r in records if r.direction == 'd')}")
+    for (direction, name), count in sorted(counts.items()):
+        print(f"  {'in' if direction == 'i' else 'out':<4} {name:<20} {count}")
+
+
+class Clock:
+    """Maps captured times onto the replay's wall clock"""
+
+    def __init__(self, first, speed):
+        self.first = first
+        self.speed = speed
+        self.start = time.time()
+
+    def at(self, t) -> float:
+        return self.start + (t - self.first) / self.speed if self.speed else time.time()
+
+    def wait_until(self, t):
+        delay = self.at(t) - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+# ------------------------------
+# Into a host
+# ------------------------------
+def host_core(conn, capture_path, rate_limits, verbose):
+    """Child process: a host core like host/app.py's, recording what it sends"""
+    from common.comms.capture import CaptureWriter
+    from common.comms.host_server import AlarmHost
+    from host.alarm_manager import AlarmManager
+    from host.event_dispatcher import EventDispatcher
+
+    logs = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        manager = None
+
+        def handle_event(event, addr):
+            if event.type == EventType.SNOOZE_PRESSED:
+                alarm = manager.get_current_alarm()
+                groups = alarm.groups if alarm else ()
+                if host.in_groups(addr, groups):
+                    manager.handle_snooze(host.get_connected_nodes_count(groups), source=str(addr),
+                                          fire_at=(event.data or {}).get("fire_at"))
+
+        host = AlarmHost(port=0, event_handler=handle_event, recorder=CaptureWriter(capture_path),
+                         rate_limits=rate_limits)
+        forced_clears = 0
+        dispatcher = EventDispatcher()
+        dispatcher.add_worker("network", host.broadcast_batch)
+        dispatcher.start()
+        manager = AlarmManager(event_callback=dispatcher.publish)
+        host.start(advertise=False)
+        conn.send(host.sock.getsockname()[1])
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_start = usage.ru_utime + usage.ru_stime
+        while True:
+            command = conn.recv()
+            if command[0] == "set":
+                manager.set_alarm(Alarm.from_dict(command[1]))
+            elif command[0] == "arm":
+                manager.arm_alarm(Alarm.from_dict(command[1]), command[2])
+            elif command[0] == "trigger":
+                manager.trigger_alarm(Alarm.from_dict(command[1]), command[2])
+            elif command[0] == "clear":
+                if manager.get_current_alarm() is not None:
+                    forced_clears += 1
+                    manager.remove_alarm()
+            elif command[0] == "stop":
+                time.sleep(0.2)  # Let the last events flush
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                dispatcher.stop()
+                host.stop()
+                conn.send({"cpu": usage.ru_utime + usage.ru_stime - cpu_start, "forced_clears": forced_clears,
+                           "malformed": host.malformed_frames, "dropped": host.dropped_frames})
+                return
+
+
+class Drain:
+    """Reads and discards whatever the host sends the replayed nodes, so its sends never block"""
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.running = True
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def add(self, sock):
+        with self.lock:
+            self.selector.register(sock, selectors.EVENT_READ)
+
+    def remove(self, sock):
+        with self.lock:
+            with contextlib.suppress(KeyError, ValueError):
+                self.selector.unregister(sock)
+
+    def _loop(self):
+        while self.running:
+            with self.lock:
+                ready = self.selector.select(timeout=0)
+            for key, _ in ready:
+                with contextlib.suppress(OSError):
+                    key.fileobj.recv(65536)
+            if not ready:
+                time.sleep(0.005)
+
+
+def into_host(args):
+    records, header = load(args.capture)
+    if header.get("role", "host") != "host":
+        raise SystemExit(f"{args.capture} is a {header.get('role')} capture; host replay needs a host capture")
+    fd, out_path = tempfile.mkstemp(prefix="alarm-mesh-replay-", suffix=".cap")
+    os.close(fd)
+    parent_conn, child_conn = multiprocessing.Pipe()
+    rate_limits = {} if args.no_limits else None
+    core = multiprocessing.Process(target=host_core, args=(child_conn, out_path, rate_limits, args.verbose),
+                                   daemon=True)
+    core.start()
+    port = parent_conn.recv()
+
+    clock = Clock(records[0][0], args.speed)
+    drain = Drain()
+    sockets = {}  # {captured peer: socket}
+    sent = 0
+
+    def open_peer(peer):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sockets[peer] = sock
+        drain.add(sock)
+        return sock
+
+    for at, record in records:
+        clock.wait_until(at)
+        if record.direction == "c" and record.peer not in sockets:
+            open_peer(record.peer)
+        elif record.direction == "d" and record.peer in sockets:
+            sock = sockets.pop(record.peer)
+            drain.remove(sock)
+            sock.close()
+        elif record.direction == "i":
+            sock = sockets.get(record.peer) or open_peer(record.peer)  # Connected before the capture began
+            frame = record.frame
+            if '"fire_at"' in frame:  # A snooze names the occurrence by its fire time
+                with contextlib.suppress(ValueError, AttributeError):
+                    raw = json.loads(frame)
+                    shift(raw.get("data") or {}, clock)
+                    frame = json.dumps(raw)
+            with contextlib.suppress(OSError):
+                sock.sendall((frame + "\n").encode())
+            sent += 1
+        elif record.direction == "o" and not args.no_state and frame_type(record.frame) == "ALARM_CLEARED":
+            parent_conn.send(("clear",))
+        elif record.direction == "o" and not args.no_state and frame_type(record.frame) in DRIVEN_TYPES:
+            event = AlarmEvent.from_json(record.frame)
+            if event.type == EventType.ALARM_SET:
+                parent_conn.send(("set", event.data["alarm"]))
+            else:
+                command = "arm" if event.type == EventType.ALARM_ARMED else "trigger"
+                parent_conn.send((command, event.data["alarm"], clock.at(event.data["fire_at"])))
+    elapsed = time.time() - clock.start
+
+    parent_conn.send(("stop",))
+    stats = parent_conn.recv()
+    core.join(timeout=5)
+    drain.running = False
+    for sock in sockets.values():
+        sock.close()
+
+    captured = Counter(name for _, r in records if r.direction == "o" for name in event_types(r.frame))
+    replayed = Counter(name for _, r in load(out_path)[0] if r.direction == "o" for name in event_types(r.frame))
+    os.unlink(out_path)
+    span = records[-1][0] - records[0][0]
+    print(f"{sent} frames from {len({r.peer for _, r in records if r.direction in 'ci'})} nodes, "
+          f"captured over {span:.1f}s, replayed in {elapsed:.2f}s"
+          + (f" ({sent / elapsed:.0f} frames/s)" if elapsed else ""))
+    print(f"  host CPU {stats['cpu'] * 1000:.0f}ms ({stats['cpu'] / max(elapsed, 1e-9) * 100:.1f}%), "
+          f"malformed {stats['malformed']}, rate-limited {stats['dropped']}, "
+          f"clears forced to match the capture {stats['forced_clears']}")
+    print(f"  {'host sent':<20} {'captured':>9} {'replayed':>9}")
+    for name in sorted(set(captured) | set(replayed)):
+        print(f"  {name:<20} {captured[name]:>9} {replayed[name]:>9}")
+
+
+# ------------------------------
+# Into a node
+# ------------------------------
+def node_frames(records, role, peer):
+    """(time, frame) the node should receive, and the peer they were captured for"""
+    if role == "node":
+        return [(at, r.frame) for at, r in records if r.direction == "i"], "node"
+    if peer is None:
+        peer = next((r.peer for _, r in records if r.direction in "ci"), None)
+    frames = [(at, r.frame) for at, r in records
+              if r.direction == "o" and (r.peer in ("*", peer) or r.peer.startswith("groups:"))]
+    return frames, peer
+
+
+def shift(data: dict, clock):
+    """Move absolute fire times in event data onto the replay timeline"""
+    if "fire_at" in data and data["fire_at"] is not None:
+        data["fire_at"] = clock.at(data["fire_at"])
+    for inner in data.get("events", ()):
+        shift(inner.get("data") or {}, clock)
+    return data
+
+
+def into_node(args):
+    records, header = load(args.capture)
+    frames, peer = node_frames(records, header.get("role", "host"), args.peer)
+    frames = [(at, frame) for at, frame in frames if frame_type(frame) != "TIME_SYNC"]
+    if not frames:
+        raise SystemExit(f"nothing in {args.capture} for {peer}")
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", args.port))
+    server.listen(1)
+    port = server.getsockname()[1]
+    sim = None
+    if args.external:
+        print(f"Waiting for a node on 127.0.0.1:{port}...")
+    else:
+        from tools.sim_node import SimNode
+        sim = SimNode("127.0.0.1", port, name="replay", groups=args.groups)
+        threading.Thread(target=sim.connect, daemon=True).start()
+    conn, _ = server.accept()
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    send_lock = threading.Lock()
+    answered = Counter()
+
+    def serve_node():
+        buffer = FrameBuffer()
+        while True:
+            try:
+                data = conn.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            for frame in buffer.feed(data):
+                answered[frame_type(frame)] += 1
+                if frame_type(frame) == "TIME_SYNC":
+                    t0 = json.loads(frame).get("data", {}).get("t0")
+                    reply = AlarmEvent(EventType.TIME_SYNC, {"t0": t0, "t1": time.time()})
+                    with send_lock, contextlib.suppress(OSError):
+                        conn.sendall((reply.to_json() + "\n").encode())
+    threading.Thread(target=serve_node, daemon=True).start()
+    time.sleep(0.5)  # The node's own connect-time traffic (HELLO, clock sync)
+
+    clock = Clock(frames[0][0], args.speed)
+    for at, frame in frames:
+        clock.wait_until(at)
+        event = AlarmEvent.from_json(frame)
+        event = AlarmEvent(event.type, shift(dict(event.data or {}), clock), seq=event.seq)
+        with send_lock, contextlib.suppress(OSError):
+            conn.sendall((event.to_json() + "\n").encode())
+    elapsed = time.time() - clock.start
+    time.sleep(args.linger)
+
+    print(f"{len(frames)} frames for {peer}, captured over {frames[-1][0] - frames[0][0]:.1f}s, "
+          f"replayed in {elapsed:.2f}s")
+    print("  node sent: " + (", ".join(f"{name} {count}" for name, count in sorted(answered.items())) or "nothing"))
+    if sim:
+        if sim.rang_at:
+            print(f"  rang (by {sim.rang_by}) {sim.rang_at - clock.start:.2f}s into the replay")
+        else:
+            print("  never rang")
+        sim.close()
+    conn.close()
+    server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["summary", "host", "node"])
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up; 0 replays as fast as possible")
+    parser.add_argument("--no-state", action="store_true",
+                        help="host: don't apply the host's captured alarm changes (ALARM_SET/ARMED/TRIGGERED/CLEARED)")
+    parser.add_argument("--no-limits", action="store_true", help="host: turn off the inbound rate limits")
+    parser.add_argument("--peer", help="node: captured node (ip:port) to replay the host's frames for")
+    parser.add_argument("--groups", type=lambda v: [g for g in v.split(",") if g], default=[],
+                        help="node: groups of the simulated node")
+    parser.add_argument("--external", action="store_true", help="node: wait for a real node instead of a SimNode")
+    parser.add_argument("--port", type=int, default=0, help="node: port to serve the node on")
+    parser.add_argument("--linger", type=float, default=1.0, help="node: seconds to wait after the last frame")
+    parser.add_argument("--verbose", action="store_true", help="show host logs")
+    args = parser.parse_args()
+    {"summary": lambda args: summary(args.capture), "host": into_host, "node": into_node}[args.mode](args)
+
+
+if __name__ == "__main__":
+    main()
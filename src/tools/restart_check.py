@@ -0,0 +1,193 @@
+"""What nodes see while the host restarts: a plain restart vs. a takeover.
+
+Runs a host core (AlarmHost, AlarmManager, the network dispatcher and a
+HandoffServer, like host/app.py) in a child process with N simulated nodes
+connected and an alarm set, then replaces it with a second core:
+
+  restart   stop the old core, then start the new one on the same port;
+            every node connection is closed and nodes must reconnect
+  takeover  start the new core with a Takeover (host/handoff.py), as
+            `python -m host.app --takeover` does
+
+Every node sends a TIME_SYNC a few times a second (under the inbound rate
+limit); the longest a request waited for its reply measures how long the
+host stopped serving nodes. The new core then sets a new alarm, and the
+report counts the nodes that received it.
+
+Run from src/:  python -m tools.restart_check --nodes 200
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import threading
+import time
+from common.comms.protocol import Alarm, AlarmEvent, EventType
+from tools.sim_node import SimNode
+
+PROBE_INTERVAL = 0.25  # Per node; AlarmHost.RATE_LIMITS allows 5 TIME_SYNC/s
+
+
+def core_process(port, takeover, handoff_path, conn, verbose):
+    """Child process: a host core, optionally taking over from a running one"""
+    from common.comms.host_server import AlarmHost
+    from host.alarm_manager import AlarmManager
+    from host.event_dispatcher import EventDispatcher
+    from host.handoff import HandoffServer, Takeover
+
+    logs = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        started = time.time()
+        previous = None
+        if takeover:
+            previous = Takeover(path=handoff_path)
+            previous.connect()
+        host = AlarmHost(port=port)
+        dispatcher = EventDispatcher()
+        dispatcher.add_worker("network", host.broadcast_batch)
+        dispatcher.start()
+        manager = AlarmManager(event_callback=dispatcher.publish)
+        if previous:
+            manager.restore_state(previous.state["alarm_manager"])
+            host.adopt(previous.host_state, previous.listener, previous.conns)
+        host.start(advertise=False)
+        if previous:
+            threading.Thread(target=previous.follow, args=(host,), daemon=True).start()
+
+        def prepare():
+            dispatcher.stop(flush=True)
+            return {"alarm_manager": manager.get_state()}
+        handoff = HandoffServer(host, prepare, path=handoff_path)
+        handoff.start()
+        conn.send((host.sock.getsockname()[1], time.time() - started))
+
+        while True:
+            if handoff.done.is_set():
+                os._exit(0)  # Like host/app.py: closing anything would undo the handoff
+            if not conn.poll(0.1):
+                continue
+            command = conn.recv()
+            if command == "stop":
+                handoff.stop()
+                dispatcher.stop()
+                host.stop()
+                conn.send("ok")
+                return
+            manager.set_alarm(Alarm.from_dict(command))
+            conn.send("ok")
+
+
+def start_core(port, takeover, handoff_path, verbose):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    core = multiprocessing.Process(target=core_process, daemon=True,
+                                   args=(port, takeover, handoff_path, child_conn, verbose))
+    core.start()
+    port, ready_after = parent_conn.recv()
+    return core, parent_conn, port, ready_after
+
+
+class Prober:
+    """Sends TIME_SYNC requests from every node and records how long each reply took"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.sent = {}      # {(node name, t0): real send time}
+        self.waits = []     # [(real send time, seconds until the reply)]
+        self.lock = threading.Lock()
+        self.running = True
+        for node in nodes:
+            node.on_event = self.on_event
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while self.running:
+            for node in self.nodes:
+                if not node.connected:
+                    continue
+                request = node.clock_sync.make_request()
+                with self.lock:
+                    self.sent[(node.name, request["t0"])] = time.time()
+                node.send(AlarmEvent(EventType.TIME_SYNC, request))
+            time.sleep(PROBE_INTERVAL)
+
+    def on_event(self, node, event, received_at):
+        if event.type != EventType.TIME_SYNC:
+            return
+        with self.lock:
+            sent_at = self.sent.pop((node.name, event.data["t0"]), None)
+            if sent_at is not None:
+                self.waits.append((sent_at, received_at - sent_at))
+
+    def longest_wait(self, since):
+        """Longest reply wait for requests sent since then, counting unanswered ones until now.
+
+        None if no request was sent since (every node had been disconnected).
+        """
+        now = time.time()
+        with self.lock:
+            waits = [wait for sent_at, wait in self.waits if sent_at >= since]
+            waits += [now - sent_at for sent_at in self.sent.values() if sent_at >= since]
+        return max(waits, default=None)
+
+
+def run_mode(mode, args):
+    handoff_path = f"/tmp/alarm-mesh-restart-{os.getpid()}.sock"
+    old, old_conn, port, _ = start_core(0, False, handoff_path, args.verbose)
+    old_conn.send(Alarm(hours=7, minutes=0).to_dict())
+    old_conn.recv()
+
+    nodes = [SimNode("127.0.0.1", port, name=f"sim-{i}") for i in range(args.nodes)]
+    for node in nodes:
+        node.connect()
+    prober = Prober(nodes)
+    time.sleep(1)
+
+    restarted_at = time.time()
+    if mode == "restart":
+        old_conn.send("stop")
+        old_conn.recv()
+        old.join(timeout=5)
+    new, new_conn, _, ready_after = start_core(port, mode == "takeover", handoff_path, args.verbose)
+    time.sleep(args.settle)
+
+    alarm = Alarm(hours=8, minutes=15)
+    new_conn.send(alarm.to_dict())
+    new_conn.recv()
+    time.sleep(0.5)
+
+    prober.running = False
+    longest = prober.longest_wait(restarted_at)
+    connected = sum(node.connected for node in nodes)
+    synced = sum(1 for node in nodes
+                 if any(event.type == EventType.ALARM_SET and event.data["alarm"]["hours"] == 8
+                        for _, event in node.received))
+    new_conn.send("stop")
+    new_conn.recv()
+    new.join(timeout=5)
+    if old.is_alive():
+        old.terminate()
+    for node in nodes:
+        node.close()
+    return {"ready_ms": ready_after * 1000, "longest_ms": None if longest is None else longest * 1000,
+            "connected": connected, "synced": synced}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--modes", nargs="+", default=["restart", "takeover"], choices=["restart", "takeover"])
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds after the restart before the new alarm is set")
+    parser.add_argument("--verbose", action="store_true", help="show host logs")
+    args = parser.parse_args()
+
+    print(f"{args.nodes} nodes, probing every {PROBE_INTERVAL * 1000:.0f}ms each")
+    print(f"{'mode':<9} {'new core up':>12} {'longest wait':>13} {'still connected':>16} {'got new alarm':>14}")
+    for mode in args.modes:
+        result = run_mode(mode, args)
+        longest = "-" if result["longest_ms"] is None else f"{result['longest_ms']:.0f}ms"
+        print(f"{mode:<9} {result['ready_ms']:>10.0f}ms {longest:>13} "
+              f"{result['connected']:>10}/{args.nodes:<5} {result['synced']:>8}/{args.nodes}")
+
+
+if __name__ == "__main__":
+    main()
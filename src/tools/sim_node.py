@@ -0,0 +1,159 @@
+import random
+import socket
+import threading
+import time
+from datetime import datetime
+from common.comms.protocol import Alarm, AlarmEvent, EventType
+from common.comms.clock_sync import ClockSync
+from common.comms.local_schedule import LocalSchedule
+from common.comms.framing import FrameBuffer
+from common.clock import SystemClock
+
+
+class SkewedClock(SystemClock):
+    """The real clock shifted by a fixed offset, like a node with a wrong RTC"""
+
+    def __init__(self, skew: float):
+        self.skew = skew
+
+    def time(self) -> float:
+        return time.time() + self.skew
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time())
+
+
+class SimNode:
+    """A simulated alarm node that talks the real protocol over loopback.
+
+    Skips zeroconf and GPIO entirely. Each node can run on a skewed clock and
+    behind an artificial link latency, and records when it started ringing
+    (on the real clock, so ring times of different nodes are comparable).
+    """
+
+    def __init__(self, host_ip, host_port, name="sim", clock_skew=0.0, latency=0.0, groups=()):
+        """
+        Initialize a simulated node.
+
+        Args:
+            host_ip: Address of the host TCP server
+            host_port: Port of the host TCP server
+            name: Label used in reports
+            clock_skew: Seconds added to the real clock to form this node's clock
+            latency: One-way link latency in seconds, applied in both directions
+            groups: Groups announced in the HELLO; alarms for other groups are ignored
+        """
+        self.host_ip = host_ip
+        self.host_port = host_port
+        self.name = name
+        self.clock_skew = clock_skew
+        self.clock = SkewedClock(clock_skew)  # This node's (skewed) wall clock
+        self.latency = latency
+        self.groups = tuple(groups)
+        self.socket = None
+        self.connected = False
+        self.send_lock = threading.Lock()
+        self.clock_sync = ClockSync(clock=self.clock)
+        self.schedule = LocalSchedule(self.clock_sync, on_fire=lambda fire_at: self._ring("timer"), clock=self.clock)
+        self.rang_at = None        # Real time we started ringing
+        self.rang_by = None        # "timer" or "event"
+        self.received = []         # [(real receive time, AlarmEvent)]
+        self.on_event = None       # Optional callback(node, event, received_at)
+
+    def connect(self):
+        self.socket = socket.create_connection((self.host_ip, self.host_port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connected = True
+        threading.Thread(target=self._recv_loop, daemon=True).start()
+        self.send(AlarmEvent(EventType.HELLO, {"groups": list(self.groups)}))
+
+    def send(self, event: AlarmEvent):
+        if not self.connected:
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            with self.send_lock:
+                self.socket.sendall((event.to_json() + "\n").encode())
+        except OSError:
+            self.connected = False
+
+    def sync_clock(self, samples=4, interval=0.05):
+        for _ in range(samples):
+            self.send(AlarmEvent(EventType.TIME_SYNC, self.clock_sync.make_request()))
+            time.sleep(interval)
+
+    def close(self):
+        self.connected = False
+        self.schedule.clear()
+        try:
+            self.socket.close()
+        except Exception:
+            pass
+
+    def _ring(self, source):
+        if self.rang_at is None:
+            self.rang_at = time.time()
+            self.rang_by = source
+
+    def _recv_loop(self):
+        frames = FrameBuffer()
+        while self.connected:
+            try:
+                data = self.socket.recv(4096)
+            except OSError:
+                break
+            if not data:
+                break
+            if self.latency:
+                time.sleep(self.latency)
+            received_at = time.time()
+            for packet in frames.feed(data):
+                self._handle(AlarmEvent.from_json(packet), received_at)
+        self.connected = False
+
+    def _handle(self, event, received_at):
+        if event.type == EventType.BATCH:
+            for inner in event.unpack():
+                self._handle(inner, received_at)
+            return
+        self.received.append((received_at, event))
+        if event.type == EventType.TIME_SYNC:
+            self.clock_sync.handle_reply(event.data)
+            self.schedule.resync()
+        elif event.type == EventType.ALARM_ARMED:
+            alarm = Alarm.from_dict(event.data["alarm"])
+            if alarm.is_for(self.groups):
+                self.schedule.set_alarm(alarm, fire_at=event.data["fire_at"])
+        elif event.type == EventType.ALARM_SET:
+            alarm = Alarm.from_dict(event.data["alarm"])
+            if alarm.is_for(self.groups):
+                self.schedule.set_alarm(alarm)
+            else:
+                self.schedule.clear()
+        elif event.type == EventType.ALARM_TRIGGERED:
+            if not Alarm.from_dict(event.data["alarm"]).is_for(self.groups):
+                return
+            fire_at = event.data.get("fire_at")
+            if not self.schedule.has_fired(fire_at):
+                self._ring("event")
+            self.schedule.mark_fired(fire_at)
+        elif event.type == EventType.ALARM_CLEARED:
+            self.schedule.clear()
+        if self.on_event:
+            self.on_event(self, event, received_at)
+
+
+def spawn_nodes(host_ip, host_port, count, max_skew=0.0, max_latency=0.0, seed=None):
+    """Create and connect count simulated nodes with random skew and latency"""
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(count):
+        node = SimNode(
+            host_ip, host_port, name=f"sim-{i}",
+            clock_skew=rng.uniform(-max_skew, max_skew),
+            latency=rng.uniform(0, max_latency),
+        )
+        node.connect()
+        nodes.append(node)
+    return nodes
@@ -0,0 +1,107 @@
+"""Measure ring-start skew across simulated nodes.
+
+Compares nodes that are pre-armed with the fire time (ALARM_ARMED) against
+nodes that only start ringing when ALARM_TRIGGERED arrives. Every node runs
+on a randomly skewed clock behind a random link latency.
+
+Run from src/:  python -m tools.skew_report --nodes 50
+"""
+import argparse
+import contextlib
+import os
+import threading
+import time
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import Alarm
+from host.alarm_manager import AlarmManager
+from host.event_dispatcher import EventDispatcher
+from tools.sim_node import spawn_nodes
+from tools.stats import percentile
+
+
+def run_round(manager, nodes, lead, pre_arm, drop_trigger, settle):
+    alarm = Alarm(hours=7, minutes=0)
+    manager.set_alarm(alarm)
+    time.sleep(0.2)
+    for node in nodes:
+        node.rang_at = None
+        node.rang_by = None
+
+    fire_at = time.time() + lead
+    if pre_arm:
+        manager.arm_alarm(alarm, fire_at)
+    time.sleep(max(0.0, fire_at - time.time()))
+    if not drop_trigger:
+        manager.trigger_alarm(alarm, fire_at)
+    time.sleep(settle)
+
+    errors = [node.rang_at - fire_at for node in nodes if node.rang_at is not None]
+    by_timer = sum(1 for node in nodes if node.rang_by == "timer")
+    manager.remove_alarm()
+    time.sleep(0.2)
+    return errors, by_timer
+
+
+def format_row(label, errors, total, by_timer):
+    if not errors:
+        return f"{label:<16} {0:>4}/{total:<4} {'-':>10} {'-':>9} {'-':>9} {'-':>9} {by_timer:>6}"
+    skew = (max(errors) - min(errors)) * 1000
+    p50 = percentile([abs(e) for e in errors], 50) * 1000
+    p99 = percentile([abs(e) for e in errors], 99) * 1000
+    worst = max(abs(e) for e in errors) * 1000
+    return (f"{label:<16} {len(errors):>4}/{total:<4} {skew:>8.1f}ms "
+            f"{p50:>7.1f}ms {p99:>7.1f}ms {worst:>7.1f}ms {by_timer:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--port", type=int, default=5101)
+    parser.add_argument("--max-skew", type=float, default=2.0, help="max node clock skew in seconds")
+    parser.add_argument("--max-latency", type=float, default=0.08, help="max one-way link latency in seconds")
+    parser.add_argument("--lead", type=float, default=3.0, help="seconds between arming and firing")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show host/node logs")
+    args = parser.parse_args()
+
+    logs = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        host = AlarmHost(port=args.port)
+        host.start(advertise=False)
+        dispatcher = EventDispatcher()
+        dispatcher.add_worker("network", host.broadcast_batch)
+        dispatcher.start()
+        manager = AlarmManager(event_callback=dispatcher.publish)
+
+        nodes = spawn_nodes("127.0.0.1", args.port, args.nodes,
+                            max_skew=args.max_skew, max_latency=args.max_latency, seed=args.seed)
+        while host.get_connected_nodes_count() < args.nodes:
+            time.sleep(0.05)
+
+        syncs = [threading.Thread(target=node.sync_clock) for node in nodes]
+        for t in syncs:
+            t.start()
+        for t in syncs:
+            t.join()
+
+        settle = args.max_latency * 2 + 0.5
+        results = [
+            ("pre-armed", run_round(manager, nodes, args.lead, True, False, settle)),
+            ("trigger only", run_round(manager, nodes, args.lead, False, False, settle)),
+            ("armed, no trig", run_round(manager, nodes, args.lead, True, True, settle)),
+        ]
+
+        for node in nodes:
+            node.close()
+        dispatcher.stop()
+        host.stop()
+
+    print(f"{args.nodes} nodes, clock skew up to +/-{args.max_skew}s, "
+          f"one-way latency up to {args.max_latency * 1000:.0f}ms")
+    print(f"{'mode':<16} {'rang':>9} {'skew':>10} {'p50 err':>9} {'p99 err':>9} {'max err':>9} {'timer':>6}")
+    for label, (errors, by_timer) in results:
+        print(format_row(label, errors, args.nodes, by_timer))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Loopback node swarm: load-test a real AlarmHost with N simulated nodes.
+
+The host runs in a child process (AlarmHost, AlarmManager and the network
+dispatcher, no zeroconf or GPIO) so its CPU time and RSS can be measured on
+their own. All simulated nodes live in this process, speak the real
+protocol codec, send heartbeats and snoozes at configurable rates, and
+record when each ALARM_TRIGGERED arrives.
+
+With --flooders K, K extra nodes send --flood-type frames as fast as they
+can (a buggy node or a stuck snooze button); compare fan-out to the rest
+of the mesh with and without the host's inbound rate limits (--no-limits).
+
+Run from src/:  python -m tools.swarm --nodes 500 --triggers 10
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import random
+import threading
+import time
+from common.comms.protocol import Alarm, AlarmEvent, EventType
+from tools.sim_node import SimNode
+from tools.stats import summarize_ms
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def host_process(port, conn, verbose, rate_limits=None):
+    """Child process: a real host wired like host/app.py minus hardware and web"""
+    from common.comms.host_server import AlarmHost
+    from host.alarm_manager import AlarmManager
+    from host.event_dispatcher import EventDispatcher
+
+    logs = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        manager = None
+
+        def handle_event(event, addr):
+            if event.type == EventType.SNOOZE_PRESSED:
+                manager.handle_snooze(
+                    connected_nodes_count=host.get_connected_nodes_count(),
+                    source=str(addr),
+                    fire_at=(event.data or {}).get("fire_at"),
+                )
+
+        host = AlarmHost(port=port, event_handler=handle_event, rate_limits=rate_limits)
+        dispatcher = EventDispatcher()
+        dispatcher.add_worker("network", host.broadcast_batch)
+        dispatcher.start()
+        manager = AlarmManager(event_callback=dispatcher.publish)
+        host.start(advertise=False)
+        conn.send("ready")
+
+        alarm = Alarm(hours=7, minutes=0)
+        while True:
+            command = conn.recv()
+            if command == "count":
+                conn.send(host.get_connected_nodes_count())
+            elif command == "dropped":
+                conn.send(host.dropped_frames)
+            elif command == "trigger":
+                manager.set_alarm(alarm)
+                fire_at = time.time()
+                manager.trigger_alarm(alarm, fire_at)
+                conn.send(fire_at)
+            elif command == "clear":
+                manager.remove_alarm()
+                conn.send("ok")
+            elif command == "stop":
+                dispatcher.stop()
+                host.stop()
+                conn.send("ok")
+                return
+
+
+def read_proc_usage(pid):
+    """(cpu seconds, current RSS kB, peak RSS kB) of a process from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+    rss = peak = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1])
+            elif line.startswith("VmHWM:"):
+                peak = int(line.split()[1])
+    return cpu, rss, peak
+
+
+class Swarm:
+    """The simulated nodes and their background heartbeat/snooze traffic"""
+
+    def __init__(self, nodes, heartbeat_interval, snooze_rate, flooders=(), flood_type=EventType.SNOOZE_PRESSED):
+        self.nodes = nodes
+        self.flooders = flooders
+        self.flood_type = flood_type
+        self.heartbeat_interval = heartbeat_interval
+        self.snooze_rate = snooze_rate
+        self.alarm_active = False
+        self.running = True
+        self.triggered_at = {}   # {node name: receive time of the last ALARM_TRIGGERED}
+        self.lock = threading.Lock()
+        self.sent = {"heartbeats": 0, "snoozes": 0, "flood": 0}
+        for node in nodes:
+            node.on_event = self._on_event
+
+    def _on_event(self, node, event, received_at):
+        if event.type == EventType.ALARM_TRIGGERED:
+            with self.lock:
+                self.triggered_at[node.name] = received_at
+
+    def start(self):
+        threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+        if self.snooze_rate > 0:
+            threading.Thread(target=self._snooze_loop, daemon=True).start()
+        for node in self.flooders:
+            threading.Thread(target=self._flood_loop, args=(node,), daemon=True).start()
+
+    def _heartbeat_loop(self):
+        # Spread every node's heartbeat evenly over the interval
+        gap = self.heartbeat_interval / len(self.nodes)
+        while self.running:
+            for node in self.nodes:
+                if not self.running:
+                    return
+                node.send(AlarmEvent(EventType.HEARTBEAT))
+                self.sent["heartbeats"] += 1
+                time.sleep(gap)
+
+    def _snooze_loop(self):
+        rng = random.Random(0)
+        while self.running:
+            time.sleep(rng.expovariate(self.snooze_rate))
+            if self.alarm_active:
+                node = rng.choice(self.nodes)
+                node.send(AlarmEvent(EventType.SNOOZE_PRESSED, {"node": node.name}))
+                self.sent["snoozes"] += 1
+
+    def _flood_loop(self, node):
+        # Pre-encoded and sent 100 frames at a time, to push as hard as a
+        # misbehaving node could
+        frame = (AlarmEvent(self.flood_type, {"node": node.name}).to_json() + "\n").encode()
+        burst = frame * 100
+        while self.running and node.connected:
+            try:
+                node.socket.sendall(burst)
+            except OSError:
+                return
+            self.sent["flood"] += 100
+            time.sleep(0)  # Let the other swarm threads run
+
+    def stop(self):
+        self.running = False
+        for node in self.nodes + self.flooders:
+            node.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--port", type=int, default=5501)
+    parser.add_argument("--heartbeat-interval", type=float, default=10.0, help="seconds between heartbeats per node")
+    parser.add_argument("--snooze-rate", type=float, default=5.0, help="snoozes per second across the swarm while ringing")
+    parser.add_argument("--triggers", type=int, default=10, help="number of trigger/clear cycles to measure")
+    parser.add_argument("--ring-time", type=float, default=1.0, help="seconds each trigger rings before clearing")
+    parser.add_argument("--flooders", type=int, default=0, help="extra nodes that flood the host")
+    parser.add_argument("--flood-type", default="SNOOZE_PRESSED", choices=["SNOOZE_PRESSED", "HEARTBEAT"])
+    parser.add_argument("--no-limits", action="store_true", help="disable the host's inbound rate limits")
+    parser.add_argument("--verbose", action="store_true", help="show host logs")
+    args = parser.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    rate_limits = {} if args.no_limits else None
+    host = multiprocessing.Process(target=host_process, daemon=True,
+                                   args=(args.port, child_conn, args.verbose, rate_limits))
+    host.start()
+    parent_conn.recv()
+
+    def host_call(command):
+        parent_conn.send(command)
+        return parent_conn.recv()
+
+    connect_started = time.time()
+    nodes = []
+    for i in range(args.nodes):
+        # Pace connects to what the host has accepted so far
+        while i - host_call("count") >= 4:
+            time.sleep(0.001)
+        node = SimNode("127.0.0.1", args.port, name=f"sim-{i}")
+        node.connect()
+        nodes.append(node)
+    flooders = []
+    for i in range(args.flooders):
+        node = SimNode("127.0.0.1", args.port, name=f"flood-{i}")
+        node.connect()
+        flooders.append(node)
+    while host_call("count") < args.nodes + args.flooders:
+        time.sleep(0.05)
+    connect_time = time.time() - connect_started
+
+    swarm = Swarm(nodes, args.heartbeat_interval, args.snooze_rate, flooders, EventType[args.flood_type])
+    swarm.start()
+    cpu_start, _, _ = read_proc_usage(host.pid)
+    wall_start = time.time()
+
+    lasts, all_latencies, missing = [], [], 0
+    for _ in range(args.triggers):
+        with swarm.lock:
+            swarm.triggered_at.clear()
+        fire_at = host_call("trigger")
+        swarm.alarm_active = True
+        time.sleep(args.ring_time)
+        swarm.alarm_active = False
+        host_call("clear")
+        with swarm.lock:
+            latencies = [t - fire_at for t in swarm.triggered_at.values()]
+        missing += args.nodes - len(latencies)
+        if latencies:
+            lasts.append(max(latencies))
+            all_latencies.extend(latencies)
+        time.sleep(0.2)
+
+    wall = time.time() - wall_start
+    cpu_end, rss, peak = read_proc_usage(host.pid)
+    dropped = host_call("dropped")
+    swarm.stop()
+    host_call("stop")
+    host.join(timeout=5)
+
+    fanout = summarize_ms(all_latencies)
+    last = summarize_ms(lasts)
+    print(f"{args.nodes} nodes, heartbeat every {args.heartbeat_interval}s per node, "
+          f"{args.snooze_rate} snoozes/s while ringing, {args.triggers} triggers")
+    print(f"connect:            all nodes accepted in {connect_time:.2f}s")
+    print(f"trigger fan-out:    p50 {fanout['p50_ms']:.2f}ms  p90 {fanout['p90_ms']:.2f}ms  "
+          f"p99 {fanout['p99_ms']:.2f}ms  max {fanout['max_ms']:.2f}ms")
+    print(f"last node reached:  p50 {last['p50_ms']:.2f}ms  max {last['max_ms']:.2f}ms  (missed: {missing})")
+    print(f"host CPU:           {(cpu_end - cpu_start) / wall * 100:.1f}% of one core over {wall:.1f}s")
+    print(f"host RSS:           {rss / 1024:.1f} MiB (peak {peak / 1024:.1f} MiB)")
+    print(f"traffic sent:       {swarm.sent['heartbeats']} heartbeats, {swarm.sent['snoozes']} snoozes")
+    if args.flooders:
+        print(f"flood:              {args.flooders} node(s) sent {swarm.sent['flood']} {args.flood_type} "
+              f"frames, host dropped {dropped}" + (" (limits disabled)" if args.no_limits else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Measure alarm trigger jitter while the web UI is under load.
+
+Runs the host core (AlarmHost, AlarmManager, network dispatcher and the
+control socket) in a child process and hammers the web UI with concurrent
+page loads while the core repeatedly sleeps until a fire time and triggers,
+like the scheduler's final sleep. A simulated node records when each
+ALARM_TRIGGERED arrives. Two layouts are compared:
+
+  single   the web UI served from a thread inside the core process (the old
+           layout: page rendering competes with triggering for one GIL)
+  split    the web UI in its own process (host/web.py), reniced, talking
+           to the core over the control socket
+
+Run from src/:  python -m tools.web_jitter --clients 8 --triggers 20
+"""
+import argparse
+import contextlib
+import http.client
+import logging
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from common.comms.protocol import Alarm, EventType
+from tools.sim_node import SimNode
+from tools.stats import summarize_ms
+
+
+def core_process(port, control_path, web_port, single, conn, verbose):
+    """Child process: the host core, plus the web UI in a thread if single"""
+    from common.comms.host_server import AlarmHost
+    from host.alarm_manager import AlarmManager
+    from host.control import ControlServer
+    from host.event_dispatcher import EventDispatcher
+
+    logs = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with logs:
+        host = AlarmHost(port=port)
+        dispatcher = EventDispatcher()
+        dispatcher.add_worker("network", host.broadcast_batch)
+        dispatcher.start()
+        manager = AlarmManager(event_callback=dispatcher.publish)
+        control = ControlServer(manager, path=control_path)
+        control.start()
+        host.start(advertise=False)
+        if single:
+            from werkzeug.serving import make_server
+            from host import web
+            if not verbose:
+                logging.getLogger("werkzeug").setLevel(logging.ERROR)  # One line per request otherwise
+            web.control.path = control_path
+            server = make_server("127.0.0.1", web_port, web.app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        conn.send(host.sock.getsockname()[1])
+
+        alarm = Alarm(hours=7, minutes=0)
+        while True:
+            command = conn.recv()
+            if command == "stop":
+                control.stop()
+                dispatcher.stop()
+                host.stop()
+                conn.send("ok")
+                return
+            _, lead = command
+            manager.set_alarm(alarm)
+            fire_at = time.time() + lead
+            time.sleep(max(0.0, fire_at - time.time()))
+            woke_at = time.time()
+            manager.trigger_alarm(alarm, fire_at)
+            conn.send((fire_at, woke_at))
+            time.sleep(0.05)
+            manager.remove_alarm()
+
+
+def receive(core, conn):
+    """Next reply from the core process, failing instead of hanging if it died"""
+    while not conn.poll(0.5):
+        if not core.is_alive():
+            raise RuntimeError(f"core process exited with code {core.exitcode}")
+    return conn.recv()
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing listening on port {port}")
+
+
+def load_loop(web_port, stop, counts):
+    """Load the index page (status over the control socket + template render) until stopped"""
+    while not stop.is_set():
+        try:
+            client = http.client.HTTPConnection("127.0.0.1", web_port, timeout=10)
+            client.request("GET", "/")
+            client.getresponse().read()
+            client.close()
+            counts.append(1)
+        except OSError:
+            time.sleep(0.01)
+
+
+def run_layout(layout, args):
+    control_path = f"/tmp/alarm-mesh-jitter-{os.getpid()}.sock"
+    single = layout == "single"
+    parent_conn, child_conn = multiprocessing.Pipe()
+    core = multiprocessing.Process(target=core_process, daemon=True, args=(
+        args.port, control_path, args.web_port, single, child_conn, args.verbose))
+    core.start()
+    port = receive(core, parent_conn)
+
+    web = None
+    if not single:
+        output = None if args.verbose else subprocess.DEVNULL
+        web = subprocess.Popen(
+            [sys.executable, "-m", "host.web", "--port", str(args.web_port),
+             "--control", control_path, "--nice", str(args.web_nice)],
+            stdout=output, stderr=output,
+        )
+    wait_for_port(args.web_port)
+
+    received = {}
+    node = SimNode("127.0.0.1", port, name="probe")
+    node.on_event = lambda node, event, received_at: (
+        received.__setitem__(event.data["fire_at"], received_at) if event.type == EventType.ALARM_TRIGGERED else None)
+    node.connect()
+
+    stop = threading.Event()
+    counts = []
+    loaders = [threading.Thread(target=load_loop, args=(args.web_port, stop, counts), daemon=True)
+               for _ in range(args.clients)]
+    for loader in loaders:
+        loader.start()
+    time.sleep(0.5)  # Let the load ramp up
+
+    started = time.time()
+    wake_late, node_late = [], []
+    for _ in range(args.triggers):
+        parent_conn.send(("trigger", args.lead))
+        fire_at, woke_at = receive(core, parent_conn)
+        wake_late.append(woke_at - fire_at)
+        deadline = time.time() + 2
+        while fire_at not in received and time.time() < deadline:
+            time.sleep(0.001)
+        if fire_at in received:
+            node_late.append(received[fire_at] - fire_at)
+        time.sleep(0.1)
+    elapsed = time.time() - started
+
+    stop.set()
+    for loader in loaders:
+        loader.join()
+    node.close()
+    parent_conn.send("stop")
+    parent_conn.recv()
+    core.join(timeout=5)
+    if web:
+        web.terminate()
+        web.wait()
+    return summarize_ms(wake_late), summarize_ms(node_late), len(counts) / elapsed, args.triggers - len(node_late)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layouts", nargs="+", default=["single", "split"], choices=["single", "split"])
+    parser.add_argument("--clients", type=int, default=8, help="concurrent page-loading clients")
+    parser.add_argument("--triggers", type=int, default=20)
+    parser.add_argument("--lead", type=float, default=0.2, help="seconds from arming each trigger to its fire time")
+    parser.add_argument("--web-nice", type=int, default=10, help="niceness of the split web process")
+    parser.add_argument("--port", type=int, default=0, help="host port for the core (default: any free port)")
+    parser.add_argument("--web-port", type=int, default=5602)
+    parser.add_argument("--verbose", action="store_true", help="show host and web logs")
+    args = parser.parse_args()
+
+    print(f"{args.clients} page-loading clients, {args.triggers} triggers")
+    print(f"{'layout':<8} {'wake p50':>9} {'wake p99':>9} {'wake max':>9} "
+          f"{'node p50':>9} {'node p99':>9} {'node max':>9} {'pages/s':>8}")
+    for layout in args.layouts:
+        wake, node, pages, missed = run_layout(layout, args)
+        print(f"{layout:<8} {wake['p50_ms']:>7.2f}ms {wake['p99_ms']:>7.2f}ms {wake['max_ms']:>7.2f}ms "
+              f"{node['p50_ms']:>7.2f}ms {node['p99_ms']:>7.2f}ms {node['max_ms']:>7.2f}ms {pages:>8.0f}"
+              + (f"  (missed {missed})" if missed else ""))
+
+
+if __name__ == "__main__":
+    main()